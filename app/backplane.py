@@ -0,0 +1,302 @@
+"""Keeping the workers of one host coherent.
+
+Each worker keeps its own full-view cache and its own event subscribers.
+Writers announce changes on the backplane, and every other worker drops
+its cached view of that machine and passes the event on to its own
+subscribers. The backplane also holds shared entries with an expiry,
+where ``IDEMPOTENCY_BACKEND=backplane`` keeps its keys.
+
+``BACKPLANE=memory`` (the default) is for a single worker: announcements
+go nowhere and entries live in the process. ``BACKPLANE=sqlite`` keeps
+both in a SQLite file (``BACKPLANE_PATH``) that every worker on the host
+opens, so ``uvicorn --workers n`` needs no other service. Announcements
+are queued and written together, and each worker reads the ones after
+the last it saw every ``BACKPLANE_POLL_INTERVAL`` seconds, so another
+worker's cache is stale for at most about two intervals. Announcements
+are kept for ``BACKPLANE_RETENTION`` seconds; a worker that falls further
+behind than that sees the gap and drops everything it cached.
+"""
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable
+
+from starlette.concurrency import run_in_threadpool
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Called with the key and data of another worker's announcement. A None
+# key means everything: the topic's whole state may have changed.
+Handler = Callable[[str | None, str], None]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS backplane_messages (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    origin TEXT NOT NULL,
+    topic TEXT NOT NULL,
+    key TEXT,
+    data TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS backplane_entries (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    expires_at REAL NOT NULL
+);
+"""
+
+
+class MemoryBackplane:
+    """A single worker: nobody to tell, entries in a bounded LRU."""
+
+    shared = False
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[bytes, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def subscribe(self, topic: str, handler: Handler) -> None:
+        pass
+
+    def publish(self, topic: str, key: str | None = None, data: str = "") -> None:
+        pass
+
+    def claim(self, key: str, value: bytes, ttl: float) -> bytes | None:
+        """Store ``value`` unless ``key`` is held; returns the held value if it is."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(key)
+                return entry[0]
+            self._entries[key] = (value, now + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return None
+
+    def replace(self, key: str, value: bytes, ttl: float) -> None:
+        """Change the value of a held ``key``, now expiring ``ttl`` from now."""
+        with self._lock:
+            if key in self._entries:
+                self._entries[key] = (value, time.monotonic() + ttl)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+
+@contextmanager
+def _immediate(conn: sqlite3.Connection):
+    """A write transaction, taking the file's write lock up front."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+class SqliteBackplane:
+    """Announcements and entries in a SQLite file shared by the host's workers."""
+
+    shared = True
+    # Seconds between sweeps of old announcements and expired entries.
+    PRUNE_INTERVAL = 10.0
+
+    def __init__(self, path: str, poll_interval: float, retention: float):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self.origin = ""
+        self.last_seq = 0
+        self.gaps = 0
+        self._handlers: dict[str, list[Handler]] = {}
+        # (topic, key, data) -> None: ordered, and a machine invalidated a
+        # hundred times between two polls is announced once.
+        self._pending: dict[tuple, None] = {}
+        self._pending_lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+        self._pid: int | None = None
+        self._lock = threading.Lock()
+        self._next_prune = 0.0
+        self._task: asyncio.Task | None = None
+
+    def _connection(self) -> sqlite3.Connection:
+        # Opened by the worker itself, never inherited across a fork.
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(
+                self.path,
+                timeout=settings.SQLITE_BUSY_TIMEOUT_MS / 1000,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    # --- Announcements ---
+
+    def subscribe(self, topic: str, handler: Handler) -> None:
+        self._handlers.setdefault(topic, []).append(handler)
+
+    def publish(self, topic: str, key: str | None = None, data: str = "") -> None:
+        """Queue an announcement for the next poll; cheap enough for every write."""
+        with self._pending_lock:
+            self._pending[topic, key, data] = None
+
+    def _flush(self, conn: sqlite3.Connection) -> None:
+        with self._pending_lock:
+            pending, self._pending = list(self._pending), {}
+        if not pending:
+            return
+        now = time.time()
+        with _immediate(conn):
+            conn.executemany(
+                "INSERT INTO backplane_messages (origin, topic, key, data, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(self.origin, topic, key, data, now) for topic, key, data in pending],
+            )
+
+    def _prune(self, conn: sqlite3.Connection) -> None:
+        now = time.time()
+        with _immediate(conn):
+            # The newest announcement always stays, so a worker that slept
+            # through the others still finds the gap.
+            conn.execute(
+                "DELETE FROM backplane_messages WHERE created_at < ? "
+                "AND seq < (SELECT max(seq) FROM backplane_messages)",
+                (now - self.retention,),
+            )
+            conn.execute("DELETE FROM backplane_entries WHERE expires_at <= ?", (now,))
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush(self._connection())
+
+    def poll(self) -> None:
+        """Write this worker's queued announcements, then act on the others'."""
+        with self._lock:
+            conn = self._connection()
+            self._flush(conn)
+            rows = conn.execute(
+                "SELECT seq, origin, topic, key, data FROM backplane_messages "
+                "WHERE seq > ? ORDER BY seq",
+                (self.last_seq,),
+            ).fetchall()
+            if time.monotonic() >= self._next_prune:
+                self._next_prune = time.monotonic() + self.PRUNE_INTERVAL
+                self._prune(conn)
+        if not rows:
+            return
+        if rows[0][0] > self.last_seq + 1:
+            # Pruned before this worker read them: assume everything changed.
+            self.gaps += 1
+            for handlers in self._handlers.values():
+                for handler in handlers:
+                    handler(None, "")
+        for _, origin, topic, key, data in rows:
+            if origin != self.origin:
+                for handler in self._handlers.get(topic, ()):
+                    handler(key, data)
+        self.last_seq = rows[-1][0]
+
+    # --- Entries ---
+
+    def claim(self, key: str, value: bytes, ttl: float) -> bytes | None:
+        """Store ``value`` unless ``key`` is held; returns the held value if it is."""
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            with _immediate(conn):
+                row = conn.execute(
+                    "SELECT value FROM backplane_entries WHERE key = ? AND expires_at > ?",
+                    (key, now),
+                ).fetchone()
+                if row is not None:
+                    return row[0]
+                conn.execute(
+                    "INSERT OR REPLACE INTO backplane_entries (key, value, expires_at) "
+                    "VALUES (?, ?, ?)",
+                    (key, value, now + ttl),
+                )
+        return None
+
+    def replace(self, key: str, value: bytes, ttl: float) -> None:
+        """Change the value of a held ``key``, now expiring ``ttl`` from now."""
+        with self._lock:
+            self._connection().execute(
+                "UPDATE backplane_entries SET value = ?, expires_at = ? WHERE key = ?",
+                (value, time.time() + ttl, key),
+            )
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._connection().execute("DELETE FROM backplane_entries WHERE key = ?", (key,))
+
+    # --- Lifecycle ---
+
+    def _open(self) -> None:
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT max(seq) FROM backplane_messages"
+            ).fetchone()
+        # Only what is announced from now on concerns this worker.
+        self.last_seq = row[0] or 0
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await run_in_threadpool(self.poll)
+            except Exception:
+                logger.exception("Backplane poll failed")
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+        self.origin = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        await run_in_threadpool(self._open)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await run_in_threadpool(self.flush)
+
+
+def make_backplane():
+    if settings.BACKPLANE == "sqlite":
+        return SqliteBackplane(
+            settings.BACKPLANE_PATH,
+            settings.BACKPLANE_POLL_INTERVAL,
+            settings.BACKPLANE_RETENTION,
+        )
+    return MemoryBackplane(settings.BACKPLANE_MAX_ENTRIES)
+
+
+backplane = make_backplane()
@@ -0,0 +1,102 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+from app.backplane import backplane
+from app.config import settings
+
+
+class FullViewCache:
+    """Pre-encoded ``GET /slots/full-view`` bodies plus their ETags, per machine.
+
+    Writers call ``invalidate(machine_id)`` after they commit, or
+    ``invalidate()`` to drop every machine. Every invalidation bumps a
+    generation, and a rebuilt payload is only stored if no invalidation of
+    its machine happened while it was being built, so a slow reader can
+    never put a stale snapshot back into the cache. The least recently used
+    machines are evicted past ``max_entries``.
+
+    Invalidations are announced on ``backplane`` too, and the ones other
+    workers announce drop this cache's entries the same way.
+    """
+
+    def __init__(self, max_entries: int, backplane=None):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._epoch = 0
+        self._generations: dict[str, int] = {}
+        self._entries: OrderedDict[str, tuple[bytes, str]] = OrderedDict()
+        self._backplane = backplane
+        if backplane is not None:
+            backplane.subscribe("full_view", lambda machine_id, data: self._drop(machine_id))
+
+    def generation(self, machine_id: str) -> tuple[int, int]:
+        return self._epoch, self._generations.get(machine_id, 0)
+
+    def get(self, machine_id: str) -> tuple[bytes, str] | None:
+        with self._lock:
+            entry = self._entries.get(machine_id)
+            if entry is not None:
+                self._entries.move_to_end(machine_id)
+            return entry
+
+    def store(self, machine_id: str, generation: tuple[int, int], body: bytes) -> tuple[bytes, str]:
+        entry = (body, make_etag(body))
+        with self._lock:
+            if generation == self.generation(machine_id):
+                self._entries[machine_id] = entry
+                self._entries.move_to_end(machine_id)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, machine_id: str | None = None) -> None:
+        self._drop(machine_id)
+        if self._backplane is not None:
+            self._backplane.publish("full_view", machine_id)
+
+    def _drop(self, machine_id: str | None) -> None:
+        with self._lock:
+            if machine_id is None:
+                self._epoch += 1
+                self._generations.clear()
+                self._entries.clear()
+            else:
+                self._generations[machine_id] = self._generations.get(machine_id, 0) + 1
+                self._entries.pop(machine_id, None)
+
+
+def make_etag(body: bytes) -> str:
+    return '"%s"' % hashlib.blake2b(body, digest_size=8).hexdigest()
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [c.strip() for c in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def version_etag(version: int) -> str:
+    """ETag of a versioned slot or item."""
+    return f'"{version}"'
+
+
+def if_match_versions(if_match: str | None) -> set[int] | None:
+    """Versions an ``If-Match`` header accepts; None when any will do.
+
+    Weak and foreign tags never match (If-Match compares strongly), so a
+    header with none of ours yields an empty set.
+    """
+    if not if_match:
+        return None
+    candidates = [c.strip() for c in if_match.split(",")]
+    if "*" in candidates:
+        return None
+    return {
+        int(c[1:-1]) for c in candidates
+        if len(c) > 2 and c[0] == c[-1] == '"' and c[1:-1].isdigit()
+    }
+
+
+full_view_cache = FullViewCache(settings.FULL_VIEW_CACHE_MACHINES, backplane)
@@ -1,3 +1,6 @@
+from typing import Literal
+
+from pydantic import Field
 from pydantic_settings import BaseSettings
 
 
@@ -6,7 +9,51 @@ class Settings(BaseSettings):
     MAX_ITEMS_PER_SLOT: int = 10
     SUPPORTED_DENOMINATIONS: list[int] = [5, 10, 20, 50, 100]
     CURRENCY: str = "INR"
+    CHANGE_TABLE_MAX_AMOUNT: int = 5000
+    TRACK_COIN_INVENTORY: bool = False
     DATABASE_URL: str = "sqlite:///./vending.db"
+    ASYNC_DB: bool = False
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_TIMEOUT: int = 30
+    SQLITE_TUNED: bool = False
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024
+    SQLITE_CACHE_SIZE_KIB: int = 64 * 1024
+    MAX_PURCHASE_BATCH: int = 1000
+    BULK_INSERT_CHUNK_SIZE: int = 1000
+    IMPORT_BATCH_SIZE: int = 1000
+    IMPORT_MAX_ERRORS: int = 1000
+    EXPORT_YIELD_PER: int = 1000
+    MAX_PAGE_SIZE: int = 500
+    FULL_VIEW_CACHE_MACHINES: int = 1024
+    RESTOCK_HORIZON_HOURS: float = 48.0
+    RESTOCK_WINDOW_DAYS: int = Field(14, ge=1)
+    RESTOCK_HALF_LIFE_DAYS: float = 3.0
+    INVENTORY_RECONCILE_INTERVAL: float = 30.0
+    INVENTORY_RECONCILE_BATCH: int = 200
+    INVENTORY_RECONCILE_REPAIR: bool = False
+    INVENTORY_STORE: bool = False
+    INVENTORY_STORE_LOG: str = "./inventory-store.log"
+    INVENTORY_STORE_FLUSH_INTERVAL: float = 0.5
+    INVENTORY_STORE_FLUSH_BATCH: int = 500
+    INVENTORY_STORE_FSYNC: bool = False
+    IDEMPOTENCY_BACKEND: Literal["memory", "database", "backplane"] = "memory"
+    IDEMPOTENCY_TTL: int = 24 * 60 * 60
+    IDEMPOTENCY_LOCK_TIMEOUT: int = 60
+    IDEMPOTENCY_MAX_ENTRIES: int = 10000
+    BACKPLANE: Literal["memory", "sqlite"] = "memory"
+    BACKPLANE_PATH: str = "./backplane.db"
+    BACKPLANE_POLL_INTERVAL: float = 0.05
+    BACKPLANE_RETENTION: float = 60.0
+    BACKPLANE_MAX_ENTRIES: int = 10000
+    EVENTS_QUEUE_SIZE: int = 256
+    EVENTS_MAX_SUBSCRIBERS: int = 10000
+    EVENTS_HEARTBEAT: float = 15.0
+    METRICS_ENABLED: bool = True
+    PROFILING_ENABLED: bool = False
+    QUERY_BUDGET_MODE: Literal["off", "warn", "raise"] = "off"
 
     model_config = {"env_file": ".env", "extra": "ignore"}
 
@@ -1,27 +1,249 @@
-from sqlalchemy import create_engine
+import time
+from contextlib import asynccontextmanager
+
+from sqlalchemy import MetaData, create_engine, event
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from sqlalchemy.orm import sessionmaker, declarative_base
 from sqlalchemy.exc import SQLAlchemyError
+from starlette.concurrency import run_in_threadpool
 
+from app import profiling
 from app.config import settings
 
-connect_args = {}
-if settings.DATABASE_URL.startswith("sqlite"):
-    connect_args["check_same_thread"] = False
+# Dialect prefixes mapped to the async driver used when ASYNC_DB is enabled.
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+}
+
+# Fixed constraint and index names, so migrations can refer to them.
+NAMING_CONVENTION = {
+    "ix": "ix_%(column_0_label)s",
+    "uq": "uq_%(table_name)s_%(column_0_name)s",
+    "ck": "ck_%(table_name)s_%(constraint_name)s",
+    "fk": "fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s",
+    "pk": "pk_%(table_name)s",
+}
+
+
+def is_memory_sqlite(url: str) -> bool:
+    if not url.startswith("sqlite"):
+        return False
+    return ":memory:" in url or url.split("://", 1)[1] in ("", "/")
+
+
+def async_database_url(url: str) -> str:
+    scheme, rest = url.split("://", 1)
+    if "+" in scheme and scheme.split("+", 1)[1] in ("aiosqlite", "asyncpg"):
+        return url
+    dialect = scheme.split("+", 1)[0]
+    if dialect not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for {dialect!r} URLs")
+    return f"{ASYNC_DRIVERS[dialect]}://{rest}"
+
+
+def engine_options(url: str) -> dict:
+    connect_args = {}
+    options = {}
+    if url.startswith("sqlite"):
+        connect_args["check_same_thread"] = False
+    if is_memory_sqlite(url):
+        # Exactly one long-lived connection, handed to one session at a time:
+        # a second connection would open its own empty in-memory database.
+        options.update(
+            poolclass=AsyncAdaptedQueuePool if "+aiosqlite" in url else QueuePool,
+            pool_size=1,
+            max_overflow=0,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+        )
+    else:
+        options.update(
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+        )
+    return {"connect_args": connect_args, **options}
+
+
+def uses_sqlite_writer(url: str) -> bool:
+    """Whether ``SQLITE_TUNED`` splits ``url`` into a read pool and one writer.
+
+    Not for in-memory databases, where a second engine would be a second,
+    empty database.
+    """
+    return settings.SQLITE_TUNED and url.startswith("sqlite") and not is_memory_sqlite(url)
+
+
+def sqlite_pragmas(url: str, query_only: bool = False) -> list[str]:
+    pragmas = [
+        "PRAGMA synchronous=NORMAL",
+        f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}",
+        f"PRAGMA mmap_size={settings.SQLITE_MMAP_SIZE}",
+        # Negative cache_size is in KiB rather than pages.
+        f"PRAGMA cache_size=-{settings.SQLITE_CACHE_SIZE_KIB}",
+    ]
+    if not is_memory_sqlite(url):
+        pragmas.insert(0, "PRAGMA journal_mode=WAL")
+    if query_only:
+        pragmas.append("PRAGMA query_only=ON")
+    return pragmas
+
+
+def tune_sqlite(sync_engine, url: str, begin: str = "BEGIN", query_only: bool = False) -> None:
+    """Apply ``sqlite_pragmas`` on connect and open transactions with ``begin``.
+
+    pysqlite's own implicit BEGIN is switched off so SQLAlchemy issues it;
+    the writer uses ``BEGIN IMMEDIATE``, taking the write lock up front
+    where ``busy_timeout`` can wait for it, instead of failing a read
+    transaction's upgrade with "database is locked". It is also what stands
+    in for ``with_for_update()``, which SQLite ignores.
+    """
+    pragmas = sqlite_pragmas(url, query_only)
+
+    @event.listens_for(sync_engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+    @event.listens_for(sync_engine, "begin")
+    def _on_begin(conn):
+        # Straight to the DBAPI cursor: not a statement worth timing.
+        conn.connection.cursor().execute(begin)
+
+
+def writer_engine_options(url: str) -> dict:
+    options = engine_options(url)
+    # One connection: writers queue for it in the pool, in arrival order.
+    options.update(pool_size=1, max_overflow=0)
+    return options
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    stats = profiling.current_stats()
+    if stats is not None:
+        stats.db_time += elapsed
+        stats.query_count += 1
+
+
+def instrument_engine(sync_engine) -> None:
+    """Add every statement's time to the current request's ``RequestStats``."""
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+
 
 engine = create_engine(
     settings.DATABASE_URL,
-    connect_args=connect_args,
+    **engine_options(settings.DATABASE_URL),
 )
+write_engine = engine
+_split_writer = uses_sqlite_writer(settings.DATABASE_URL)
+if _split_writer:
+    write_engine = create_engine(
+        settings.DATABASE_URL,
+        **writer_engine_options(settings.DATABASE_URL),
+    )
+    tune_sqlite(write_engine, settings.DATABASE_URL, begin="BEGIN IMMEDIATE")
+    instrument_engine(write_engine)
+if settings.SQLITE_TUNED and settings.DATABASE_URL.startswith("sqlite"):
+    # With a separate writer the read pool is query_only, so a mutating
+    # route left on get_db fails loudly instead of bypassing the writer.
+    tune_sqlite(engine, settings.DATABASE_URL, query_only=_split_writer)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
+WriteSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=write_engine)
+Base = declarative_base(metadata=MetaData(naming_convention=NAMING_CONVENTION))
+instrument_engine(engine)
+
+async_engine = None
+async_write_engine = None
+AsyncSessionLocal = None
+AsyncWriteSessionLocal = None
+if settings.ASYNC_DB:
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    _async_url = async_database_url(settings.DATABASE_URL)
+    _async_options = engine_options(_async_url)
+    _async_options.pop("connect_args")
+    async_engine = create_async_engine(_async_url, **_async_options)
+    instrument_engine(async_engine.sync_engine)
+    async_write_engine = async_engine
+    if _split_writer:
+        _async_write_options = writer_engine_options(_async_url)
+        _async_write_options.pop("connect_args")
+        async_write_engine = create_async_engine(_async_url, **_async_write_options)
+        tune_sqlite(async_write_engine.sync_engine, _async_url, begin="BEGIN IMMEDIATE")
+        instrument_engine(async_write_engine.sync_engine)
+    if settings.SQLITE_TUNED and _async_url.startswith("sqlite"):
+        tune_sqlite(async_engine.sync_engine, _async_url, query_only=_split_writer)
+    AsyncSessionLocal = async_sessionmaker(
+        bind=async_engine, autoflush=False, expire_on_commit=False
+    )
+    AsyncWriteSessionLocal = async_sessionmaker(
+        bind=async_write_engine, autoflush=False, expire_on_commit=False
+    )
 
 
-def get_db():
-    db = SessionLocal()
+@asynccontextmanager
+async def _session(sync_factory, async_factory):
+    if async_factory is not None:
+        async with async_factory() as db:
+            try:
+                yield db
+            except SQLAlchemyError as e:
+                await db.rollback()
+                raise e
+        return
+
+    db = sync_factory()
     try:
         yield db
     except SQLAlchemyError as e:
-        db.rollback()
+        await run_in_threadpool(db.rollback)
         raise e
     finally:
-        db.close()
+        await run_in_threadpool(db.close)
+
+
+async def get_db():
+    """Yield a sync ``Session`` or, with ``ASYNC_DB``, an ``AsyncSession``.
+
+    Routes hand the session to ``run_db`` rather than calling services
+    directly, so the same route code works in both modes.
+    """
+    async with _session(SessionLocal, AsyncSessionLocal) as db:
+        yield db
+
+
+async def get_write_db():
+    """Like ``get_db``, for routes that change data.
+
+    With ``SQLITE_TUNED`` on a file database the session is bound to the
+    single writer connection; otherwise it is the same as ``get_db``.
+    """
+    async with _session(WriteSessionLocal, AsyncWriteSessionLocal) as db:
+        yield db
+
+
+async def run_db(db, fn, *args, **kwargs):
+    """Await a sync service function ``fn(session, *args, **kwargs)``.
+
+    An ``AsyncSession`` runs it through ``run_sync``, so every query inside
+    is awaited on the event loop instead of holding a worker thread; a plain
+    ``Session`` runs it in the threadpool, as a sync route would, except
+    while the request is being profiled, when it runs inline so the
+    profiler on the event loop thread sees it.
+    """
+    if hasattr(db, "run_sync"):
+        return await db.run_sync(fn, *args, **kwargs)
+    if profiling.profiling_active():
+        return fn(db, *args, **kwargs)
+    return await run_in_threadpool(fn, db, *args, **kwargs)
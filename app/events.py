@@ -0,0 +1,137 @@
+"""In-process pub/sub for inventory changes.
+
+Services call ``event_bus.publish`` after they commit, from whatever thread
+they run on; the event is JSON-encoded there once and handed to the event
+loop with ``call_soon_threadsafe``, which fans it out to the bounded queue
+of every subscriber to that machine. A subscriber whose queue is full is dropped rather than
+slowing everyone else down: its stream gets a final ``dropped`` message and
+the client reconnects and refetches.
+
+Events are compact deltas::
+
+    {"type": "price", "item_id": ..., "price": 25}
+    {"type": "stock", "item_id": ..., "slot_id": ..., "quantity": 3}
+    {"type": "item_added", "item_id": ..., "slot_id": ..., "name": ..., "price": ..., "quantity": ...}
+    {"type": "item_removed", "item_id": ..., "slot_id": ...}
+    {"type": "slot_added" | "slot_removed" | "slot_changed", "slot_id": ...}
+
+``slot_changed`` covers bulk changes (bulk add, import, bulk remove) where
+the client should refetch that slot.
+
+With a shared backplane every event is also announced to the other
+workers, which deliver it to their own subscribers. A worker that missed
+some of them drops all its subscribers, so their clients refetch.
+"""
+import asyncio
+import json
+
+from app.backplane import backplane
+from app.config import settings
+
+
+class Subscription:
+    __slots__ = ("machine_id", "queue")
+
+    def __init__(self, machine_id: str, size: int):
+        self.machine_id = machine_id
+        # (seq, type, data) tuples; None once dropped or shut down.
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=size)
+
+
+class EventBus:
+    def __init__(self, backplane=None):
+        self._loop: asyncio.AbstractEventLoop | None = None
+        # Machine id -> its subscribers, so an event only visits its own.
+        self._subscribers: dict[str, set[Subscription]] = {}
+        self._count = 0
+        self._seq = 0
+        self.dropped = 0
+        self._backplane = backplane if backplane is not None and backplane.shared else None
+        if self._backplane is not None:
+            self._backplane.subscribe("event", self._announced)
+
+    @property
+    def subscriber_count(self) -> int:
+        return self._count
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._loop = loop
+
+    def stop(self) -> None:
+        self._close_all()
+        self._loop = None
+
+    @property
+    def full(self) -> bool:
+        return self._count >= settings.EVENTS_MAX_SUBSCRIBERS
+
+    def subscribe(self, machine_id: str) -> Subscription | None:
+        """Register a subscriber; None when ``EVENTS_MAX_SUBSCRIBERS`` is reached."""
+        if self.full:
+            return None
+        sub = Subscription(machine_id, settings.EVENTS_QUEUE_SIZE)
+        self._subscribers.setdefault(machine_id, set()).add(sub)
+        self._count += 1
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        subs = self._subscribers.get(sub.machine_id)
+        if subs is None or sub not in subs:
+            return
+        subs.discard(sub)
+        self._count -= 1
+        if not subs:
+            del self._subscribers[sub.machine_id]
+
+    def publish(self, type: str, machine_id: str, **fields) -> None:
+        loop = self._loop
+        local = loop is not None and machine_id in self._subscribers
+        if not local and self._backplane is None:
+            return
+        data = json.dumps({"type": type, **fields}, separators=(",", ":"))
+        if self._backplane is not None:
+            self._backplane.publish("event", machine_id, f"{type} {data}")
+        if local:
+            self._schedule(loop, self._deliver, machine_id, type, data)
+
+    def _announced(self, machine_id: str | None, message: str) -> None:
+        """An event another worker published, or None for missed ones."""
+        loop = self._loop
+        if loop is None:
+            return
+        if machine_id is None:
+            self._schedule(loop, self._close_all)
+        elif machine_id in self._subscribers:
+            type, _, data = message.partition(" ")
+            self._schedule(loop, self._deliver, machine_id, type, data)
+
+    @staticmethod
+    def _schedule(loop: asyncio.AbstractEventLoop, fn, *args) -> None:
+        try:
+            loop.call_soon_threadsafe(fn, *args)
+        except RuntimeError:
+            pass  # loop already closed during shutdown
+
+    def _deliver(self, machine_id: str, type: str, data: str) -> None:
+        self._seq += 1
+        message = (self._seq, type, data)
+        for sub in list(self._subscribers.get(machine_id, ())):
+            try:
+                sub.queue.put_nowait(message)
+            except asyncio.QueueFull:
+                self.dropped += 1
+                self._close(sub)
+
+    def _close_all(self) -> None:
+        for subs in list(self._subscribers.values()):
+            for sub in list(subs):
+                self._close(sub)
+
+    def _close(self, sub: Subscription) -> None:
+        self.unsubscribe(sub)
+        while not sub.queue.empty():
+            sub.queue.get_nowait()
+        sub.queue.put_nowait(None)
+
+
+event_bus = EventBus(backplane)
@@ -0,0 +1,343 @@
+"""``Idempotency-Key`` support for retried POSTs.
+
+The first request with a key runs normally and its response (status,
+headers, body) is stored under the key; a retry with the same key and the
+same body gets the stored response back, marked ``Idempotent-Replayed``,
+without reaching the route again. Reusing a key with a different body is
+rejected with 422, and a retry that arrives while the first attempt is
+still running gets 409. 5xx responses are not stored, so those retries run
+again. The first attempt holds the key for ``IDEMPOTENCY_LOCK_TIMEOUT``
+only, so a worker that dies mid-request does not block retries for the
+whole ``IDEMPOTENCY_TTL``; its stored response is kept for the TTL.
+
+Keys live in a bounded LRU with a TTL in this process, with
+``IDEMPOTENCY_BACKEND=database`` in the ``idempotency_keys`` table, which
+every worker shares, or with ``IDEMPOTENCY_BACKEND=backplane`` in the
+backplane's entries, shared by the workers of one host with
+``BACKPLANE=sqlite``.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+from starlette.concurrency import run_in_threadpool
+from starlette.routing import compile_path
+
+from app import profiling
+from app.backplane import backplane
+from app.config import settings
+from app.db import WriteSessionLocal
+from app.models import IdempotencyKey
+
+MAX_KEY_LENGTH = 200
+
+# (method, path template) of the routes that honour the header.
+IDEMPOTENT_ROUTES = (
+    ("POST", "/purchase"),
+    ("POST", "/slots/{slot_id}/items"),
+    ("POST", "/machines/{machine_id}/purchase"),
+    ("POST", "/machines/{machine_id}/slots/{slot_id}/items"),
+)
+
+
+class IdempotencyRecord:
+    """A stored response; ``status`` is None while the first attempt runs."""
+
+    __slots__ = ("fingerprint", "status", "headers", "body", "expires_at")
+
+    def __init__(self, fingerprint: str, status: int | None = None,
+                 headers: list | None = None, body: bytes = b"", expires_at: float = 0.0):
+        self.fingerprint = fingerprint
+        self.status = status
+        self.headers = headers or []
+        self.body = body
+        self.expires_at = expires_at
+
+
+class MemoryIdempotencyBackend:
+    def __init__(self, max_entries: int, ttl: float, lock_timeout: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.lock_timeout = lock_timeout
+        self._entries: OrderedDict[str, IdempotencyRecord] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def begin(self, key: str, fingerprint: str) -> IdempotencyRecord | None:
+        """Claim ``key``; returns None if claimed, else the existing record."""
+        now = time.monotonic()
+        with self._lock:
+            record = self._entries.get(key)
+            if record is not None and record.expires_at > now:
+                self._entries.move_to_end(key)
+                return record
+            self._entries[key] = IdempotencyRecord(
+                fingerprint, expires_at=now + self.lock_timeout
+            )
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return None
+
+    def complete(self, key: str, status: int, headers: list, body: bytes) -> None:
+        with self._lock:
+            record = self._entries.get(key)
+            if record is not None:
+                record.status = status
+                record.headers = headers
+                record.body = body
+                record.expires_at = time.monotonic() + self.ttl
+
+    def release(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class DatabaseIdempotencyBackend:
+    # Seconds between sweeps of expired keys.
+    PURGE_INTERVAL = 60.0
+
+    def __init__(self, ttl: float, lock_timeout: float):
+        self.ttl = ttl
+        self.lock_timeout = lock_timeout
+        self._next_purge = 0.0
+
+    @staticmethod
+    def _record(row: IdempotencyKey) -> IdempotencyRecord:
+        return IdempotencyRecord(
+            row.fingerprint,
+            row.status_code,
+            json.loads(row.headers) if row.headers else [],
+            row.body or b"",
+        )
+
+    def begin(self, key: str, fingerprint: str) -> IdempotencyRecord | None:
+        now = datetime.utcnow()
+        expired = IdempotencyKey.expires_at <= now
+        if time.monotonic() < self._next_purge:
+            expired = expired & (IdempotencyKey.key == key)
+        else:
+            self._next_purge = time.monotonic() + self.PURGE_INTERVAL
+        db = WriteSessionLocal()
+        try:
+            with db.begin():
+                db.execute(
+                    delete(IdempotencyKey)
+                    .where(expired)
+                    .execution_options(synchronize_session=False)
+                )
+            try:
+                with db.begin():
+                    db.add(IdempotencyKey(
+                        key=key,
+                        fingerprint=fingerprint,
+                        expires_at=now + timedelta(seconds=self.lock_timeout),
+                    ))
+                return None
+            except IntegrityError:
+                row = db.execute(
+                    select(IdempotencyKey).where(IdempotencyKey.key == key)
+                ).scalar()
+                db.rollback()
+                # Gone again already (released or expired): let this one run.
+                return self._record(row) if row is not None else None
+        finally:
+            db.close()
+
+    def complete(self, key: str, status: int, headers: list, body: bytes) -> None:
+        db = WriteSessionLocal()
+        try:
+            with db.begin():
+                db.execute(
+                    update(IdempotencyKey)
+                    .where(IdempotencyKey.key == key)
+                    .values(
+                        status_code=status,
+                        headers=json.dumps(headers),
+                        body=body,
+                        expires_at=datetime.utcnow() + timedelta(seconds=self.ttl),
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+        finally:
+            db.close()
+
+    def release(self, key: str) -> None:
+        db = WriteSessionLocal()
+        try:
+            with db.begin():
+                db.execute(
+                    delete(IdempotencyKey)
+                    .where(IdempotencyKey.key == key)
+                    .execution_options(synchronize_session=False)
+                )
+        finally:
+            db.close()
+
+
+class BackplaneIdempotencyBackend:
+    PREFIX = "idempotency:"
+
+    def __init__(self, backplane, ttl: float, lock_timeout: float):
+        self.backplane = backplane
+        self.ttl = ttl
+        self.lock_timeout = lock_timeout
+        # Keys this worker claimed and has not finished -> their fingerprint.
+        self._claimed: dict[str, str] = {}
+
+    @staticmethod
+    def _encode(record: IdempotencyRecord) -> bytes:
+        head = json.dumps([record.fingerprint, record.status, record.headers])
+        return head.encode() + b"\n" + record.body
+
+    @staticmethod
+    def _decode(value: bytes) -> IdempotencyRecord:
+        head, _, body = value.partition(b"\n")
+        fingerprint, status, headers = json.loads(head)
+        return IdempotencyRecord(fingerprint, status, headers, body)
+
+    def begin(self, key: str, fingerprint: str) -> IdempotencyRecord | None:
+        value = self.backplane.claim(
+            self.PREFIX + key, self._encode(IdempotencyRecord(fingerprint)), self.lock_timeout
+        )
+        if value is not None:
+            return self._decode(value)
+        self._claimed[key] = fingerprint
+        return None
+
+    def complete(self, key: str, status: int, headers: list, body: bytes) -> None:
+        fingerprint = self._claimed.pop(key, None)
+        if fingerprint is not None:
+            self.backplane.replace(
+                self.PREFIX + key,
+                self._encode(IdempotencyRecord(fingerprint, status, headers, body)),
+                self.ttl,
+            )
+
+    def release(self, key: str) -> None:
+        self._claimed.pop(key, None)
+        self.backplane.delete(self.PREFIX + key)
+
+
+def make_backend():
+    ttl, lock_timeout = settings.IDEMPOTENCY_TTL, settings.IDEMPOTENCY_LOCK_TIMEOUT
+    if settings.IDEMPOTENCY_BACKEND == "database":
+        return DatabaseIdempotencyBackend(ttl, lock_timeout)
+    if settings.IDEMPOTENCY_BACKEND == "backplane":
+        return BackplaneIdempotencyBackend(backplane, ttl, lock_timeout)
+    return MemoryIdempotencyBackend(settings.IDEMPOTENCY_MAX_ENTRIES, ttl, lock_timeout)
+
+
+def _json_response(status: int, detail: str) -> tuple[int, list, bytes]:
+    body = json.dumps({"detail": detail}).encode()
+    return status, [[b"content-type", b"application/json"]], body
+
+
+class IdempotencyMiddleware:
+    def __init__(self, app, backend=None):
+        self.app = app
+        self.backend = backend or make_backend()
+        self.routes = [
+            (method, compile_path(path)[0]) for method, path in IDEMPOTENT_ROUTES
+        ]
+
+    def _applies(self, scope) -> bool:
+        return any(
+            scope["method"] == method and regex.match(scope["path"])
+            for method, regex in self.routes
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._applies(scope):
+            await self.app(scope, receive, send)
+            return
+        header = next(
+            (value for name, value in scope["headers"] if name == b"idempotency-key"), None
+        )
+        if header is None:
+            await self.app(scope, receive, send)
+            return
+        if not header or len(header) > MAX_KEY_LENGTH:
+            await self._send(send, *_json_response(
+                400, f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters"
+            ))
+            return
+
+        chunks = []
+        while True:
+            message = await receive()
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body"):
+                break
+        body = b"".join(chunks)
+
+        key = f"{scope['method']} {scope['path']} {header.decode('latin-1')}"
+        fingerprint = hashlib.sha256(body).hexdigest()
+        # Key bookkeeping is not part of the route's query budget.
+        existing = await run_in_threadpool(
+            profiling.untracked(self.backend.begin), key, fingerprint
+        )
+        if existing is not None:
+            if existing.fingerprint != fingerprint:
+                await self._send(send, *_json_response(
+                    422, "Idempotency-Key was already used with a different request"
+                ))
+            elif existing.status is None:
+                await self._send(send, *_json_response(
+                    409, "A request with this Idempotency-Key is still in progress"
+                ))
+            else:
+                headers = [[name.encode("latin-1"), value.encode("latin-1")]
+                           for name, value in existing.headers]
+                headers.append([b"idempotent-replayed", b"true"])
+                await self._send(send, existing.status, headers, existing.body)
+            return
+
+        replayed = False
+
+        async def replay_receive():
+            nonlocal replayed
+            if not replayed:
+                replayed = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        status = 500
+        headers: list = []
+        response_body: list[bytes] = []
+
+        async def capture(message):
+            nonlocal status, headers
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = [
+                    [name.decode("latin-1"), value.decode("latin-1")]
+                    for name, value in message.get("headers", [])
+                    if name.lower() != b"content-length"
+                ]
+            elif message["type"] == "http.response.body":
+                response_body.append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, replay_receive, capture)
+        except BaseException:
+            await run_in_threadpool(profiling.untracked(self.backend.release), key)
+            raise
+        if status >= 500:
+            await run_in_threadpool(profiling.untracked(self.backend.release), key)
+        else:
+            await run_in_threadpool(
+                profiling.untracked(self.backend.complete),
+                key, status, headers, b"".join(response_body),
+            )
+
+    @staticmethod
+    async def _send(send, status: int, headers: list, body: bytes) -> None:
+        headers = list(headers) + [[b"content-length", str(len(body)).encode()]]
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
@@ -1,26 +1,103 @@
-from contextlib import contextmanager
+import asyncio
+import os
+from contextlib import asynccontextmanager
 
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
 
-from app.db import Base, engine
-from app.routers import items, purchase, slots
+from app import migrate
+from app.backplane import backplane
+from app.config import settings
+from app.db import (
+    async_engine,
+    async_write_engine,
+    engine,
+    get_write_db,
+    run_db,
+    write_engine,
+)
+from app.events import event_bus
+from app.idempotency import IdempotencyMiddleware
+from app.profiling import RequestTimingMiddleware, TimedRoute, query_budget
+from app.routers import (
+    admin,
+    analytics,
+    coins,
+    events,
+    items,
+    machines,
+    metrics,
+    purchase,
+    restock,
+    slots,
+)
+from app.services import machine_service
+from app.services.change_engine import get_change_maker
+from app.services.inventory_store import inventory_store
+from app.services.reconciler import reconciler
 
-@contextmanager
-def lifespan(app: FastAPI):
-    import os
-    if os.getenv("ENVIRONMENT") == "development":
-        Base.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    prepare_schema = (
+        migrate.upgrade if os.getenv("ENVIRONMENT") == "development" else migrate.check_schema
+    )
+    if async_write_engine is not None:
+        async with async_write_engine.begin() as conn:
+            await conn.run_sync(prepare_schema)
+    else:
+        with write_engine.begin() as conn:
+            prepare_schema(conn)
+    async with asynccontextmanager(get_write_db)() as db:
+        await run_db(db, machine_service.ensure_default_machine)
+    get_change_maker()
+    event_bus.start(asyncio.get_running_loop())
+    await backplane.start()
+    await inventory_store.start()
+    reconciler.start()
     yield
+    await reconciler.stop()
+    await inventory_store.stop()
+    await backplane.stop()
+    event_bus.stop()
+    if async_engine is not None:
+        await async_engine.dispose()
+    if async_write_engine is not None and async_write_engine is not async_engine:
+        await async_write_engine.dispose()
+    engine.dispose()
+    if write_engine is not engine:
+        write_engine.dispose()
     
 
 app = FastAPI(title="Vending Machine API", lifespan=lifespan)
+app.router.route_class = TimedRoute
+app.add_middleware(IdempotencyMiddleware)
+if settings.METRICS_ENABLED or settings.QUERY_BUDGET_MODE != "off":
+    app.add_middleware(RequestTimingMiddleware)
+if settings.METRICS_ENABLED:
+    app.include_router(metrics.router)
 
-app.include_router(slots.router)
-app.include_router(items.router)
-app.include_router(purchase.router)
+app.include_router(machines.router)
+# Unprefixed routes act on the default machine.
+for router in (
+    slots.router,
+    items.router,
+    purchase.router,
+    coins.router,
+    events.router,
+    analytics.router,
+):
+    app.include_router(router)
+    app.include_router(
+        router,
+        prefix=machines.MACHINE_PREFIX,
+        dependencies=[Depends(machines.machine_path)],
+    )
+app.include_router(admin.router)
+# Fleet-wide: ?machine_id= narrows it to some machines.
+app.include_router(restock.router)
 
 
 @app.get("/health")
+@query_budget(0)
 def health():
     try:
         return {"status": "ok"}
@@ -0,0 +1,44 @@
+"""Schema migrations at startup.
+
+With ``ENVIRONMENT=development`` the app upgrades its database to the
+latest migration itself. Everywhere else it only compares the database's
+revision with the migrations it ships with, and refuses to start on a
+mismatch instead of failing later on a missing column or index. Run
+``alembic upgrade head`` as a deploy step.
+"""
+from pathlib import Path
+
+from alembic import command
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+
+ALEMBIC_INI = Path(__file__).resolve().parent.parent / "alembic.ini"
+
+
+class SchemaOutOfDate(RuntimeError):
+    pass
+
+
+def alembic_config(connection=None) -> Config:
+    config = Config(str(ALEMBIC_INI))
+    if connection is not None:
+        config.attributes["connection"] = connection
+    return config
+
+
+def upgrade(connection) -> None:
+    """Apply every pending migration on ``connection``."""
+    command.upgrade(alembic_config(connection), "head")
+
+
+def check_schema(connection) -> None:
+    """Raise ``SchemaOutOfDate`` unless the database is at the latest migration."""
+    expected = set(ScriptDirectory.from_config(alembic_config()).get_heads())
+    current = set(MigrationContext.configure(connection).get_current_heads())
+    if current != expected:
+        raise SchemaOutOfDate(
+            f"Database schema is at {', '.join(sorted(current)) or 'no revision'}, "
+            f"this build expects {', '.join(sorted(expected))}; "
+            "run `alembic upgrade head`"
+        )
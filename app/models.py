@@ -1,39 +1,196 @@
+import os
+import time
 import uuid
 from datetime import datetime
 
-from sqlalchemy import Column, DateTime, ForeignKey, Integer, String
+from sqlalchemy import (
+    BigInteger,
+    CheckConstraint,
+    Column,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    LargeBinary,
+    String,
+    Text,
+    text,
+)
 from sqlalchemy.dialects.sqlite import CHAR
 from sqlalchemy.orm import relationship
 
 from app.db import Base
 
 
+# Machine that the unprefixed routes (``/slots``, ``/purchase``, ...) act on.
+DEFAULT_MACHINE_ID = "default"
+
+
+# 64-bit surrogate key. On SQLite it must be spelled INTEGER to become the
+# rowid itself rather than a second index beside it.
+SurrogateKey = BigInteger().with_variant(Integer, "sqlite")
+
+
 def generate_uuid():
-    return str(uuid.uuid4())
+    """A UUIDv7 string: millisecond timestamp first, then random bits.
+
+    New public ids sort in creation order, so their unique index is appended
+    to rather than written at random pages.
+    """
+    value = (time.time_ns() // 1_000_000) << 80 | int.from_bytes(os.urandom(10), "big")
+    value = value & ~(0xF << 76) | 0x7 << 76  # version 7
+    value = value & ~(0x3 << 62) | 0x2 << 62  # RFC 4122 variant
+    return str(uuid.UUID(int=value))
+
+
+class Machine(Base):
+    """One physical vending machine; ``slot_count`` is kept by ``slot_service``."""
+
+    __tablename__ = "machines"
+
+    id = Column(String(64), primary_key=True)
+    name = Column(String(255), nullable=True)
+    max_slots = Column(Integer, nullable=False)
+    slot_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 
 class Slot(Base):
     __tablename__ = "slots"
+    __table_args__ = (
+        Index("ix_slots_machine_code", "machine_id", "code", unique=True),
+    )
 
-    id = Column(CHAR(36), primary_key=True, default=generate_uuid)
-    code = Column(String(32), unique=True, nullable=False, index=True)
+    pk = Column(SurrogateKey, primary_key=True, autoincrement=True)
+    # Public id, used in URLs and responses; rows refer to each other by pk.
+    id = Column(CHAR(36), unique=True, nullable=False, default=generate_uuid)
+    machine_id = Column(
+        String(64), ForeignKey("machines.id"), nullable=False, default=DEFAULT_MACHINE_ID
+    )
+    code = Column(String(32), nullable=False)
     capacity = Column(Integer, nullable=False)
     current_item_count = Column(Integer, nullable=False, default=0)
+    # Bumped by operator changes (restocks, removals), not by sales; the
+    # ETag that If-Match compares against.
+    version = Column(Integer, nullable=False, default=1)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     items = relationship("Item", back_populates="slot", cascade="save-update, merge")
 
+    __mapper_args__ = {"version_id_col": version}
+
 
 class Item(Base):
     __tablename__ = "items"
+    __table_args__ = (
+        # Trailing id keeps per-slot keyset pages in index order. It also
+        # covers the slot_pk foreign key, so deleting a slot does not scan.
+        Index("ix_items_slot", "slot_pk", "id"),
+        # The same, for rows still in stock (``?in_stock=true`` listings).
+        Index(
+            "ix_items_in_stock",
+            "slot_pk",
+            "id",
+            sqlite_where=text("quantity > 0"),
+            postgresql_where=text("quantity > 0"),
+        ),
+        CheckConstraint("quantity >= 0", name="quantity_nonnegative"),
+        CheckConstraint("price >= 0", name="price_nonnegative"),
+    )
 
-    id = Column(CHAR(36), primary_key=True, default=generate_uuid)
+    pk = Column(SurrogateKey, primary_key=True, autoincrement=True)
+    id = Column(CHAR(36), unique=True, nullable=False, default=generate_uuid)
+    # Copied from the slot so per-machine lookups never need a join.
+    machine_id = Column(
+        String(64), ForeignKey("machines.id"), nullable=False, default=DEFAULT_MACHINE_ID
+    )
     name = Column(String(255), nullable=False)
     price = Column(Integer, nullable=False)
-    slot_id = Column(CHAR(36), ForeignKey("slots.id", ondelete="SET NULL"), nullable=True)
+    slot_pk = Column(SurrogateKey, ForeignKey("slots.pk", ondelete="SET NULL"), nullable=True)
     quantity = Column(Integer, nullable=False, default=0)
+    # As on slots: price changes and removals bump it, sales do not.
+    version = Column(Integer, nullable=False, default=1)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     slot = relationship("Slot", back_populates="items")
+
+    __mapper_args__ = {"version_id_col": version}
+
+
+class CoinInventory(Base):
+    __tablename__ = "coin_inventory"
+
+    machine_id = Column(String(64), ForeignKey("machines.id"), primary_key=True)
+    denomination = Column(Integer, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class WriteBehindCheckpoint(Base):
+    """Last inventory-store log entry applied to the database (one row)."""
+
+    __tablename__ = "write_behind_checkpoint"
+
+    id = Column(Integer, primary_key=True)
+    seq = Column(Integer, nullable=False, default=0)
+
+
+class IdempotencyKey(Base):
+    """Stored response for an ``Idempotency-Key`` (``status_code`` NULL while running)."""
+
+    __tablename__ = "idempotency_keys"
+
+    key = Column(String(320), primary_key=True)
+    fingerprint = Column(CHAR(64), nullable=False)
+    status_code = Column(Integer, nullable=True)
+    headers = Column(Text, nullable=True)
+    body = Column(LargeBinary, nullable=True)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+
+class Sale(Base):
+    """One unit sold; rows are only ever inserted (``sales_ledger.record``)."""
+
+    __tablename__ = "sales"
+
+    pk = Column(SurrogateKey, primary_key=True, autoincrement=True)
+    machine_id = Column(String(64), ForeignKey("machines.id"), nullable=False)
+    # Public ids rather than foreign keys: the history outlives removed items.
+    item_id = Column(CHAR(36), nullable=False)
+    slot_id = Column(CHAR(36), nullable=True)
+    price = Column(Integer, nullable=False)
+    sold_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+
+class SalesHourly(Base):
+    """Units and revenue per item per hour, added to with every sale."""
+
+    __tablename__ = "sales_hourly"
+    # Clustered on the key: report ranges are read in order from the table.
+    __table_args__ = {"sqlite_with_rowid": False}
+
+    machine_id = Column(String(64), ForeignKey("machines.id"), primary_key=True)
+    # Hours since the Unix epoch, UTC; the day is ``hour // 24``.
+    hour = Column(Integer, primary_key=True)
+    item_id = Column(CHAR(36), primary_key=True)
+    slot_id = Column(CHAR(36), nullable=True)
+    units = Column(Integer, nullable=False, default=0)
+    revenue = Column(Integer, nullable=False, default=0)
+
+
+class SalesDaily(Base):
+    """``SalesHourly`` by day, so reports over months read a row per item per day."""
+
+    __tablename__ = "sales_daily"
+    __table_args__ = {"sqlite_with_rowid": False}
+
+    machine_id = Column(String(64), ForeignKey("machines.id"), primary_key=True)
+    # Days since the Unix epoch, UTC.
+    day = Column(Integer, primary_key=True)
+    item_id = Column(CHAR(36), primary_key=True)
+    slot_id = Column(CHAR(36), nullable=True)
+    units = Column(Integer, nullable=False, default=0)
+    revenue = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,392 @@
+"""Per-request timing: DB time, query count and serialization.
+
+``RequestTimingMiddleware`` opens a ``RequestStats`` for every HTTP request
+in a context variable. The cursor hooks in ``app.db`` add query time to it,
+and ``TimedRoute`` records how long the endpoint ran versus the whole route
+handler (request validation plus response serialization). The result goes
+out as a ``Server-Timing`` header and into the histograms served at
+``/metrics``.
+
+Endpoints declare how many SQL statements they may run with
+``@query_budget(n)``; routes that work in batches add to it per batch with
+``extend_budget``. The count is checked once the response has gone out,
+streamed bodies included. ``QUERY_BUDGET_MODE`` decides whether going over
+is ignored (``off``), logged (``warn``) or raised as ``QueryBudgetExceeded``
+(``raise``). Raising comes after the client has its answer and any write
+is committed, so it is for the test suite, where it fails the test; the
+suite runs every route that way, so a change that turns a fixed-query
+path into one query per row fails before it ships.
+
+With ``PROFILING_ENABLED`` a request carrying ``?profile=1`` or
+``X-Profile: 1`` is run under pyinstrument (cProfile when pyinstrument is
+not installed) and answered with the report instead of its own response.
+"""
+import cProfile
+import functools
+import inspect
+import io
+import logging
+import pstats
+import threading
+import time
+from contextvars import ContextVar
+from urllib.parse import parse_qs
+
+from fastapi.routing import APIRoute
+
+from app.config import settings
+
+try:
+    from pyinstrument import Profiler
+except ImportError:  # optional
+    Profiler = None
+
+DURATION_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(RuntimeError):
+    pass
+
+
+class RequestStats:
+    __slots__ = (
+        "route",
+        "budget",
+        "db_time",
+        "query_count",
+        "endpoint_time",
+        "handler_time",
+        "profiling",
+    )
+
+    def __init__(self, profiling: bool = False):
+        self.route: str | None = None
+        self.budget: int | None = None
+        self.db_time = 0.0
+        self.query_count = 0
+        self.endpoint_time = 0.0
+        self.handler_time = 0.0
+        self.profiling = profiling
+
+    @property
+    def serialize_time(self) -> float:
+        return max(self.handler_time - self.endpoint_time, 0.0)
+
+
+_current: ContextVar[RequestStats | None] = ContextVar("request_stats", default=None)
+
+
+def current_stats() -> RequestStats | None:
+    return _current.get()
+
+
+def profiling_active() -> bool:
+    stats = _current.get()
+    return stats is not None and stats.profiling
+
+
+def untracked(fn):
+    """Wrap ``fn`` so its queries are not counted against the current request."""
+    @functools.wraps(fn)
+    def run(*args, **kwargs):
+        token = _current.set(None)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current.reset(token)
+    return run
+
+
+# --- Route timing ---
+
+def query_budget(limit: int):
+    """Declare the most SQL statements one call of the endpoint may run.
+
+    Goes below the route decorator, so it is set when the route is built.
+    """
+    def decorate(endpoint):
+        endpoint.query_budget = limit
+        return endpoint
+    return decorate
+
+
+def extend_budget(queries: int) -> None:
+    """Allow the current request ``queries`` more statements, e.g. per batch."""
+    stats = _current.get()
+    if stats is not None and stats.budget is not None:
+        stats.budget += queries
+
+
+def check_budget(method: str, stats: RequestStats) -> None:
+    mode = settings.QUERY_BUDGET_MODE
+    limit = stats.budget
+    if limit is None or mode == "off" or stats.query_count <= limit:
+        return
+    message = f"{method} {stats.route} ran {stats.query_count} queries, budget is {limit}"
+    if mode == "raise":
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
+
+
+def _timed_endpoint(endpoint):
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                stats = _current.get()
+                if stats is not None:
+                    stats.endpoint_time += time.perf_counter() - start
+    else:
+        @functools.wraps(endpoint)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return endpoint(*args, **kwargs)
+            finally:
+                stats = _current.get()
+                if stats is not None:
+                    stats.endpoint_time += time.perf_counter() - start
+    return timed
+
+
+class TimedRoute(APIRoute):
+    """``APIRoute`` that times the endpoint apart from the handler around it.
+
+    Everything the handler does outside the endpoint (body and parameter
+    validation, dependencies, ``response_model`` serialization) is reported
+    as serialization time.
+    """
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        self.query_budget = getattr(endpoint, "query_budget", None)
+        super().__init__(path, _timed_endpoint(endpoint), **kwargs)
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+        route = self.path_format
+        budget = self.query_budget
+
+        async def timed_handler(request):
+            stats = _current.get()
+            if stats is None:
+                return await handler(request)
+            stats.route = route
+            stats.budget = budget
+            start = time.perf_counter()
+            try:
+                return await handler(request)
+            finally:
+                stats.handler_time += time.perf_counter() - start
+
+        return timed_handler
+
+
+# --- Histograms ---
+
+class Histogram:
+    """Cumulative-bucket histogram rendered in Prometheus text format."""
+
+    def __init__(self, name: str, help: str, buckets: tuple, labels: tuple[str, ...]):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.labels = labels
+        self._series: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_values: tuple, value: float) -> None:
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                # [bucket counts..., count, sum]
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {key: list(series) for key, series in self._series.items()}
+        for label_values, series in sorted(snapshot.items()):
+            labels = ",".join(
+                f'{name}="{_escape(value)}"' for name, value in zip(self.labels, label_values)
+            )
+            for bound, count in zip(self.buckets, series):
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound:g}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {series[-2]}')
+            lines.append(f"{self.name}_count{{{labels}}} {series[-2]}")
+            lines.append(f"{self.name}_sum{{{labels}}} {series[-1]:.6f}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Time from request start to the end of the response.",
+    DURATION_BUCKETS,
+    ("method", "route", "status"),
+)
+REQUEST_DB_TIME = Histogram(
+    "http_request_db_seconds",
+    "Time spent executing SQL during the request.",
+    DURATION_BUCKETS,
+    ("method", "route"),
+)
+REQUEST_QUERIES = Histogram(
+    "http_request_db_queries",
+    "SQL statements executed during the request.",
+    QUERY_BUCKETS,
+    ("method", "route"),
+)
+REQUEST_SERIALIZE_TIME = Histogram(
+    "http_request_serialize_seconds",
+    "Route handler time outside the endpoint (validation and serialization).",
+    DURATION_BUCKETS,
+    ("method", "route"),
+)
+HISTOGRAMS = (REQUEST_DURATION, REQUEST_DB_TIME, REQUEST_QUERIES, REQUEST_SERIALIZE_TIME)
+
+
+def render_metrics() -> str:
+    lines: list[str] = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+    return "\n".join(lines) + "\n"
+
+
+def record(method: str, status: int, stats: RequestStats, elapsed: float) -> None:
+    route = stats.route or "unmatched"
+    REQUEST_DURATION.observe((method, route, str(status)), elapsed)
+    if stats.route is None:
+        return
+    REQUEST_DB_TIME.observe((method, route), stats.db_time)
+    REQUEST_QUERIES.observe((method, route), stats.query_count)
+    REQUEST_SERIALIZE_TIME.observe((method, route), stats.serialize_time)
+
+
+def server_timing(stats: RequestStats, elapsed: float) -> str:
+    app_time = max(stats.endpoint_time - stats.db_time, 0.0)
+    return ", ".join((
+        f'db;dur={stats.db_time * 1000:.3f};desc="{stats.query_count} queries"',
+        f"app;dur={app_time * 1000:.3f}",
+        f"serialize;dur={stats.serialize_time * 1000:.3f}",
+        f"total;dur={elapsed * 1000:.3f}",
+    ))
+
+
+# --- Middleware ---
+
+def _profile_requested(scope) -> bool:
+    if not settings.PROFILING_ENABLED:
+        return False
+    for name, value in scope["headers"]:
+        if name == b"x-profile":
+            return value not in (b"", b"0", b"false")
+    query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+    return query.get("profile", ["0"])[-1] not in ("", "0", "false")
+
+
+class RequestTimingMiddleware:
+    """Time each HTTP request into a ``RequestStats``; see the module docstring.
+
+    ``Server-Timing`` is a header, so it is built at ``http.response.start``,
+    before a streamed body runs. Queries made while streaming, such as the
+    rows ``GET /slots/export`` reads in ``_export_chunks``, are missing from
+    it; they are counted in the ``/metrics`` histograms and the query
+    budget, which are taken once the body has gone out.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        if _profile_requested(scope):
+            await self._profile(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((
+                    b"server-timing",
+                    server_timing(stats, time.perf_counter() - start).encode(),
+                ))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            record(scope["method"], status, stats, time.perf_counter() - start)
+        check_budget(scope["method"], stats)
+
+    async def _profile(self, scope, receive, send):
+        # Services normally run in the threadpool, out of the profiler's
+        # sight; ``run_db`` runs them inline while ``stats.profiling`` is set.
+        stats = RequestStats(profiling=True)
+        token = _current.set(stats)
+        status = 500
+
+        async def swallow(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+
+        start = time.perf_counter()
+        try:
+            if Profiler is not None:
+                profiler = Profiler(async_mode="enabled")
+                with profiler:
+                    await self.app(scope, receive, swallow)
+                report = profiler.output_text(unicode=True)
+            else:
+                profiler = cProfile.Profile()
+                profiler.enable()
+                try:
+                    await self.app(scope, receive, swallow)
+                finally:
+                    profiler.disable()
+                out = io.StringIO()
+                pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(50)
+                report = out.getvalue()
+        finally:
+            _current.reset(token)
+        elapsed = time.perf_counter() - start
+
+        body = report.encode()
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/plain; charset=utf-8"),
+                (b"content-length", str(len(body)).encode()),
+                (b"x-profiled-status", str(status).encode()),
+                (b"server-timing", server_timing(stats, elapsed).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
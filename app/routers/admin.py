@@ -0,0 +1,34 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+
+from app.db import get_db, get_write_db, run_db
+from app.profiling import TimedRoute, query_budget
+from app.schemas import InventoryConsistencyResponse
+from app.services.inventory_store import run_write
+from app.services.reconciler import reconciler
+
+router = APIRouter(route_class=TimedRoute)
+
+
+@router.get(
+    "/admin/inventory/consistency",
+    response_model=InventoryConsistencyResponse,
+)
+@query_budget(0)
+async def inventory_consistency(
+    full: bool = Query(False),
+    db: Session = Depends(get_db),
+):
+    # Report only: drift found here is left for the repair route.
+    if full:
+        return await run_db(db, reconciler.check_all)
+    return reconciler.snapshot()
+
+
+@router.post(
+    "/admin/inventory/consistency/repair",
+    response_model=InventoryConsistencyResponse,
+)
+@query_budget(0)
+async def repair_inventory_consistency(db: Session = Depends(get_write_db)):
+    return await run_write(db, reconciler.check_all, repair=True)
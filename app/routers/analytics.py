@@ -0,0 +1,41 @@
+from datetime import datetime
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from app.db import get_db, run_db
+from app.profiling import TimedRoute, query_budget
+from app.routers.machines import current_machine
+from app.schemas import SalesReportResponse
+from app.services import sales_ledger
+
+router = APIRouter(route_class=TimedRoute)
+
+
+@router.get(
+    "/analytics/sales",
+    response_model=SalesReportResponse,
+    response_model_exclude_none=True,
+)
+@query_budget(1)
+async def sales_report(
+    start: datetime | None = Query(None, alias="from"),
+    end: datetime | None = Query(None, alias="to"),
+    group_by: str = Query("hour"),
+    machine_id: str = Depends(current_machine),
+    db: Session = Depends(get_db),
+):
+    dimensions = [name for name in group_by.split(",") if name]
+    unknown = [name for name in dimensions if name not in sales_ledger.GROUP_BY]
+    if unknown or len(set(dimensions)) != len(dimensions):
+        raise HTTPException(
+            status_code=422,
+            detail=f"group_by takes distinct values from: {', '.join(sales_ledger.GROUP_BY)}",
+        )
+    rows = await run_db(db, sales_ledger.sales_report, machine_id, start, end, dimensions)
+    return SalesReportResponse(
+        group_by=dimensions,
+        units=sum(row["units"] for row in rows),
+        revenue=sum(row["revenue"] for row in rows),
+        rows=rows,
+    )
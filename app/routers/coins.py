@@ -0,0 +1,56 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.db import get_db, get_write_db, run_db
+from app.profiling import TimedRoute, query_budget
+from app.routers.machines import current_machine
+from app.schemas import CoinInventoryResponse, CoinInventoryUpdate
+from app.services import coin_service
+from app.services.inventory_store import run_write
+
+router = APIRouter(route_class=TimedRoute)
+
+
+def _inventory_response(counts: dict[int, int]) -> CoinInventoryResponse:
+    return CoinInventoryResponse(
+        currency=settings.CURRENCY,
+        denominations={str(d): n for d, n in counts.items()},
+        total_value=sum(d * n for d, n in counts.items()),
+    )
+
+
+@router.get("/coins", response_model=CoinInventoryResponse)
+@query_budget(1)
+async def get_coin_inventory(
+    machine_id: str = Depends(current_machine),
+    db: Session = Depends(get_db),
+):
+    counts = await run_db(db, coin_service.get_inventory, machine_id)
+    return _inventory_response(counts)
+
+
+@router.put("/coins", response_model=CoinInventoryResponse)
+@query_budget(5)
+async def set_coin_inventory(
+    data: CoinInventoryUpdate,
+    machine_id: str = Depends(current_machine),
+    db: Session = Depends(get_write_db),
+):
+    try:
+        counts = await run_write(db, coin_service.set_inventory, machine_id, data.denominations)
+        return _inventory_response(counts)
+    except ValueError as e:
+        if e.args[0] == "machine_not_found":
+            raise HTTPException(status_code=404, detail="Machine not found")
+        if e.args[0] == "unsupported_denomination":
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unsupported denomination: {e.args[1]}",
+            )
+        if e.args[0] == "invalid_count":
+            raise HTTPException(
+                status_code=400,
+                detail=f"Coin count must be non-negative: {e.args[1]}",
+            )
+        raise
@@ -0,0 +1,94 @@
+import asyncio
+from typing import AsyncIterator
+
+from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+
+from app.config import settings
+from app.events import Subscription, event_bus
+from app.profiling import TimedRoute, query_budget
+from app.routers.machines import current_machine
+
+router = APIRouter(route_class=TimedRoute)
+
+# Queued events sent per write once a subscriber has fallen behind a little.
+SEND_BATCH = 64
+
+
+async def _next_batch(sub: Subscription) -> list | None:
+    """Wait up to a heartbeat for events; [] on timeout, None once closed."""
+    try:
+        message = await asyncio.wait_for(sub.queue.get(), settings.EVENTS_HEARTBEAT)
+    except asyncio.TimeoutError:
+        return []
+    batch = [message]
+    while message is not None and len(batch) < SEND_BATCH and not sub.queue.empty():
+        message = sub.queue.get_nowait()
+        batch.append(message)
+    return batch
+
+
+async def _sse(machine_id: str) -> AsyncIterator[bytes]:
+    # Subscribed only once the body is sent: a client gone before that
+    # never runs this, and so never holds a subscription.
+    sub = event_bus.subscribe(machine_id)
+    if sub is None:
+        # Filled up since the route checked; the client reconnects later.
+        yield b"retry: 3000\n\nevent: dropped\ndata: {}\n\n"
+        return
+    try:
+        yield b"retry: 3000\n\n"
+        while True:
+            batch = await _next_batch(sub)
+            if not batch:
+                yield b": ping\n\n"
+                continue
+            chunk = []
+            for message in batch:
+                if message is None:
+                    chunk.append("event: dropped\ndata: {}\n\n")
+                    yield "".join(chunk).encode()
+                    return
+                seq, type, data = message
+                chunk.append(f"id: {seq}\nevent: {type}\ndata: {data}\n\n")
+            yield "".join(chunk).encode()
+    finally:
+        event_bus.unsubscribe(sub)
+
+
+@router.get("/events")
+@query_budget(0)
+async def stream_events(machine_id: str = Depends(current_machine)):
+    if event_bus.full:
+        raise HTTPException(status_code=503, detail="Too many event subscribers")
+    return StreamingResponse(
+        _sse(machine_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.websocket("/events/ws")
+@query_budget(0)
+async def websocket_events(websocket: WebSocket, machine_id: str = Depends(current_machine)):
+    sub = event_bus.subscribe(machine_id)
+    if sub is None:
+        await websocket.close(code=1013)
+        return
+    try:
+        await websocket.accept()
+        while True:
+            batch = await _next_batch(sub)
+            if not batch:
+                await websocket.send_text('{"type":"ping"}')
+                continue
+            for message in batch:
+                if message is None:
+                    await websocket.send_text('{"type":"dropped"}')
+                    await websocket.close(code=1008)
+                    return
+                await websocket.send_text(message[2])
+    except WebSocketDisconnect:
+        pass
+    finally:
+        event_bus.unsubscribe(sub)
@@ -1,16 +1,23 @@
-from fastapi import APIRouter, Body, Depends, HTTPException, Query, status
+from fastapi import APIRouter, Body, Depends, Header, HTTPException, Query, Response, status
 from sqlalchemy.orm import Session
 
-from app.db import get_db
+from app import encoding
+from app.cache import if_match_versions, version_etag
+from app.db import get_db, get_write_db, run_db
+from app.profiling import TimedRoute, query_budget
+from app.routers.machines import current_machine
 from app.schemas import (
     BulkRemoveBody,
     ItemDetailResponse,
     ItemPriceUpdate,
     MessageResponse,
 )
-from app.services import item_service
+from app.services import inventory_ledger, item_service
+from app.services.inventory_store import inventory_store, run_write
 
-router = APIRouter()
+router = APIRouter(route_class=TimedRoute)
+
+ITEM_DETAIL_FIELDS = encoding.fields_of(ItemDetailResponse)
 
 
 def _slot_404():
@@ -21,30 +28,60 @@ def _item_404():
     raise HTTPException(status_code=404, detail="Item not found")
 
 
+def _changed_412(what: str):
+    raise HTTPException(
+        status_code=status.HTTP_412_PRECONDITION_FAILED,
+        detail=f"{what} has changed since it was read",
+    )
+
+
 @router.get("/items/{item_id}", response_model=ItemDetailResponse)
-def get_item(item_id: str, db: Session = Depends(get_db)):
-    item = item_service.get_item_by_id(db, item_id)
+@query_budget(1)
+async def get_item(
+    item_id: str,
+    machine_id: str = Depends(current_machine),
+    db: Session = Depends(get_db),
+):
+    if inventory_store.enabled:
+        item = inventory_store.get_item(machine_id, item_id)
+    else:
+        item = await run_db(db, item_service.get_item_by_id, machine_id, item_id)
     if not item:
         _item_404()
-    return ItemDetailResponse(
-        id=item.id,
-        name=item.name,
-        price=item.price,
-        quantity=item.quantity,
-        slot_id=item.slot_id,
+    return Response(
+        content=encoding.encode_row(ITEM_DETAIL_FIELDS, item),
+        media_type=encoding.MEDIA_TYPE,
+        headers={"ETag": version_etag(item.version)},
     )
 
 
 @router.patch("/items/{item_id}/price", response_model=MessageResponse)
-def update_item_price(
-    item_id: str, data: ItemPriceUpdate, db: Session = Depends(get_db)
+@query_budget(2)
+async def update_item_price(
+    item_id: str,
+    data: ItemPriceUpdate,
+    response: Response,
+    if_match: str | None = Header(None),
+    machine_id: str = Depends(current_machine),
+    db: Session = Depends(get_write_db),
 ):
     try:
-        item_service.update_item_price(db, item_id, data.price)
+        version = await run_write(
+            db,
+            item_service.update_item_price,
+            machine_id,
+            item_id,
+            data.price,
+            if_match_versions(if_match),
+        )
+        response.headers["ETag"] = version_etag(version)
         return MessageResponse(message="Price updated successfully")
     except ValueError as e:
         if str(e) == "item_not_found":
             _item_404()
+        if str(e) == "version_mismatch":
+            _changed_412("Item")
+        raise
     except Exception:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -54,20 +91,41 @@ def update_item_price(
 
 
 @router.delete("/slots/{slot_id}/items/{item_id}", response_model=MessageResponse)
-def remove_item_from_slot(
+@query_budget(2 * inventory_ledger.CAS_ATTEMPTS + 1)
+async def remove_item_from_slot(
     slot_id: str,
     item_id: str,
+    response: Response,
     quantity: int | None = Query(None, gt=0),
-    db: Session = Depends(get_db),
+    if_match: str | None = Header(None),
+    machine_id: str = Depends(current_machine),
+    db: Session = Depends(get_write_db),
 ):
     try:
-        item_service.remove_item_quantity(db, slot_id, item_id, quantity)
+        version = await run_write(
+            db,
+            item_service.remove_item_quantity,
+            machine_id,
+            slot_id,
+            item_id,
+            quantity,
+            if_match_versions(if_match),
+        )
+        if version is not None:
+            response.headers["ETag"] = version_etag(version)
         return MessageResponse(message="Item(s) removed successfully")
     except ValueError as e:
         if str(e) == "slot_not_found":
             _slot_404()
         if str(e) == "item_not_found":
             _item_404()
+        if str(e) == "version_mismatch":
+            _changed_412("Item")
+        if str(e) == "concurrent_update":
+            raise HTTPException(
+                status_code=409,
+                detail="Item is being updated concurrently, retry",
+            )
     except Exception:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -76,15 +134,25 @@ def remove_item_from_slot(
 
 
 @router.delete("/slots/{slot_id}/items", response_model=MessageResponse)
-def bulk_remove_items(
+@query_budget(5)
+async def bulk_remove_items(
     slot_id: str,
     body: BulkRemoveBody | None = Body(None),
-    db: Session = Depends(get_db),
+    if_match: str | None = Header(None),
+    machine_id: str = Depends(current_machine),
+    db: Session = Depends(get_write_db),
 ):
     item_ids = body.item_ids if body else None
 
     try:
-        item_service.bulk_remove_items(db, slot_id, item_ids)
+        await run_write(
+            db,
+            item_service.bulk_remove_items,
+            machine_id,
+            slot_id,
+            item_ids,
+            if_match_versions(if_match),
+        )
 
         if item_ids is None:
             return MessageResponse(message="Slot cleared successfully")
@@ -100,6 +168,9 @@ def bulk_remove_items(
         if error == "slot_not_found":
             _slot_404()
 
+        if error == "version_mismatch":
+            _changed_412("Slot")
+
         if error == "one_or_more_items_not_found":
             raise HTTPException(
                 status_code=404,
@@ -0,0 +1,94 @@
+from fastapi import APIRouter, Depends, HTTPException, Path, Query
+from fastapi.requests import HTTPConnection
+from sqlalchemy.orm import Session
+
+from app import profiling
+from app.config import settings
+from app.db import get_db, get_write_db, run_db
+from app.models import DEFAULT_MACHINE_ID
+from app.profiling import TimedRoute, query_budget
+from app.schemas import MACHINE_ID_PATTERN, MachineCreate, MachineResponse, MachineUpdate
+from app.services import machine_service
+from app.services.inventory_store import run_write
+
+router = APIRouter(route_class=TimedRoute)
+
+# Every machine-scoped router is mounted twice: at the root, acting on the
+# default machine, and under this prefix.
+MACHINE_PREFIX = "/machines/{machine_id}"
+
+
+async def machine_path(
+    machine_id: str = Path(..., pattern=MACHINE_ID_PATTERN),
+    db: Session = Depends(get_db),
+) -> None:
+    """Validates (and documents) the ``{machine_id}`` of prefixed routes.
+
+    A machine that does not exist is a 404 for every route under it, reads
+    included, rather than an empty machine.
+    """
+    if machine_service.is_known(machine_id):
+        return
+    profiling.extend_budget(1)
+    if not await run_db(db, machine_service.machine_exists, machine_id):
+        raise HTTPException(status_code=404, detail="Machine not found")
+
+
+def current_machine(connection: HTTPConnection) -> str:
+    """The machine a route acts on: its ``{machine_id}``, else the default."""
+    return connection.path_params.get("machine_id", DEFAULT_MACHINE_ID)
+
+
+def _machine_response(machine) -> MachineResponse:
+    return MachineResponse(
+        id=machine.id,
+        name=machine.name,
+        max_slots=machine.max_slots,
+        slot_count=machine.slot_count,
+    )
+
+
+@router.post("/machines", response_model=MachineResponse, status_code=201)
+@query_budget(2)
+async def create_machine(data: MachineCreate, db: Session = Depends(get_write_db)):
+    try:
+        machine = await run_write(db, machine_service.create_machine, data)
+    except ValueError as e:
+        if str(e) == "machine_exists":
+            raise HTTPException(status_code=409, detail="Machine id already exists")
+        raise
+    return _machine_response(machine)
+
+
+@router.get("/machines", response_model=list[MachineResponse])
+@query_budget(1)
+async def list_machines(
+    after: str | None = Query(None),
+    limit: int | None = Query(None, gt=0, le=settings.MAX_PAGE_SIZE),
+    db: Session = Depends(get_db),
+):
+    machines = await run_db(db, machine_service.list_machines, after, limit)
+    return [_machine_response(m) for m in machines]
+
+
+@router.get("/machines/{machine_id}", response_model=MachineResponse)
+@query_budget(1)
+async def get_machine(machine_id: str, db: Session = Depends(get_db)):
+    machine = await run_db(db, machine_service.get_machine, machine_id)
+    if machine is None:
+        raise HTTPException(status_code=404, detail="Machine not found")
+    return _machine_response(machine)
+
+
+@router.patch("/machines/{machine_id}", response_model=MachineResponse)
+@query_budget(3)
+async def update_machine(
+    machine_id: str, data: MachineUpdate, db: Session = Depends(get_write_db)
+):
+    try:
+        machine = await run_write(db, machine_service.set_slot_limit, machine_id, data.max_slots)
+    except ValueError as e:
+        if str(e) == "machine_not_found":
+            raise HTTPException(status_code=404, detail="Machine not found")
+        raise
+    return _machine_response(machine)
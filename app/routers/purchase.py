@@ -1,44 +1,150 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 
-from app.db import get_db
+from app.config import settings
+from app.db import get_write_db
+from app.profiling import TimedRoute, query_budget
+from app.routers.machines import current_machine
 from app.schemas import (
     ChangeBreakdownResponse,
+    PurchaseBatchRequest,
+    PurchaseBatchResponse,
+    PurchaseBatchResult,
     PurchaseRequest,
     PurchaseResponse,
 )
 from app.services import purchase_service
+from app.services.inventory_store import inventory_store, run_write
 
-router = APIRouter()
+router = APIRouter(route_class=TimedRoute)
 
 
-@router.post("/purchase", response_model=PurchaseResponse)
-def purchase(data: PurchaseRequest, db: Session = Depends(get_db)):
+def _purchase_error(e: ValueError) -> HTTPException | None:
+    if e.args[0] == "item_not_found":
+        return HTTPException(status_code=404, detail="Item not found")
+    if e.args[0] == "out_of_stock":
+        return HTTPException(
+            status_code=400,
+            detail={"error": "Item out of stock"},
+        )
+    if e.args[0] == "change_unavailable":
+        return HTTPException(
+            status_code=400,
+            detail={"error": "Exact change unavailable", "change": e.args[1]},
+        )
+    if e.args[0] == "invalid_coins":
+        return HTTPException(
+            status_code=400,
+            detail={"error": "Inserted coins do not match cash inserted"},
+        )
+    if e.args[0] == "coins_required":
+        return HTTPException(
+            status_code=400,
+            detail={"error": "Inserted coins are required when change is tracked"},
+        )
+    if e.args[0] == "insufficient_cash":
+        required = e.args[1]
+        inserted = e.args[2]
+        return HTTPException(
+            status_code=400,
+            detail={
+                "error": "Insufficient cash",
+                "required": required,
+                "inserted": inserted,
+            },
+        )
+    return None
+
+
+@router.post(
+    "/purchase",
+    response_model=PurchaseResponse,
+    response_model_exclude_none=True,
+)
+@query_budget(9)
+async def purchase(
+    data: PurchaseRequest,
+    machine_id: str = Depends(current_machine),
+    db: Session = Depends(get_write_db),
+):
     try:
-        result = purchase_service.purchase(db, data.item_id, data.cash_inserted)
+        if inventory_store.enabled and not settings.TRACK_COIN_INVENTORY:
+            result = await inventory_store.purchase(
+                machine_id, data.item_id, data.cash_inserted
+            )
+        else:
+            result = await run_write(
+                db,
+                purchase_service.purchase,
+                machine_id,
+                data.item_id,
+                data.cash_inserted,
+                data.coins_inserted,
+            )
         return PurchaseResponse(**result)
     except ValueError as e:
-        if e.args[0] == "item_not_found":
-            raise HTTPException(status_code=404, detail="Item not found")
-        if e.args[0] == "out_of_stock":
-            raise HTTPException(
-                status_code=400,
-                detail={"error": "Item out of stock"},
-            )
-        if e.args[0] == "insufficient_cash":
-            required = e.args[1]
-            inserted = e.args[2]
+        error = _purchase_error(e)
+        if error:
+            raise error
+        raise
+
+
+@router.post(
+    "/purchase/batch",
+    response_model=PurchaseBatchResponse,
+    response_model_exclude_none=True,
+)
+@query_budget(6)
+async def purchase_batch(
+    body: PurchaseBatchRequest,
+    machine_id: str = Depends(current_machine),
+    db: Session = Depends(get_write_db),
+):
+    if len(body.purchases) > settings.MAX_PURCHASE_BATCH:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Batch exceeds {settings.MAX_PURCHASE_BATCH} purchases",
+        )
+    try:
+        outcomes = await run_write(
+            db,
+            purchase_service.purchase_batch,
+            machine_id,
+            [(p.item_id, p.cash_inserted) for p in body.purchases],
+        )
+    except ValueError as e:
+        if str(e) == "stock_changed":
             raise HTTPException(
-                status_code=400,
-                detail={
-                    "error": "Insufficient cash",
-                    "required": required,
-                    "inserted": inserted,
-                },
+                status_code=409,
+                detail="Stock changed during batch, retry",
             )
         raise
 
+    results = []
+    for index, outcome in enumerate(outcomes):
+        if isinstance(outcome, ValueError):
+            error = _purchase_error(outcome)
+            results.append(PurchaseBatchResult(
+                index=index,
+                status_code=error.status_code,
+                error=error.detail,
+            ))
+        else:
+            results.append(PurchaseBatchResult(
+                index=index,
+                status_code=200,
+                result=PurchaseResponse(**outcome),
+            ))
+
+    succeeded = sum(1 for r in results if r.result is not None)
+    return PurchaseBatchResponse(
+        succeeded=succeeded,
+        failed=len(results) - succeeded,
+        results=results,
+    )
+
 
 @router.get("/purchase/change-breakdown", response_model=ChangeBreakdownResponse)
+@query_budget(0)
 def change_breakdown(change: int = Query(..., ge=0)):
     return purchase_service.change_breakdown(change)
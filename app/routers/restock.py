@@ -0,0 +1,40 @@
+from datetime import datetime
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.db import get_db, run_db
+from app.profiling import TimedRoute, query_budget
+from app.schemas import RestockPlanResponse
+from app.services import restock_service
+
+router = APIRouter(route_class=TimedRoute)
+
+
+@router.get("/restock/plan", response_model=RestockPlanResponse)
+@query_budget(2)
+async def restock_plan(
+    machine_id: list[str] | None = Query(None),
+    horizon_hours: float = Query(settings.RESTOCK_HORIZON_HOURS, gt=0),
+    limit: int | None = Query(None, gt=0),
+    db: Session = Depends(get_db),
+):
+    now = datetime.utcnow()
+    plan = await run_db(
+        db,
+        restock_service.restock_plan,
+        machine_id,
+        horizon_hours,
+        settings.RESTOCK_WINDOW_DAYS,
+        settings.RESTOCK_HALF_LIFE_DAYS,
+        now,
+    )
+    if limit is not None:
+        plan = plan[:limit]
+    return RestockPlanResponse(
+        generated_at=now,
+        horizon_hours=horizon_hours,
+        units=sum(entry["restock"] for entry in plan),
+        items=plan,
+    )
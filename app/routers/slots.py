@@ -1,20 +1,61 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import csv
+import io
+import json
+import math
+from typing import Iterator
+
+from fastapi import (
+    APIRouter,
+    Depends,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    status,
+)
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
-from app.db import get_db
+from app import encoding, profiling
+from app.cache import etag_matches
+from app.config import settings
+from app.db import SessionLocal, get_db, get_write_db, run_db
+from app.profiling import TimedRoute, query_budget
+from app.routers.machines import current_machine
 from app.schemas import (
     BulkAddResponse,
+    ItemBulkEntry,
     ItemBulkRequest,
     ItemCreate,
+    ItemImportError,
+    ItemImportResponse,
     ItemResponse,
     MessageResponse,
     SlotCreate,
     SlotFullView,
     SlotResponse,
 )
-from app.services import item_service, slot_service
+from app.services import import_service, item_service, slot_service
+from app.services.inventory_store import inventory_store, run_write
+
+router = APIRouter(route_class=TimedRoute)
+
+EXPORT_COLUMNS = (
+    "slot_id",
+    "slot_code",
+    "capacity",
+    "current_item_count",
+    "item_id",
+    "name",
+    "price",
+    "quantity",
+)
+EXPORT_CHUNK_CHARS = 64 * 1024
 
-router = APIRouter()
+# Read routes encode rows with these fields directly (see ``app.encoding``).
+SLOT_FIELDS = encoding.fields_of(SlotResponse)
+ITEM_FIELDS = encoding.fields_of(ItemResponse)
 
 
 def _slot_404():
@@ -22,16 +63,24 @@ def _slot_404():
 
 
 @router.post("/slots", response_model=SlotResponse, status_code=201)
-def create_slot(data: SlotCreate, db: Session = Depends(get_db)):
+@query_budget(3)
+async def create_slot(
+    data: SlotCreate,
+    machine_id: str = Depends(current_machine),
+    db: Session = Depends(get_write_db),
+):
     try:
-        slot = slot_service.create_slot(db, data)
+        slot = await run_write(db, slot_service.create_slot, machine_id, data)
         return SlotResponse(
             id=slot.id,
             code=slot.code,
             capacity=slot.capacity,
             current_item_count=slot.current_item_count,
+            version=slot.version,
         )
     except ValueError as e:
+        if str(e) == "machine_not_found":
+            raise HTTPException(status_code=404, detail="Machine not found")
         if str(e) == "slot_limit_reached":
             raise HTTPException(status_code=400, detail="Slot limit reached")
         if str(e) == "slot_code_exists":
@@ -40,28 +89,92 @@ def create_slot(data: SlotCreate, db: Session = Depends(get_db)):
 
 
 @router.get("/slots", response_model=list[SlotResponse])
-def list_slots(db: Session = Depends(get_db)):
-    slots = slot_service.list_slots(db)
-    return [
-        SlotResponse(
-            id=s.id,
-            code=s.code,
-            capacity=s.capacity,
-            current_item_count=s.current_item_count,
-        )
-        for s in slots
-    ]
+@query_budget(1)
+async def list_slots(
+    after: str | None = Query(None),
+    limit: int | None = Query(None, gt=0, le=settings.MAX_PAGE_SIZE),
+    machine_id: str = Depends(current_machine),
+    db: Session = Depends(get_db),
+):
+    if inventory_store.enabled:
+        slots = inventory_store.list_slots(machine_id, after, limit)
+    else:
+        slots = await run_db(db, slot_service.list_slots, machine_id, after, limit)
+    return Response(
+        content=encoding.encode_rows(SLOT_FIELDS, slots),
+        media_type=encoding.MEDIA_TYPE,
+    )
 
 
 @router.get("/slots/full-view", response_model=list[SlotFullView])
-def full_view(db: Session = Depends(get_db)):
-    return slot_service.get_full_view(db)
+@query_budget(1)
+async def full_view(
+    if_none_match: str | None = Header(None),
+    machine_id: str = Depends(current_machine),
+    db: Session = Depends(get_db),
+):
+    if inventory_store.enabled:
+        body, etag = inventory_store.full_view_payload(machine_id)
+    else:
+        body, etag = await run_db(db, slot_service.get_full_view_payload, machine_id)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    return Response(
+        content=body,
+        media_type=encoding.MEDIA_TYPE,
+        headers={"ETag": etag},
+    )
+
+
+def _export_chunks(machine_id: str, format: str) -> Iterator[bytes]:
+    # Own session: the response body is produced after the route returns.
+    db = SessionLocal()
+    try:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if format == "csv":
+            writer.writerow(EXPORT_COLUMNS)
+        for row in slot_service.iter_inventory_rows(db, machine_id):
+            if format == "csv":
+                writer.writerow(row)
+            else:
+                buffer.write(json.dumps(row._asdict()))
+                buffer.write("\n")
+            if buffer.tell() >= EXPORT_CHUNK_CHARS:
+                yield buffer.getvalue().encode()
+                buffer.seek(0)
+                buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode()
+    finally:
+        db.close()
+
+
+@router.get("/slots/export")
+@query_budget(1)
+async def export_inventory(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    machine_id: str = Depends(current_machine),
+):
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        _export_chunks(machine_id, format),
+        media_type=media_type,
+        headers={
+            "Content-Disposition": f'attachment; filename="inventory.{format}"'
+        },
+    )
 
 
 @router.delete("/slots/{slot_id}", response_model=MessageResponse)
-def delete_slot(slot_id: str, db: Session = Depends(get_db)):
+@query_budget(2)
+async def delete_slot(
+    slot_id: str,
+    machine_id: str = Depends(current_machine),
+    db: Session = Depends(get_write_db),
+):
     try:
-        slot_service.delete_slot(db, slot_id)
+        await run_write(db, slot_service.delete_slot, machine_id, slot_id)
         return MessageResponse(message="Slot removed successfully")
     except ValueError as e:
         if str(e) == "slot_not_found":
@@ -88,9 +201,15 @@ def delete_slot(slot_id: str, db: Session = Depends(get_db)):
         )
 
 @router.post("/slots/{slot_id}/items", response_model=ItemResponse, status_code=201)
-def add_item_to_slot(slot_id: str, data: ItemCreate, db: Session = Depends(get_db)):
+@query_budget(3)
+async def add_item_to_slot(
+    slot_id: str,
+    data: ItemCreate,
+    machine_id: str = Depends(current_machine),
+    db: Session = Depends(get_write_db),
+):
     try:
-        item = item_service.add_item_to_slot(db, slot_id, data)
+        item = await run_write(db, item_service.add_item_to_slot, machine_id, slot_id, data)
         return ItemResponse(
             id=item.id,
             name=item.name,
@@ -113,9 +232,19 @@ def add_item_to_slot(slot_id: str, data: ItemCreate, db: Session = Depends(get_d
 
 
 @router.post("/slots/{slot_id}/items/bulk", response_model=BulkAddResponse)
-def bulk_add_items(slot_id: str, body: ItemBulkRequest, db: Session = Depends(get_db)):
+@query_budget(2)
+async def bulk_add_items(
+    slot_id: str,
+    body: ItemBulkRequest,
+    machine_id: str = Depends(current_machine),
+    db: Session = Depends(get_write_db),
+):
+    # One executemany per chunk of items.
+    profiling.extend_budget(math.ceil(len(body.items) / settings.BULK_INSERT_CHUNK_SIZE))
     try:
-        added = item_service.bulk_add_items(db, slot_id, body.items)
+        added = await run_write(
+            db, item_service.bulk_add_items, machine_id, slot_id, body.items
+        )
         return BulkAddResponse(added_count=added)
     except ValueError as e:
         error_msg = str(e)
@@ -134,13 +263,28 @@ def bulk_add_items(slot_id: str, body: ItemBulkRequest, db: Session = Depends(ge
 
 
 @router.get("/slots/{slot_id}/items", response_model=list[ItemResponse])
-def list_slot_items(slot_id: str, db: Session = Depends(get_db)):
+@query_budget(2)
+async def list_slot_items(
+    slot_id: str,
+    after: str | None = Query(None),
+    limit: int | None = Query(None, gt=0, le=settings.MAX_PAGE_SIZE),
+    in_stock: bool = Query(False),
+    machine_id: str = Depends(current_machine),
+    db: Session = Depends(get_db),
+):
     try:
-        items = item_service.list_items_by_slot(db, slot_id)
-        return [
-            ItemResponse(id=i.id, name=i.name, price=i.price, quantity=i.quantity)
-            for i in items
-        ]
+        if inventory_store.enabled:
+            items = inventory_store.list_items_by_slot(
+                machine_id, slot_id, after, limit, in_stock
+            )
+        else:
+            items = await run_db(
+                db, item_service.list_items_by_slot, machine_id, slot_id, after, limit, in_stock
+            )
+        return Response(
+            content=encoding.encode_rows(ITEM_FIELDS, items),
+            media_type=encoding.MEDIA_TYPE,
+        )
     except ValueError as e:
         if str(e) == "slot_not_found":
             _slot_404()
@@ -149,3 +293,82 @@ def list_slot_items(slot_id: str, db: Session = Depends(get_db)):
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to list items"
         )
+
+
+@router.post("/slots/{slot_id}/items/import", response_model=ItemImportResponse)
+@query_budget(1)
+async def import_items(
+    slot_id: str,
+    request: Request,
+    format: str | None = Query(None, pattern="^(ndjson|csv)$"),
+    machine_id: str = Depends(current_machine),
+    db: Session = Depends(get_write_db),
+):
+    if inventory_store.enabled:
+        found = inventory_store.slot_exists(machine_id, slot_id)
+    else:
+        found = await run_db(db, slot_service.slot_exists, machine_id, slot_id)
+    if not found:
+        _slot_404()
+
+    if format is None:
+        content_type = request.headers.get("content-type", "")
+        format = "csv" if "csv" in content_type else "ndjson"
+
+    imported = 0
+    error_count = 0
+    errors: list[ItemImportError] = []
+    batch: list[tuple[int, ItemBulkEntry]] = []
+
+    def report(line: int, error: str):
+        nonlocal error_count
+        error_count += 1
+        if len(errors) < settings.IMPORT_MAX_ERRORS:
+            errors.append(ItemImportError(line=line, error=error))
+
+    async def flush():
+        nonlocal imported
+        # The slot, its reserve and one executemany per chunk of the batch.
+        profiling.extend_budget(2 + math.ceil(len(batch) / settings.BULK_INSERT_CHUNK_SIZE))
+        try:
+            added, rejected = await run_write(
+                db, item_service.import_item_batch, machine_id, slot_id, batch
+            )
+        except ValueError as e:
+            if str(e) == "slot_not_found":
+                _slot_404()
+            raise
+        imported += added
+        for line, error in rejected:
+            report(line, error)
+        batch.clear()
+
+    header = None
+    async for line, text in import_service.iter_lines(request.stream()):
+        if not text.strip():
+            continue
+        try:
+            if format == "csv":
+                if header is None:
+                    header = import_service.parse_csv_header(text)
+                    continue
+                entry = import_service.parse_csv_row(header, text)
+            else:
+                entry = import_service.parse_ndjson_row(text)
+        except ValueError as e:
+            if format == "csv" and header is None:
+                raise HTTPException(status_code=400, detail=f"Invalid CSV header: {e}")
+            report(line, str(e))
+            continue
+        batch.append((line, entry))
+        if len(batch) >= settings.IMPORT_BATCH_SIZE:
+            await flush()
+    if batch:
+        await flush()
+
+    return ItemImportResponse(
+        imported_count=imported,
+        error_count=error_count,
+        errors=errors,
+        errors_truncated=error_count > len(errors),
+    )
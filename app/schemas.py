@@ -1,7 +1,33 @@
+from datetime import date, datetime
+
 from pydantic import BaseModel, Field
 from typing import Optional
 
 
+# Machine ids appear in URLs, so they are kept to URL-safe characters.
+MACHINE_ID_PATTERN = r"^[A-Za-z0-9._-]{1,64}$"
+
+
+# --- Machine ---
+class MachineCreate(BaseModel):
+    id: Optional[str] = Field(None, pattern=MACHINE_ID_PATTERN)
+    name: Optional[str] = None
+    max_slots: Optional[int] = Field(None, gt=0)
+
+
+class MachineUpdate(BaseModel):
+    max_slots: int = Field(..., gt=0)
+
+
+class MachineResponse(BaseModel):
+    id: str
+    name: Optional[str] = None
+    max_slots: int
+    slot_count: int
+
+    model_config = {"from_attributes": True}
+
+
 # --- Slot ---
 class SlotCreate(BaseModel):
     code: str
@@ -13,6 +39,8 @@ class SlotResponse(BaseModel):
     code: str
     capacity: int
     current_item_count: int
+    # What ``If-Match`` on ``DELETE /slots/{slot_id}/items`` compares with.
+    version: int
 
     model_config = {"from_attributes": True}
 
@@ -74,6 +102,8 @@ class SlotFullView(BaseModel):
 class PurchaseRequest(BaseModel):
     item_id: str
     cash_inserted: int = Field(..., ge=0)
+    # Denomination -> count; required when coin inventory is tracked.
+    coins_inserted: Optional[dict[int, int]] = None
 
 
 class PurchaseResponse(BaseModel):
@@ -83,6 +113,24 @@ class PurchaseResponse(BaseModel):
     change_returned: int
     remaining_quantity: int
     message: str
+    change_denominations: Optional[dict[str, int]] = None
+
+
+class PurchaseBatchRequest(BaseModel):
+    purchases: list[PurchaseRequest]
+
+
+class PurchaseBatchResult(BaseModel):
+    index: int
+    status_code: int
+    result: Optional[PurchaseResponse] = None
+    error: Optional[dict | str] = None
+
+
+class PurchaseBatchResponse(BaseModel):
+    succeeded: int
+    failed: int
+    results: list[PurchaseBatchResult]
 
 
 class InsufficientCashError(BaseModel):
@@ -105,10 +153,92 @@ class BulkAddResponse(BaseModel):
     added_count: int
 
 
+class ItemImportError(BaseModel):
+    line: int
+    error: str
+
+
+class ItemImportResponse(BaseModel):
+    imported_count: int
+    error_count: int
+    errors: list[ItemImportError]
+    errors_truncated: bool = False
+
+
 class BulkRemoveBody(BaseModel):
     item_ids: Optional[list[str]] = None
 
 
+# --- Coin inventory ---
+class CoinInventoryResponse(BaseModel):
+    currency: str
+    denominations: dict[str, int]
+    total_value: int
+
+
+class CoinInventoryUpdate(BaseModel):
+    denominations: dict[int, int]
+
+
+# --- Admin ---
+class InventoryDrift(BaseModel):
+    slot_id: str
+    code: str
+    recorded: int
+    actual: int
+
+
+class InventoryConsistencyResponse(BaseModel):
+    # None until a full pass has finished without finding drift.
+    consistent: Optional[bool]
+    drifted: list[InventoryDrift]
+    checked_slots: int
+    full_passes: int
+    repaired: int
+    last_full_pass_at: Optional[datetime] = None
+
+
+# --- Analytics ---
+class SalesReportRow(BaseModel):
+    # Only the fields named in ``group_by`` are present.
+    item_id: Optional[str] = None
+    slot_id: Optional[str] = None
+    hour: Optional[datetime] = None
+    day: Optional[date] = None
+    units: int
+    revenue: int
+
+
+class SalesReportResponse(BaseModel):
+    group_by: list[str]
+    units: int
+    revenue: int
+    rows: list[SalesReportRow]
+
+
+# --- Restock planning ---
+class RestockPlanEntry(BaseModel):
+    machine_id: str
+    slot_id: str
+    slot_code: str
+    item_id: str
+    name: str
+    quantity: int
+    units_per_hour: float
+    hours_to_stockout: float
+    stockout_at: datetime
+    restock: int
+    # Room left in the slot before this item's restock.
+    slot_free: int
+
+
+class RestockPlanResponse(BaseModel):
+    generated_at: datetime
+    horizon_hours: float
+    units: int
+    items: list[RestockPlanEntry]
+
+
 # --- Change breakdown (bonus) ---
 class ChangeBreakdownResponse(BaseModel):
     change: int
@@ -0,0 +1,160 @@
+import threading
+
+from app.config import settings
+
+
+class ChangeMaker:
+    """Minimal-coin change for one denomination set.
+
+    Optimal breakdowns for every amount up to ``max_amount`` are computed once
+    with dynamic programming, so a lookup is a list index. Larger amounts are
+    paid down with the largest coin until the remainder falls inside the
+    table. For canonical systems (where greedy is optimal) that is greedy; for
+    the rest the table is grown until it is exact there too.
+    """
+
+    def __init__(self, denominations: list[int], max_amount: int):
+        self.denominations = tuple(sorted({d for d in denominations if d > 0}, reverse=True))
+        # Any non-canonical system has a counterexample below the sum of its
+        # two largest coins (Kozen & Zaks), so the table always covers that.
+        self.max_amount = max(max_amount, sum(self.denominations[:2]))
+        self._table = self._build()
+        self.canonical = self._check_canonical()
+        if not self.canonical:
+            # An optimal breakdown holds fewer than `largest` of any smaller
+            # coin d (that many are worth as much as d of the largest), so its
+            # smaller coins are worth less than this and fit in the table.
+            bound = self.denominations[0] * sum(self.denominations[1:])
+            if bound > self.max_amount:
+                self.max_amount = bound
+                self._table = self._build()
+
+    def _build(self) -> list[tuple[int, ...] | None]:
+        k = len(self.denominations)
+        table: list[tuple[int, ...] | None] = [(0,) * k]
+        coins = [0]
+        for amount in range(1, self.max_amount + 1):
+            best, best_i = None, -1
+            for i, d in enumerate(self.denominations):
+                if d > amount or table[amount - d] is None:
+                    continue
+                if best is None or coins[amount - d] + 1 < best:
+                    best, best_i = coins[amount - d] + 1, i
+            if best is None:
+                table.append(None)
+                coins.append(0)
+                continue
+            prev = table[amount - self.denominations[best_i]]
+            table.append(prev[:best_i] + (prev[best_i] + 1,) + prev[best_i + 1:])
+            coins.append(best)
+        return table
+
+    def _check_canonical(self) -> bool:
+        limit = sum(self.denominations[:2])
+        for amount in range(1, limit):
+            optimal = self._table[amount]
+            if optimal is None:
+                continue
+            greedy = self._greedy(amount)
+            if greedy is None or sum(greedy) != sum(optimal):
+                return False
+        return True
+
+    def _greedy(self, amount: int) -> tuple[int, ...] | None:
+        counts = []
+        for d in self.denominations:
+            counts.append(amount // d)
+            amount %= d
+        return tuple(counts) if amount == 0 else None
+
+    def counts(self, amount: int) -> tuple[int, ...] | None:
+        """Coin counts aligned with ``denominations``, or None if unpayable."""
+        if amount <= self.max_amount:
+            return self._table[amount]
+        if self.canonical:
+            return self._greedy(amount)
+        largest = self.denominations[0]
+        best, best_n = None, 0
+        for n in range(-(-(amount - self.max_amount) // largest), amount // largest + 1):
+            tail = self._table[amount - n * largest]
+            if tail is not None and (best is None or n + sum(tail) < best_n + sum(best)):
+                best, best_n = tail, n
+        if best is None:
+            return None
+        return (best[0] + best_n,) + best[1:]
+
+    def bounded_counts(self, amount: int, available: dict[int, int]) -> dict[int, int] | None:
+        """Minimal-coin change using at most ``available[d]`` coins of each ``d``.
+
+        The unbounded optimum is tried first, which is a table lookup and
+        covers a well-stocked cash box. Only when that needs coins we don't
+        have is the bounded problem solved, memoized on (coin, remainder).
+        """
+        if amount == 0:
+            return {}
+        ideal = self.counts(amount)
+        if ideal is not None and all(
+            n <= available.get(d, 0) for d, n in zip(self.denominations, ideal)
+        ):
+            return {d: n for d, n in zip(self.denominations, ideal) if n > 0}
+
+        coins = sorted((d for d, n in available.items() if d > 0 and n > 0), reverse=True)
+        memo: dict[tuple[int, int], tuple[int, ...] | None] = {}
+
+        def solve(i: int, remaining: int) -> tuple[int, ...] | None:
+            if remaining == 0:
+                return (0,) * (len(coins) - i)
+            if i == len(coins):
+                return None
+            key = (i, remaining)
+            if key in memo:
+                return memo[key]
+            d = coins[i]
+            next_coin = coins[i + 1] if i + 1 < len(coins) else None
+            best, best_total = None, None
+            for k in range(min(available[d], remaining // d), -1, -1):
+                left = remaining - k * d
+                if best_total is not None:
+                    # Fewer of this coin only helps if smaller coins could
+                    # still beat the best total found so far.
+                    if left and (next_coin is None or k + -(-left // next_coin) >= best_total):
+                        break
+                rest = solve(i + 1, left)
+                if rest is not None and (best_total is None or k + sum(rest) < best_total):
+                    best, best_total = (k,) + rest, k + sum(rest)
+            memo[key] = best
+            return best
+
+        found = solve(0, amount)
+        if found is None:
+            return None
+        return {d: n for d, n in zip(coins, found) if n > 0}
+
+    def breakdown(self, amount: int) -> dict[str, int]:
+        counts = self.counts(amount)
+        if counts is None:
+            # Not payable exactly: hand back as much as greedy can, as before.
+            counts = []
+            for d in self.denominations:
+                counts.append(amount // d)
+                amount %= d
+        return {
+            str(d): n for d, n in zip(self.denominations, counts) if n > 0
+        }
+
+
+_lock = threading.Lock()
+_maker: ChangeMaker | None = None
+_maker_key: tuple | None = None
+
+
+def get_change_maker() -> ChangeMaker:
+    """Return the table for the current settings, rebuilding if they changed."""
+    global _maker, _maker_key
+    key = (tuple(settings.SUPPORTED_DENOMINATIONS), settings.CHANGE_TABLE_MAX_AMOUNT)
+    if _maker_key != key:
+        with _lock:
+            if _maker_key != key:
+                _maker = ChangeMaker(list(key[0]), key[1])
+                _maker_key = key
+    return _maker
@@ -0,0 +1,162 @@
+from sqlalchemy import bindparam, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import CoinInventory, Machine
+from app.services.change_engine import get_change_maker
+
+_UPSERT = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+
+def get_inventory(db: Session, machine_id: str) -> dict[int, int]:
+    rows = db.execute(
+        select(CoinInventory.denomination, CoinInventory.count)
+        .where(CoinInventory.machine_id == machine_id)
+        .order_by(CoinInventory.denomination.desc())
+    ).all()
+    return {row.denomination: row.count for row in rows}
+
+
+def set_inventory(db: Session, machine_id: str, counts: dict[int, int]) -> dict[int, int]:
+    """Overwrite the stored count of each given denomination (refill/audit)."""
+    for denomination, count in counts.items():
+        if denomination not in settings.SUPPORTED_DENOMINATIONS:
+            raise ValueError("unsupported_denomination", denomination)
+        if count < 0:
+            raise ValueError("invalid_count", denomination)
+
+    with db.begin():
+        if db.get(Machine, machine_id) is None:
+            raise ValueError("machine_not_found")
+        stored = set(db.execute(
+            select(CoinInventory.denomination)
+            .where(
+                CoinInventory.machine_id == machine_id,
+                CoinInventory.denomination.in_(counts),
+            )
+        ).scalars())
+        new = [d for d in counts if d not in stored]
+        if new:
+            db.execute(
+                insert(CoinInventory),
+                [
+                    {"machine_id": machine_id, "denomination": d, "count": counts[d]}
+                    for d in new
+                ],
+            )
+        if stored:
+            table = CoinInventory.__table__
+            db.execute(
+                table.update()
+                .where(
+                    table.c.machine_id == machine_id,
+                    table.c.denomination == bindparam("b_denomination"),
+                )
+                .values(count=bindparam("b_count")),
+                [{"b_denomination": d, "b_count": counts[d]} for d in stored],
+            )
+    return get_inventory(db, machine_id)
+
+
+def validate_inserted(coins_inserted: dict[int, int] | None, cash_inserted: int) -> None:
+    # The coins go into the cash box that change is paid from, so it must
+    # be known which they are.
+    if coins_inserted is None:
+        raise ValueError("coins_required")
+    for denomination, count in coins_inserted.items():
+        if denomination not in settings.SUPPORTED_DENOMINATIONS or count < 0:
+            raise ValueError("invalid_coins")
+    if sum(d * n for d, n in coins_inserted.items()) != cash_inserted:
+        raise ValueError("invalid_coins")
+
+
+def settle_change(
+    db: Session, machine_id: str, change: int, coins_inserted: dict[int, int]
+) -> dict[int, int]:
+    """Bank the inserted coins and take ``change`` out of the cash box.
+
+    Must run inside the caller's transaction. Counts are adjusted with a
+    guarded ``count + :delta >= 0`` UPDATE, so two sales racing for the last
+    coins cannot both succeed; the loser raises ``change_unavailable`` and
+    its transaction (including the stock decrement) rolls back.
+    Denominations without a row yet can only be added to; two sales adding
+    the first of one are both counted.
+    """
+    inserted = coins_inserted
+    stock = dict(
+        db.execute(
+            select(CoinInventory.denomination, CoinInventory.count)
+            .where(CoinInventory.machine_id == machine_id)
+        ).all()
+    )
+    available = dict(stock)
+    for denomination, count in inserted.items():
+        available[denomination] = available.get(denomination, 0) + count
+
+    dispensed = get_change_maker().bounded_counts(change, available)
+    if dispensed is None:
+        raise ValueError("change_unavailable", change)
+
+    deltas = {}
+    for denomination in set(inserted) | set(dispensed):
+        delta = inserted.get(denomination, 0) - dispensed.get(denomination, 0)
+        if delta:
+            deltas[denomination] = delta
+    if not deltas:
+        return dispensed
+
+    _add_new(db, machine_id, {d: n for d, n in deltas.items() if d not in stock})
+
+    table = CoinInventory.__table__
+    params = [{"b_denomination": d, "b_delta": n} for d, n in deltas.items() if d in stock]
+    if not params:
+        return dispensed
+    updated = db.execute(
+        table.update()
+        .where(
+            table.c.machine_id == machine_id,
+            table.c.denomination == bindparam("b_denomination"),
+            table.c.count + bindparam("b_delta") >= 0,
+        )
+        .values(count=table.c.count + bindparam("b_delta")),
+        params,
+    )
+    if (
+        db.get_bind().dialect.supports_sane_multi_rowcount
+        and updated.rowcount != len(params)
+    ):
+        raise ValueError("change_unavailable", change)
+    return dispensed
+
+
+def _add_new(db: Session, machine_id: str, added: dict[int, int]) -> None:
+    """Add coins of denominations that had no row when the sale read them."""
+    if not added:
+        return
+    rows = [{"machine_id": machine_id, "denomination": d, "count": n} for d, n in added.items()]
+    table = CoinInventory.__table__
+    upsert = _UPSERT.get(db.get_bind().dialect.name)
+    if upsert is not None:
+        stmt = upsert(table)
+        db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[table.c.machine_id, table.c.denomination],
+                set_={"count": table.c.count + stmt.excluded.count},
+            ),
+            rows,
+        )
+        return
+
+    # No ON CONFLICT: add to the rows that exist, insert the others.
+    for row in rows:
+        updated = db.execute(
+            update(table)
+            .where(
+                table.c.machine_id == machine_id,
+                table.c.denomination == row["denomination"],
+            )
+            .values(count=table.c.count + row["count"])
+        )
+        if not updated.rowcount:
+            db.execute(insert(table).values(**row))
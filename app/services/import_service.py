@@ -0,0 +1,59 @@
+import csv
+from typing import AsyncIterator
+
+from pydantic import ValidationError
+
+from app.schemas import ItemBulkEntry
+
+CSV_COLUMNS = ("name", "price", "quantity")
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[tuple[int, str]]:
+    """Yield ``(line_number, text)`` from a byte stream, one line at a time.
+
+    Only the current partial line is buffered, so memory stays flat however
+    large the upload is.
+    """
+    pending = b""
+    line_number = 0
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for raw in lines:
+            line_number += 1
+            yield line_number, raw.decode("utf-8").rstrip("\r")
+    if pending:
+        yield line_number + 1, pending.decode("utf-8").rstrip("\r")
+
+
+def _describe(e: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in err['loc']) or 'row'}: {err['msg']}"
+        for err in e.errors()
+    )
+
+
+def parse_ndjson_row(line: str) -> ItemBulkEntry:
+    try:
+        return ItemBulkEntry.model_validate_json(line)
+    except ValidationError as e:
+        raise ValueError(_describe(e))
+
+
+def parse_csv_header(line: str) -> list[str]:
+    header = [column.strip().lower() for column in next(csv.reader([line]))]
+    missing = [column for column in CSV_COLUMNS if column not in header]
+    if missing:
+        raise ValueError(f"missing columns: {', '.join(missing)}")
+    return header
+
+
+def parse_csv_row(header: list[str], line: str) -> ItemBulkEntry:
+    # One physical line per record: quoted fields may not contain newlines.
+    values = next(csv.reader([line]))
+    if len(values) != len(header):
+        raise ValueError(f"expected {len(header)} fields, got {len(values)}")
+    try:
+        return ItemBulkEntry.model_validate(dict(zip(header, values)))
+    except ValidationError as e:
+        raise ValueError(_describe(e))
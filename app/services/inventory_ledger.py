@@ -0,0 +1,353 @@
+"""Every change to ``Item.quantity`` and ``Slot.current_item_count``.
+
+Counters are moved with SQL expressions (``count = count + :delta``) guarded
+in the WHERE clause, never read-modify-written in Python, so concurrent
+writers cannot lose each other's updates and no path needs to recount a
+slot. Callers own the transaction; all functions raise the same
+``ValueError`` codes the services already used.
+
+Functions take public slot and item ids, as the routes receive them; items
+point at their slot by the integer ``slot_pk``.
+
+Operator changes (restocks, removals, price edits) bump the row's
+``version``; sales do not, so a busy item does not make every edit that
+was checked against its ETag fail. Removals take no row locks: they
+compare-and-set on the quantity and version they read and read again if a
+sale or another edit got in first.
+"""
+from sqlalchemy import Row, bindparam, delete, func, select, update
+from sqlalchemy.orm import Session
+
+from app.models import Item, Slot
+
+_items = Item.__table__
+_slots = Slot.__table__
+
+# Compare-and-set attempts before a partial removal gives up on a hot item.
+CAS_ATTEMPTS = 5
+
+# Items of a slot, matched through the (slot_pk, id) index.
+_in_slot = (Item.machine_id == Slot.machine_id) & (Item.slot_pk == Slot.pk)
+
+
+def _multi_rowcount_ok(db: Session, result, expected: int) -> bool:
+    if not db.get_bind().dialect.supports_sane_multi_rowcount:
+        return True
+    return result.rowcount == expected
+
+
+# --- Slot counters ---
+
+def slot_key(machine_id: str, slot_id: str):
+    """``slot_pk`` of a public slot id, as a subquery to compare items with."""
+    return (
+        select(Slot.pk)
+        .where(Slot.id == slot_id, Slot.machine_id == machine_id)
+        .scalar_subquery()
+    )
+
+
+def _slot_pk(db: Session, machine_id: str, slot_id: str) -> int | None:
+    return db.execute(
+        select(Slot.pk).where(Slot.id == slot_id, Slot.machine_id == machine_id)
+    ).scalar()
+
+
+def reserve_capacity(db: Session, machine_id: str, slot_id: str, quantity: int) -> int:
+    """Add ``quantity`` to the slot counter if it still fits the capacity.
+
+    Returns the slot's ``pk`` for the item rows that go in.
+    """
+    stmt = (
+        update(Slot)
+        .where(
+            Slot.id == slot_id,
+            Slot.machine_id == machine_id,
+            Slot.current_item_count + quantity <= Slot.capacity,
+        )
+        .values(current_item_count=Slot.current_item_count + quantity, version=Slot.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    if db.get_bind().dialect.update_returning:
+        pk = db.execute(stmt.returning(Slot.pk)).scalar()
+    else:
+        pk = _slot_pk(db, machine_id, slot_id) if db.execute(stmt).rowcount else None
+    if pk is not None:
+        return pk
+    exists = _slot_pk(db, machine_id, slot_id) is not None
+    raise ValueError("capacity_exceeded" if exists else "slot_not_found")
+
+
+def release_capacity(db: Session, per_slot: dict[int, int], strict: bool = True) -> None:
+    """Subtract quantities from slot counters (keyed by ``pk``), one executemany.
+
+    ``strict`` refuses to take a counter below zero (``slot_count_inconsistent``)
+    and bumps the slot's version, for removals; sales pass ``strict=False``
+    so a drifted counter never blocks a purchase and is left for the
+    reconciler to repair instead.
+    """
+    per_slot = {pk: n for pk, n in per_slot.items() if pk is not None and n}
+    if not per_slot:
+        return
+    stmt = _slots.update().where(_slots.c.pk == bindparam("b_pk"))
+    values = {"current_item_count": _slots.c.current_item_count - bindparam("b_n")}
+    if strict:
+        stmt = stmt.where(_slots.c.current_item_count >= bindparam("b_n"))
+        values["version"] = _slots.c.version + 1
+    updated = db.execute(
+        stmt.values(**values),
+        [{"b_pk": pk, "b_n": n} for pk, n in per_slot.items()],
+    )
+    if strict and not _multi_rowcount_ok(db, updated, len(per_slot)):
+        raise ValueError("slot_count_inconsistent")
+
+
+# --- Sales ---
+
+def sell_one(db: Session, machine_id: str, item_id: str, cash_inserted: int) -> Row:
+    """Decrement one unit if in stock and affordable; return the sold row.
+
+    The row carries both the slot's ``slot_pk`` and its public ``slot_id``.
+    """
+    guarded = (
+        update(Item)
+        .where(
+            Item.id == item_id,
+            Item.machine_id == machine_id,
+            Item.quantity > 0,
+            Item.price <= cash_inserted,
+        )
+        .values(quantity=Item.quantity - 1)
+        .execution_options(synchronize_session=False)
+    )
+    public_slot_id = (
+        select(Slot.id).where(Slot.pk == Item.slot_pk).scalar_subquery().label("slot_id")
+    )
+    columns = (Item.id, Item.name, Item.price, Item.quantity, Item.slot_pk, public_slot_id)
+
+    if db.get_bind().dialect.update_returning:
+        row = db.execute(guarded.returning(*columns)).first()
+    else:
+        # No RETURNING (SQLite < 3.35): the row we just decremented stays
+        # write-locked by this transaction, so reading it back is safe.
+        row = None
+        if db.execute(guarded).rowcount:
+            row = db.execute(select(*columns).where(Item.id == item_id)).first()
+
+    if row is None:
+        # The guarded UPDATE matched nothing; one cheap read tells us why.
+        current = db.execute(
+            select(Item.quantity, Item.price)
+            .where(Item.id == item_id, Item.machine_id == machine_id)
+        ).first()
+        if current is None:
+            raise ValueError("item_not_found")
+        if current.quantity <= 0:
+            raise ValueError("out_of_stock")
+        raise ValueError("insufficient_cash", current.price, cash_inserted)
+
+    release_capacity(db, {row.slot_pk: 1}, strict=False)
+    return row
+
+
+def sell_grouped(db: Session, sold: dict[str, int], slot_of: dict[str, int | None]) -> None:
+    """Decrement many items at once, ``sold`` mapping item id to units.
+
+    ``slot_of`` maps each item id to its ``slot_pk``.
+    """
+    if not sold:
+        return
+    params = [{"b_id": item_id, "b_n": n} for item_id, n in sold.items()]
+    updated = db.execute(
+        _items.update()
+        .where(
+            _items.c.id == bindparam("b_id"),
+            _items.c.quantity >= bindparam("b_n"),
+        )
+        .values(quantity=_items.c.quantity - bindparam("b_n")),
+        params,
+    )
+    if not _multi_rowcount_ok(db, updated, len(params)):
+        raise ValueError("stock_changed")
+
+    per_slot: dict[int, int] = {}
+    for item_id, n in sold.items():
+        slot_pk = slot_of.get(item_id)
+        if slot_pk is not None:
+            per_slot[slot_pk] = per_slot.get(slot_pk, 0) + n
+    release_capacity(db, per_slot, strict=False)
+
+
+# --- Removals ---
+
+def remove_item_quantity(
+    db: Session,
+    machine_id: str,
+    slot_id: str,
+    item_id: str,
+    quantity: int | None,
+    expected_versions: set[int] | None = None,
+) -> tuple[int, int, int | None]:
+    """Take ``quantity`` units (all if None) of an item out of its slot.
+
+    The item row is deleted once it reaches zero. With ``expected_versions``
+    (from ``If-Match``) the item must still be at one of them, else
+    ``version_mismatch``. Returns the units removed, the units left and the
+    item's new version (None once deleted).
+    """
+    for _ in range(CAS_ATTEMPTS):
+        row = db.execute(
+            select(Item.quantity, Item.slot_pk, Item.version)
+            .where(
+                Item.id == item_id,
+                Item.machine_id == machine_id,
+                Item.slot_pk == slot_key(machine_id, slot_id),
+            )
+        ).first()
+        if row is None:
+            exists = _slot_pk(db, machine_id, slot_id) is not None
+            raise ValueError("item_not_found" if exists else "slot_not_found")
+        if expected_versions is not None and row.version not in expected_versions:
+            raise ValueError("version_mismatch")
+        current = row.quantity
+
+        to_remove = current if quantity is None else min(quantity, current)
+        unchanged = (
+            (Item.id == item_id) & (Item.quantity == current) & (Item.version == row.version)
+        )
+        if to_remove >= current:
+            stmt = delete(Item).where(unchanged)
+        else:
+            stmt = (
+                update(Item)
+                .where(unchanged)
+                .values(quantity=Item.quantity - to_remove, version=Item.version + 1)
+            )
+        # Compare-and-set on what we read: a sale or edit that slipped in
+        # between makes this match nothing, and we simply read again.
+        if db.execute(stmt.execution_options(synchronize_session=False)).rowcount:
+            release_capacity(db, {row.slot_pk: to_remove})
+            left = current - to_remove
+            return to_remove, left, row.version + 1 if left else None
+    raise ValueError("concurrent_update")
+
+
+def _claim_slot(
+    db: Session, machine_id: str, slot_id: str, expected_versions: set[int]
+) -> int:
+    """Bump the slot's version if it is at one of ``expected_versions``; returns its pk."""
+    stmt = (
+        update(Slot)
+        .where(
+            Slot.id == slot_id,
+            Slot.machine_id == machine_id,
+            Slot.version.in_(expected_versions),
+        )
+        .values(version=Slot.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    if db.get_bind().dialect.update_returning:
+        pk = db.execute(stmt.returning(Slot.pk)).scalar()
+    else:
+        pk = _slot_pk(db, machine_id, slot_id) if db.execute(stmt).rowcount else None
+    if pk is not None:
+        return pk
+    exists = _slot_pk(db, machine_id, slot_id) is not None
+    raise ValueError("version_mismatch" if exists else "slot_not_found")
+
+
+def remove_items(
+    db: Session,
+    machine_id: str,
+    slot_id: str,
+    item_ids: set[str] | None,
+    expected_versions: set[int] | None = None,
+) -> int:
+    """Delete the given items (every item if None) from a slot.
+
+    With ``expected_versions`` the slot must still be at one of them, else
+    ``version_mismatch``. Returns the total units removed, as counted by the
+    DELETE itself.
+    """
+    if expected_versions is not None:
+        slot_pk = _claim_slot(db, machine_id, slot_id, expected_versions)
+    else:
+        slot_pk = _slot_pk(db, machine_id, slot_id)
+    if slot_pk is None:
+        raise ValueError("slot_not_found")
+
+    condition = (Item.machine_id == machine_id) & (Item.slot_pk == slot_pk)
+    if item_ids is not None:
+        condition = condition & Item.id.in_(item_ids)
+    stmt = delete(Item).where(condition).execution_options(synchronize_session=False)
+
+    if db.get_bind().dialect.delete_returning:
+        removed = db.execute(stmt.returning(Item.quantity)).scalars().all()
+    else:
+        removed = db.execute(
+            select(Item.quantity).where(condition).with_for_update()
+        ).scalars().all()
+        db.execute(stmt)
+
+    if item_ids is not None and len(removed) != len(item_ids):
+        raise ValueError("one_or_more_items_not_found")
+
+    total = sum(removed)
+    release_capacity(db, {slot_pk: total})
+    return total
+
+
+# --- Consistency ---
+
+def _slot_totals():
+    actual = func.coalesce(func.sum(Item.quantity), 0)
+    return (
+        select(Slot.id, Slot.code, Slot.current_item_count, actual.label("actual"))
+        .outerjoin(Item, _in_slot)
+        .group_by(Slot.id, Slot.code, Slot.current_item_count)
+    )
+
+
+def check_counters(
+    db: Session, after: str | None = None, limit: int | None = None
+) -> tuple[int, list[dict], str | None]:
+    """Compare counters with ``SUM(items.quantity)`` for a page of slots.
+
+    Pages walk slots in id order starting after ``after``. Returns the number
+    of slots checked, the drifted ones, and the cursor for the next page
+    (None once the end is reached).
+    """
+    stmt = _slot_totals().order_by(Slot.id)
+    if after is not None:
+        stmt = stmt.where(Slot.id > after)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    rows = db.execute(stmt).all()
+
+    drifted = [
+        {
+            "slot_id": row.id,
+            "code": row.code,
+            "recorded": row.current_item_count,
+            "actual": row.actual,
+        }
+        for row in rows
+        if row.current_item_count != row.actual
+    ]
+    cursor = rows[-1].id if limit is not None and len(rows) == limit else None
+    return len(rows), drifted, cursor
+
+
+def repair_counters(db: Session, slot_ids: list[str]) -> None:
+    """Reset counters from their items in a single correlated UPDATE."""
+    actual = (
+        select(func.coalesce(func.sum(Item.quantity), 0))
+        .where(_in_slot)
+        .scalar_subquery()
+    )
+    db.execute(
+        update(Slot)
+        .where(Slot.id.in_(slot_ids))
+        .values(current_item_count=actual)
+        .execution_options(synchronize_session=False)
+    )
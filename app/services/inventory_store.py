@@ -0,0 +1,536 @@
+"""In-process inventory store with write-behind persistence.
+
+With ``INVENTORY_STORE`` on, slots and items are held in memory and serve
+item and slot reads and cash purchases without touching the database. Each
+sale is appended to a local log (``INVENTORY_STORE_LOG``) before it is
+acknowledged, and a background task flushes the accumulated sales to the
+database in one transaction per batch, through ``inventory_ledger`` for
+stock and ``sales_ledger`` for the sales history. The transaction also
+records the last log sequence number it covers, so on startup the entries
+after that checkpoint are replayed exactly once.
+
+Other changes (restocks, price updates, removals, batch and coin-tracked
+purchases, coin counts, machines and counter repairs) go to the database
+through ``run_write``: it flushes pending sales, runs the service and
+reloads the store, holding off in-memory sales meanwhile. A flush skips
+sales of items that were removed or emptied underneath it, as replay does.
+The store is per process; run a single worker with it.
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+from bisect import bisect_right
+from datetime import datetime
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app import encoding, profiling
+from app.backplane import backplane
+from app.cache import full_view_cache
+from app.config import settings
+from app.events import event_bus
+from app.db import WriteSessionLocal, is_memory_sqlite, run_db
+from app.models import Item, Slot, WriteBehindCheckpoint
+from app.services import inventory_ledger, sales_ledger
+
+logger = logging.getLogger(__name__)
+
+
+class SlotRecord:
+    __slots__ = (
+        "id", "pk", "machine_id", "code", "capacity", "current_item_count", "version", "items"
+    )
+
+    def __init__(
+        self,
+        id: str,
+        pk: int,
+        machine_id: str,
+        code: str,
+        capacity: int,
+        current_item_count: int,
+        version: int,
+    ):
+        self.id = id
+        self.pk = pk
+        self.machine_id = machine_id
+        self.code = code
+        self.capacity = capacity
+        self.current_item_count = current_item_count
+        self.version = version
+        self.items: dict[str, "ItemRecord"] = {}
+
+
+class ItemRecord:
+    __slots__ = ("id", "machine_id", "name", "price", "slot_id", "quantity", "version")
+
+    def __init__(
+        self,
+        id: str,
+        machine_id: str,
+        name: str,
+        price: int,
+        slot_id: str | None,
+        quantity: int,
+        version: int,
+    ):
+        self.id = id
+        self.machine_id = machine_id
+        self.name = name
+        self.price = price
+        self.slot_id = slot_id
+        self.quantity = quantity
+        self.version = version
+
+
+class InventoryStore:
+    def __init__(self):
+        self.slots: dict[str, SlotRecord] = {}
+        self.slots_by_code: dict[tuple[str, str], SlotRecord] = {}
+        self.items: dict[str, ItemRecord] = {}
+        # Machine id -> its slot codes, sorted for keyset pagination.
+        self._codes: dict[str, list[str]] = {}
+        self.pending: dict[str, int] = {}
+        self.pending_units = 0
+        # The same sales one by one, for ``sales_ledger``.
+        self.pending_sales: list[dict] = []
+        self.seq = 0
+        self.loaded = False
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._log = None
+        self._gate: asyncio.Lock | None = None
+        self._wake: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return settings.INVENTORY_STORE and self.loaded
+
+    # --- Reads ---
+
+    def get_item(self, machine_id: str, item_id: str) -> ItemRecord | None:
+        item = self.items.get(item_id)
+        return item if item is not None and item.machine_id == machine_id else None
+
+    def _slot(self, machine_id: str, slot_id: str) -> SlotRecord | None:
+        slot = self.slots.get(slot_id)
+        return slot if slot is not None and slot.machine_id == machine_id else None
+
+    def list_slots(
+        self, machine_id: str, after: str | None = None, limit: int | None = None
+    ) -> list[SlotRecord]:
+        with self._lock:
+            all_codes = self._codes.get(machine_id, [])
+            start = 0 if after is None else bisect_right(all_codes, after)
+            codes = all_codes[start:] if limit is None else all_codes[start:start + limit]
+            return [self.slots_by_code[machine_id, code] for code in codes]
+
+    def list_items_by_slot(
+        self,
+        machine_id: str,
+        slot_id: str,
+        after: str | None = None,
+        limit: int | None = None,
+        in_stock: bool = False,
+    ) -> list[ItemRecord]:
+        with self._lock:
+            slot = self._slot(machine_id, slot_id)
+            if slot is None:
+                raise ValueError("slot_not_found")
+            items = sorted(slot.items.values(), key=lambda item: item.id)
+        if in_stock:
+            items = [item for item in items if item.quantity > 0]
+        if after is not None:
+            items = [item for item in items if item.id > after]
+        return items if limit is None else items[:limit]
+
+    def slot_exists(self, machine_id: str, slot_id: str) -> bool:
+        return self._slot(machine_id, slot_id) is not None
+
+    def full_view_payload(self, machine_id: str) -> tuple[bytes, str]:
+        cached = full_view_cache.get(machine_id)
+        if cached is not None:
+            return cached
+        generation = full_view_cache.generation(machine_id)
+        with self._lock:
+            view = [
+                {
+                    "id": slot.id,
+                    "code": slot.code,
+                    "capacity": slot.capacity,
+                    "items": [
+                        {
+                            "id": item.id,
+                            "name": item.name,
+                            "price": item.price,
+                            "quantity": item.quantity,
+                        }
+                        for item in slot.items.values()
+                    ],
+                }
+                for slot in (
+                    self.slots_by_code[machine_id, code]
+                    for code in self._codes.get(machine_id, [])
+                )
+            ]
+        return full_view_cache.store(machine_id, generation, encoding.encode(view))
+
+    # --- Sales ---
+
+    def _sell(self, machine_id: str, item_id: str, cash_inserted: int) -> tuple[dict, str | None]:
+        with self._lock:
+            item = self.get_item(machine_id, item_id)
+            if item is None:
+                raise ValueError("item_not_found")
+            if item.quantity <= 0:
+                raise ValueError("out_of_stock")
+            if item.price > cash_inserted:
+                raise ValueError("insufficient_cash", item.price, cash_inserted)
+
+            sold_at = datetime.utcnow()
+            self.seq += 1
+            self._log.write(
+                f'{{"seq":{self.seq},"item_id":{json.dumps(item_id)},'
+                f'"price":{item.price},"at":"{sold_at.isoformat()}"}}\n'
+            )
+            self._log.flush()
+            if settings.INVENTORY_STORE_FSYNC:
+                os.fsync(self._log.fileno())
+
+            item.quantity -= 1
+            slot = self.slots.get(item.slot_id)
+            if slot is not None:
+                slot.current_item_count -= 1
+            self.pending[item_id] = self.pending.get(item_id, 0) + 1
+            self.pending_units += 1
+            self.pending_sales.append(
+                sales_ledger.sale(machine_id, item_id, item.slot_id, item.price, sold_at)
+            )
+            return {
+                "item": item.name,
+                "price": item.price,
+                "cash_inserted": cash_inserted,
+                "change_returned": cash_inserted - item.price,
+                "remaining_quantity": item.quantity,
+                "message": "Purchase successful",
+            }, item.slot_id
+
+    async def purchase(self, machine_id: str, item_id: str, cash_inserted: int) -> dict:
+        async with self._gate:
+            result, slot_id = self._sell(machine_id, item_id, cash_inserted)
+        full_view_cache.invalidate(machine_id)
+        event_bus.publish(
+            "stock",
+            machine_id,
+            item_id=item_id,
+            slot_id=slot_id,
+            quantity=result["remaining_quantity"],
+        )
+        if self.pending_units >= settings.INVENTORY_STORE_FLUSH_BATCH:
+            self._wake.set()
+        return result
+
+    # --- Persistence ---
+
+    def _apply(
+        self,
+        db: Session,
+        sold: dict[str, int],
+        slot_of: dict[str, int | None],
+        sales: list[dict],
+        seq: int,
+    ) -> None:
+        inventory_ledger.sell_grouped(db, sold, slot_of)
+        sales_ledger.record(db, sales)
+        updated = db.execute(
+            update(WriteBehindCheckpoint)
+            .where(WriteBehindCheckpoint.id == 1)
+            .values(seq=seq)
+            .execution_options(synchronize_session=False)
+        )
+        if not updated.rowcount:
+            db.add(WriteBehindCheckpoint(id=1, seq=seq))
+
+    def _in_stock(self, db: Session, sold: dict[str, int]) -> tuple[dict[str, int], dict]:
+        """``sold`` cut down to the stock in the database, and the item rows.
+
+        Items removed since the sale are skipped, and no item is taken below
+        zero: either would fail the whole batch, and every batch after it.
+        """
+        rows = {
+            row.id: row
+            for row in db.execute(
+                select(
+                    Item.id,
+                    Item.machine_id,
+                    Item.price,
+                    Item.quantity,
+                    Item.slot_pk,
+                    Slot.id.label("slot_id"),
+                )
+                .outerjoin(Slot, Slot.pk == Item.slot_pk)
+                .where(Item.id.in_(sold))
+            )
+        }
+        kept = {
+            item_id: min(n, rows[item_id].quantity)
+            for item_id, n in sold.items()
+            if item_id in rows and rows[item_id].quantity > 0
+        }
+        skipped = sum(sold.values()) - sum(kept.values())
+        if skipped:
+            logger.warning("Skipped %d sales of items removed or emptied since", skipped)
+        return kept, rows
+
+    def flush(self) -> int:
+        """Write pending sales to the database; returns the units flushed."""
+        with self._flush_lock:
+            with self._lock:
+                if not self.pending:
+                    return 0
+                sold, self.pending = self.pending, {}
+                sales, self.pending_sales = self.pending_sales, []
+                self.pending_units = 0
+                upto = self.seq
+                # Where the entries after ``upto`` begin in the log.
+                offset = self._log.tell()
+
+            db = WriteSessionLocal()
+            try:
+                with db.begin():
+                    kept, rows = self._in_stock(db, sold)
+                    slot_of = {item_id: rows[item_id].slot_pk for item_id in kept}
+                    self._apply(db, kept, slot_of, _first_sales(sales, kept), upto)
+            except Exception:
+                with self._lock:
+                    for item_id, n in sold.items():
+                        self.pending[item_id] = self.pending.get(item_id, 0) + n
+                    self.pending_sales[:0] = sales
+                    self.pending_units += sum(sold.values())
+                raise
+            finally:
+                db.close()
+
+            with self._lock:
+                self._compact_log(offset)
+            return sum(kept.values())
+
+    def _compact_log(self, offset: int) -> None:
+        """Drop the log entries before ``offset``, now in the database.
+
+        Sales made during the flush are copied to a new log that replaces
+        the old one, so a crash leaves one or the other, never neither.
+        """
+        if self._log.tell() == offset:
+            # Nothing was sold meanwhile: everything logged is in the database.
+            self._log.seek(0)
+            self._log.truncate()
+            return
+        path = settings.INVENTORY_STORE_LOG
+        with open(path, "rb") as log:
+            log.seek(offset)
+            tail = log.read()
+        with open(path + ".tmp", "wb") as compacted:
+            compacted.write(tail)
+            compacted.flush()
+            if settings.INVENTORY_STORE_FSYNC:
+                os.fsync(compacted.fileno())
+        os.replace(path + ".tmp", path)
+        self._log.close()
+        self._log = open(path, "a")
+
+    def reload(self) -> None:
+        """Rebuild the store from the database, keeping unflushed sales."""
+        with self._flush_lock:
+            db = WriteSessionLocal()
+            try:
+                slots = db.execute(
+                    select(
+                        Slot.id,
+                        Slot.pk,
+                        Slot.machine_id,
+                        Slot.code,
+                        Slot.capacity,
+                        Slot.current_item_count,
+                        Slot.version,
+                    )
+                ).all()
+                items = db.execute(
+                    select(
+                        Item.id,
+                        Item.machine_id,
+                        Item.name,
+                        Item.price,
+                        Slot.id,
+                        Item.quantity,
+                        Item.version,
+                    )
+                    .outerjoin(Slot, Slot.pk == Item.slot_pk)
+                ).all()
+            finally:
+                db.close()
+
+            with self._lock:
+                self.slots = {row.id: SlotRecord(*row) for row in slots}
+                self.slots_by_code = {
+                    (slot.machine_id, slot.code): slot for slot in self.slots.values()
+                }
+                self._codes = {}
+                for machine_id, code in sorted(self.slots_by_code):
+                    self._codes.setdefault(machine_id, []).append(code)
+                self.items = {}
+                for row in items:
+                    item = self.items[row.id] = ItemRecord(*row)
+                    slot = self.slots.get(item.slot_id)
+                    if slot is not None:
+                        slot.items[item.id] = item
+                # Sales made while the rows were read are not in them yet.
+                for item_id, n in self.pending.items():
+                    item = self.items.get(item_id)
+                    if item is None:
+                        continue
+                    item.quantity -= n
+                    slot = self.slots.get(item.slot_id)
+                    if slot is not None:
+                        slot.current_item_count -= n
+                self.loaded = True
+        full_view_cache.invalidate()
+
+    def replay(self) -> int:
+        """Apply logged sales after the database checkpoint; returns units replayed."""
+        path = settings.INVENTORY_STORE_LOG
+        db = WriteSessionLocal()
+        try:
+            with db.begin():
+                checkpoint = db.execute(
+                    select(WriteBehindCheckpoint.seq).where(WriteBehindCheckpoint.id == 1)
+                ).scalar() or 0
+                self.seq = checkpoint
+                if not os.path.exists(path):
+                    return 0
+
+                sold: dict[str, int] = {}
+                entries = []
+                with open(path) as log:
+                    for line in log:
+                        try:
+                            entry = json.loads(line)
+                        except ValueError:
+                            break  # torn final write from a crash
+                        self.seq = max(self.seq, entry["seq"])
+                        if entry["seq"] > checkpoint:
+                            sold[entry["item_id"]] = sold.get(entry["item_id"], 0) + 1
+                            entries.append(entry)
+                if sold:
+                    sold, rows = self._in_stock(db, sold)
+                    slot_of = {item_id: rows[item_id].slot_pk for item_id in sold}
+                    sales = []
+                    for entry in entries:
+                        row = rows.get(entry["item_id"])
+                        if row is None:
+                            continue
+                        # Logs written before sales were recorded lack price and time.
+                        sold_at = entry.get("at")
+                        sales.append(sales_ledger.sale(
+                            row.machine_id,
+                            row.id,
+                            row.slot_id,
+                            entry.get("price", row.price),
+                            datetime.fromisoformat(sold_at) if sold_at else None,
+                        ))
+                    sales = _first_sales(sales, sold)
+                    self._apply(db, sold, slot_of, sales, self.seq)
+        finally:
+            db.close()
+        if sold:
+            logger.info("Replayed %d logged sales into the database", sum(sold.values()))
+        return sum(sold.values())
+
+    # --- Lifecycle ---
+
+    async def _run(self, interval: float) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await run_in_threadpool(self.flush)
+            except Exception:
+                logger.exception("Inventory store flush failed")
+
+    async def start(self) -> None:
+        if not settings.INVENTORY_STORE or self._task is not None:
+            return
+        if settings.ASYNC_DB and is_memory_sqlite(settings.DATABASE_URL):
+            # The store persists through the sync engine, which would be a
+            # second, empty in-memory database.
+            raise ValueError("INVENTORY_STORE needs a file or server database with ASYNC_DB")
+        if backplane.shared:
+            # Stock is sold from this process's memory; other workers would
+            # sell the same units again.
+            raise ValueError("INVENTORY_STORE runs in a single worker, not with BACKPLANE=sqlite")
+        self._gate = asyncio.Lock()
+        self._wake = asyncio.Event()
+        await run_in_threadpool(self.replay)
+        self._log = open(settings.INVENTORY_STORE_LOG, "w")
+        await run_in_threadpool(self.reload)
+        self._task = asyncio.create_task(self._run(settings.INVENTORY_STORE_FLUSH_INTERVAL))
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await run_in_threadpool(self.flush)
+        self.loaded = False
+        self._log.close()
+        self._log = None
+
+
+def _first_sales(sales: list[dict], sold: dict[str, int]) -> list[dict]:
+    """The first ``sold[item_id]`` of ``sales`` of each item."""
+    left = dict(sold)
+    kept = []
+    for sale in sales:
+        if left.get(sale["item_id"]):
+            left[sale["item_id"]] -= 1
+            kept.append(sale)
+    return kept
+
+
+inventory_store = InventoryStore()
+
+
+async def run_write(db, fn, *args, **kwargs):
+    """``run_db`` for a change that goes straight to the database.
+
+    With the store on, pending sales are flushed first, in-memory sales wait
+    until the change is done, and the store is reloaded afterwards. The
+    session is closed before the reload so it gives its connection back
+    (the writer may have only one); objects the service returned stay
+    loaded, just detached.
+    """
+    if not inventory_store.enabled:
+        return await run_db(db, fn, *args, **kwargs)
+    # Store upkeep is not part of the route's own query budget.
+    async with inventory_store._gate:
+        await run_in_threadpool(profiling.untracked(inventory_store.flush))
+        try:
+            return await run_db(db, fn, *args, **kwargs)
+        finally:
+            if hasattr(db, "run_sync"):
+                await db.close()
+            else:
+                await run_in_threadpool(db.close)
+            await run_in_threadpool(profiling.untracked(inventory_store.reload))
@@ -1,171 +1,273 @@
 import time
+from datetime import datetime
+
+from sqlalchemy import Row, select, update
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError
 
+from app.cache import full_view_cache
 from app.config import settings
-from app.models import Item, Slot
+from app.events import event_bus
+from app.models import Item, Slot, generate_uuid
 from app.schemas import ItemBulkEntry, ItemCreate
+from app.services import inventory_ledger
 
 
-def add_item_to_slot(db: Session, slot_id: str, data: ItemCreate) -> Item:
-    slot = db.query(Slot).filter(Slot.id == slot_id).first()
-    if not slot:
-        raise ValueError("slot_not_found")
-    if slot.current_item_count + data.quantity > slot.capacity:
-        raise ValueError("capacity_exceeded")
-
-    item = Item(
-        name=data.name,
-        price=data.price,
+def add_item_to_slot(db: Session, machine_id: str, slot_id: str, data: ItemCreate) -> Item:
+    try:
+        slot_pk = inventory_ledger.reserve_capacity(db, machine_id, slot_id, data.quantity)
+        item = Item(
+            machine_id=machine_id,
+            name=data.name,
+            price=data.price,
+            slot_pk=slot_pk,
+            quantity=data.quantity,
+        )
+        db.add(item)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    full_view_cache.invalidate(machine_id)
+    db.refresh(item)
+    event_bus.publish(
+        "item_added",
+        machine_id,
+        item_id=item.id,
         slot_id=slot_id,
-        quantity=data.quantity,     
+        name=item.name,
+        price=item.price,
+        quantity=item.quantity,
     )
-    db.add(item)
-    slot.current_item_count += data.quantity
-    db.commit()
-    db.refresh(item)
     return item
 
-def bulk_add_items(db: Session, slot_id: str, entries: list[ItemBulkEntry]) -> int:
-    try:
-        with db.begin():
-            slot = (
-                db.query(Slot)
-                .filter(Slot.id == slot_id)
-                .with_for_update()
-                .first()
-            )
-            if not slot:
-                raise ValueError("slot_not_found")
-
-            incoming_quantity = sum(e.quantity for e in entries if e.quantity > 0)
 
-            if slot.current_item_count + incoming_quantity > slot.capacity:
-                raise ValueError("capacity_exceeded")
-
-            added_count = 0
-            for e in entries:
-                if e.quantity <= 0:
-                    continue
-
-                db.add(Item(
-                    name=e.name,
-                    price=e.price,
-                    slot_id=slot_id,
-                    quantity=e.quantity
-                ))
-
-                slot.current_item_count += e.quantity
-                added_count += 1
-
-        return added_count
-
-    except SQLAlchemyError:
-        raise
-
-
-def list_items_by_slot(db: Session, slot_id: str) -> list[Item]:
-    slot = db.query(Slot).filter(Slot.id == slot_id).first()
-    if not slot:
+def insert_item_rows(
+    db: Session, machine_id: str, slot_pk: int, entries: list[ItemBulkEntry]
+) -> int:
+    """Insert ``entries`` into the slot ``slot_pk`` with chunked Core executemany.
+
+    Skips the ORM unit of work entirely; the caller owns the transaction and
+    the slot counter update.
+    """
+    table = Item.__table__
+    now = datetime.utcnow()
+    chunk_size = settings.BULK_INSERT_CHUNK_SIZE
+    for start in range(0, len(entries), chunk_size):
+        db.execute(
+            table.insert(),
+            [
+                {
+                    "id": generate_uuid(),
+                    "machine_id": machine_id,
+                    "name": e.name,
+                    "price": e.price,
+                    "slot_pk": slot_pk,
+                    "quantity": e.quantity,
+                    "created_at": now,
+                    "updated_at": now,
+                }
+                for e in entries[start:start + chunk_size]
+            ],
+        )
+    return len(entries)
+
+
+def bulk_add_items(
+    db: Session, machine_id: str, slot_id: str, entries: list[ItemBulkEntry]
+) -> int:
+    entries = [e for e in entries if e.quantity > 0]
+    incoming_quantity = sum(e.quantity for e in entries)
+
+    with db.begin():
+        slot_pk = inventory_ledger.reserve_capacity(
+            db, machine_id, slot_id, incoming_quantity
+        )
+        added_count = insert_item_rows(db, machine_id, slot_pk, entries)
+
+    full_view_cache.invalidate(machine_id)
+    event_bus.publish("slot_changed", machine_id, slot_id=slot_id)
+    return added_count
+
+
+def import_item_batch(
+    db: Session, machine_id: str, slot_id: str, rows: list[tuple[int, ItemBulkEntry]]
+) -> tuple[int, list[tuple[int, str]]]:
+    """Insert one batch of a streamed import, in row order, as capacity allows.
+
+    Unlike ``bulk_add_items`` the batch is not all-or-nothing: rows that no
+    longer fit are reported back as ``(line, "capacity_exceeded")`` so the
+    import can carry on and say exactly what was left out.
+    """
+    with db.begin():
+        slot = db.execute(
+            select(Slot.current_item_count, Slot.capacity)
+            .where(Slot.id == slot_id, Slot.machine_id == machine_id)
+        ).first()
+        if not slot:
+            raise ValueError("slot_not_found")
+
+        free = slot.capacity - slot.current_item_count
+        accepted: list[ItemBulkEntry] = []
+        rejected: list[tuple[int, str]] = []
+        for line, entry in rows:
+            if entry.quantity > free:
+                rejected.append((line, "capacity_exceeded"))
+                continue
+            free -= entry.quantity
+            accepted.append(entry)
+
+        if accepted:
+            # The guarded reserve re-checks capacity, so a concurrent restock
+            # can only make this batch fail as a whole, never overfill.
+            slot_pk = inventory_ledger.reserve_capacity(
+                db, machine_id, slot_id, sum(e.quantity for e in accepted)
+            )
+            insert_item_rows(db, machine_id, slot_pk, accepted)
+
+    if accepted:
+        full_view_cache.invalidate(machine_id)
+        event_bus.publish("slot_changed", machine_id, slot_id=slot_id)
+    return len(accepted), rejected
+
+
+def list_items_by_slot(
+    db: Session,
+    machine_id: str,
+    slot_id: str,
+    after: str | None = None,
+    limit: int | None = None,
+    in_stock: bool = False,
+) -> list[Row]:
+    # Keyset pagination on item id: ?after=<last id seen>. Plain rows with
+    # the ``ItemResponse`` fields; the route encodes them as is.
+    stmt = (
+        select(Item.id, Item.name, Item.price, Item.quantity)
+        .where(
+            Item.machine_id == machine_id,
+            Item.slot_pk == inventory_ledger.slot_key(machine_id, slot_id),
+        )
+        .order_by(Item.id)
+    )
+    if in_stock:
+        # Spelled as in the partial index's WHERE, so SQLite can use it.
+        stmt = stmt.where(Item.quantity > 0)
+    if after is not None:
+        stmt = stmt.where(Item.id > after)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    items = db.execute(stmt).all()
+    # Only an empty page needs a second query to tell "no items" from
+    # "no slot".
+    if not items and not db.query(Slot.id).filter(
+        Slot.id == slot_id, Slot.machine_id == machine_id
+    ).first():
         raise ValueError("slot_not_found")
-    return list(slot.items)
-
-
-def get_item_by_id(db: Session, item_id: str) -> Item | None:
-    return db.query(Item).filter(Item.id == item_id).first()
-
+    return items
+
+
+def get_item_by_id(db: Session, machine_id: str, item_id: str) -> Row | None:
+    # The slot's public id comes along in the same query.
+    return db.execute(
+        select(
+            Item.id,
+            Item.name,
+            Item.price,
+            Item.quantity,
+            Item.version,
+            Slot.id.label("slot_id"),
+        )
+        .outerjoin(Slot, Slot.pk == Item.slot_pk)
+        .where(Item.id == item_id, Item.machine_id == machine_id)
+    ).first()
+
+
+def update_item_price(
+    db: Session,
+    machine_id: str,
+    item_id: str,
+    price: int,
+    expected_versions: set[int] | None = None,
+) -> int:
+    """Set the price and bump the version; returns the new version.
+
+    With ``expected_versions`` (from ``If-Match``) the item must still be at
+    one of them, else ``version_mismatch``. One UPDATE either way, so there
+    is no read for a concurrent edit to slip in after.
+    """
+    condition = (Item.id == item_id) & (Item.machine_id == machine_id)
+    stmt = (
+        update(Item)
+        .values(price=price, version=Item.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    if expected_versions is not None:
+        stmt = stmt.where(condition & Item.version.in_(expected_versions))
+    else:
+        stmt = stmt.where(condition)
 
-def update_item_price(db: Session, item_id: str, price: int) -> None:
-    item = get_item_by_id(db, item_id)
-    if not item:
-        raise ValueError("item_not_found")
-    
-    # SQLAlchemy/Postgres usually handles updated_at automatically,
-    # prev_updated = item.updated_at
-    item.price = price
-    # item.updated_at = prev_updated
+    if db.get_bind().dialect.update_returning:
+        version = db.execute(stmt.returning(Item.version)).scalar()
+    elif db.execute(stmt).rowcount:
+        version = db.execute(select(Item.version).where(Item.id == item_id)).scalar()
+    else:
+        version = None
+    if version is None:
+        exists = db.execute(select(Item.id).where(condition)).first() is not None
+        db.rollback()
+        raise ValueError("version_mismatch" if exists else "item_not_found")
     db.commit()
+    full_view_cache.invalidate(machine_id)
+    event_bus.publish("price", machine_id, item_id=item_id, price=price)
+    return version
 
 
 def remove_item_quantity(
-    db: Session, slot_id: str, item_id: str, quantity: int | None
-) -> None:
-    slot = (
-        db.query(Slot)
-        .filter(Slot.id == slot_id)
-        .with_for_update()
-        .first()
-    )
-    if not slot:
-        raise ValueError("slot_not_found")
-
-    item = (
-        db.query(Item)
-        .filter(Item.id == item_id, Item.slot_id == slot_id)
-        .with_for_update()
-        .first()
-    )
-    if not item:
-        raise ValueError("item_not_found")
-    if quantity is not None:
-        to_remove = min(quantity, item.quantity)
-        item.quantity -= to_remove
-        slot.current_item_count -= to_remove
-        if item.quantity <= 0:
-            db.delete(item)
+    db: Session,
+    machine_id: str,
+    slot_id: str,
+    item_id: str,
+    quantity: int | None,
+    expected_versions: set[int] | None = None,
+) -> int | None:
+    """Remove units of an item; returns its new version, None once it is gone."""
+    with db.begin():
+        _, remaining, version = inventory_ledger.remove_item_quantity(
+            db, machine_id, slot_id, item_id, quantity, expected_versions
+        )
+    full_view_cache.invalidate(machine_id)
+    if remaining:
+        event_bus.publish(
+            "stock", machine_id, item_id=item_id, slot_id=slot_id, quantity=remaining
+        )
     else:
-        slot.current_item_count -= item.quantity
-        db.delete(item)
-    db.commit()
+        event_bus.publish("item_removed", machine_id, item_id=item_id, slot_id=slot_id)
+    return version
 
 
 def bulk_remove_items(
-    db: Session, slot_id: str, item_ids: list[str] | None
+    db: Session,
+    machine_id: str,
+    slot_id: str,
+    item_ids: list[str] | None,
+    expected_versions: set[int] | None = None,
 ) -> None:
-    try:
-        with db.begin():
-
-            slot = (
-                db.query(Slot)
-                .filter(Slot.id == slot_id)
-                .with_for_update()
-                .first()
-            )
-
-            if not slot:
-                raise ValueError("slot_not_found")
-
-            if item_ids is not None:
-                if not item_ids:
-                    return 
-
-                unique_ids = set(item_ids)
-
-                items = (
-                    db.query(Item)
-                    .filter(
-                        Item.slot_id == slot_id,
-                        Item.id.in_(unique_ids),
-                    )
-                    .all()
-                )
-
-                if len(items) != len(unique_ids):
-                    raise ValueError("one_or_more_items_not_found")
-
-            else:
-                items = list(slot.items)
-
-            total_removed = sum(item.quantity for item in items)
-
-            if total_removed > slot.current_item_count:
-                raise ValueError("slot_count_inconsistent")
-
-            for item in items:
-                db.delete(item)
-
-            slot.current_item_count -= total_removed
-
-    except Exception:
+    if item_ids is not None and not item_ids:
+        exists = db.query(Slot.id).filter(
+            Slot.id == slot_id, Slot.machine_id == machine_id
+        ).first()
         db.rollback()
-        raise
+        if not exists:
+            raise ValueError("slot_not_found")
+        return
+
+    with db.begin():
+        inventory_ledger.remove_items(
+            db,
+            machine_id,
+            slot_id,
+            set(item_ids) if item_ids is not None else None,
+            expected_versions,
+        )
+    full_view_cache.invalidate(machine_id)
+    event_bus.publish("slot_changed", machine_id, slot_id=slot_id)
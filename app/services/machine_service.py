@@ -0,0 +1,80 @@
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import DEFAULT_MACHINE_ID, Machine, generate_uuid
+from app.schemas import MachineCreate
+
+# Machines are never deleted, so one found once is not looked up again.
+_known_machines: set[str] = set()
+
+
+def ensure_default_machine(db: Session) -> None:
+    """Create the default machine, or bring its limit in line with ``MAX_SLOTS``."""
+    with db.begin():
+        updated = db.execute(
+            update(Machine)
+            .where(Machine.id == DEFAULT_MACHINE_ID)
+            .values(max_slots=settings.MAX_SLOTS)
+            .execution_options(synchronize_session=False)
+        )
+        if not updated.rowcount:
+            db.add(Machine(
+                id=DEFAULT_MACHINE_ID, max_slots=settings.MAX_SLOTS, slot_count=0
+            ))
+
+
+def create_machine(db: Session, data: MachineCreate) -> Machine:
+    machine = Machine(
+        id=data.id or generate_uuid(),
+        name=data.name,
+        max_slots=data.max_slots or settings.MAX_SLOTS,
+        slot_count=0,
+    )
+    db.add(machine)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise ValueError("machine_exists")
+    db.refresh(machine)
+    return machine
+
+
+def list_machines(
+    db: Session, after: str | None = None, limit: int | None = None
+) -> list[Machine]:
+    # Keyset pagination on the primary key: ?after=<last id seen>.
+    stmt = select(Machine).order_by(Machine.id)
+    if after is not None:
+        stmt = stmt.where(Machine.id > after)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return list(db.execute(stmt).scalars())
+
+
+def get_machine(db: Session, machine_id: str) -> Machine | None:
+    return db.get(Machine, machine_id)
+
+
+def is_known(machine_id: str) -> bool:
+    return machine_id in _known_machines
+
+
+def machine_exists(db: Session, machine_id: str) -> bool:
+    found = db.execute(select(Machine.id).where(Machine.id == machine_id)).first() is not None
+    if found:
+        _known_machines.add(machine_id)
+    return found
+
+
+def set_slot_limit(db: Session, machine_id: str, max_slots: int) -> Machine:
+    """Change the slot limit; slots already over a lowered limit are kept."""
+    machine = db.get(Machine, machine_id)
+    if machine is None:
+        raise ValueError("machine_not_found")
+    machine.max_slots = max_slots
+    db.commit()
+    db.refresh(machine)
+    return machine
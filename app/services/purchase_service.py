@@ -1,54 +1,143 @@
-import time
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from sqlalchemy.exc import SQLAlchemyError
 
+from app.cache import full_view_cache
 from app.config import settings
-from app.models import Item
+from app.events import event_bus
+from app.models import Item, Slot
+from app.services import coin_service, inventory_ledger, sales_ledger
+from app.services.change_engine import get_change_maker
 
-def purchase(db: Session, item_id: str, cash_inserted: int) -> dict:
+
+def purchase(
+    db: Session,
+    machine_id: str,
+    item_id: str,
+    cash_inserted: int,
+    coins_inserted: dict[int, int] | None = None,
+) -> dict:
+    track_coins = settings.TRACK_COIN_INVENTORY
+    if track_coins:
+        coin_service.validate_inserted(coins_inserted, cash_inserted)
+
+    # Stock and cash are checked by the UPDATE itself, so concurrent buyers
+    # never hold a row lock across Python code: whoever's UPDATE lands first
+    # wins and the others see quantity already decremented.
     with db.begin():
-        item = (
-            db.query(Item)
-            .filter(Item.id == item_id)
-            .with_for_update()
-            .first()
+        row = inventory_ledger.sell_one(db, machine_id, item_id, cash_inserted)
+        sales_ledger.record(
+            db, [sales_ledger.sale(machine_id, row.id, row.slot_id, row.price)]
         )
 
-        if not item:
-            raise ValueError("item_not_found")
+        change = cash_inserted - row.price
+        dispensed = None
+        if track_coins:
+            dispensed = coin_service.settle_change(db, machine_id, change, coins_inserted)
 
-        time.sleep(0.05)  # demo: widens race window for concurrent purchase/restock
+    full_view_cache.invalidate(machine_id)
+    event_bus.publish(
+        "stock", machine_id, item_id=row.id, slot_id=row.slot_id, quantity=row.quantity
+    )
+    result = {
+        "item": row.name,
+        "price": row.price,
+        "cash_inserted": cash_inserted,
+        "change_returned": change,
+        "remaining_quantity": row.quantity,
+        "message": "Purchase successful",
+    }
+    if dispensed is not None:
+        result["change_denominations"] = {
+            str(d): n for d, n in sorted(dispensed.items(), reverse=True)
+        }
+    return result
 
-        if item.quantity <= 0:
-            raise ValueError("out_of_stock")
 
-        if cash_inserted < item.price:
-            raise ValueError("insufficient_cash", item.price, cash_inserted)
+def purchase_batch(
+    db: Session, machine_id: str, entries: list[tuple[str, int]]
+) -> list[dict | ValueError]:
+    """Apply many ``(item_id, cash_inserted)`` purchases in one transaction.
 
-        change = cash_inserted - item.price
-        item.quantity -= 1
-        item.slot.current_item_count -= 1
+    Entries are validated in order with the same rules as ``purchase``, so an
+    item that runs out half-way through the batch fails only the later
+    entries. Returns one result per entry: the purchase dict on success or the
+    ``ValueError`` that ``purchase`` would have raised.
 
-    db.refresh(item)
+    Batches come from cashless kiosks, so the coin inventory is not touched.
+    """
+    if not entries:
+        return []
+
+    item_ids = {item_id for item_id, _ in entries}
+
+    with db.begin():
+        rows = db.execute(
+            select(
+                Item.id,
+                Item.name,
+                Item.price,
+                Item.quantity,
+                Item.slot_pk,
+                Slot.id.label("slot_id"),
+            )
+            .outerjoin(Slot, Slot.pk == Item.slot_pk)
+            .where(Item.machine_id == machine_id, Item.id.in_(item_ids))
+            .order_by(Item.id)
+            .with_for_update(of=Item)
+        ).all()
+        stock = {row.id: row for row in rows}
+        remaining = {row.id: row.quantity for row in rows}
+
+        sold: dict[str, int] = {}
+        sales: list[dict] = []
+        results: list[dict | ValueError] = []
+        for item_id, cash_inserted in entries:
+            row = stock.get(item_id)
+            if row is None:
+                results.append(ValueError("item_not_found"))
+                continue
+            if remaining[item_id] <= 0:
+                results.append(ValueError("out_of_stock"))
+                continue
+            if cash_inserted < row.price:
+                results.append(
+                    ValueError("insufficient_cash", row.price, cash_inserted)
+                )
+                continue
+
+            remaining[item_id] -= 1
+            sold[item_id] = sold.get(item_id, 0) + 1
+            sales.append(sales_ledger.sale(machine_id, item_id, row.slot_id, row.price))
+            results.append({
+                "item": row.name,
+                "price": row.price,
+                "cash_inserted": cash_inserted,
+                "change_returned": cash_inserted - row.price,
+                "remaining_quantity": remaining[item_id],
+                "message": "Purchase successful",
+            })
+
+        # One executemany per table: a single decrement per distinct item
+        # and per slot, however many times each appeared in the batch.
+        inventory_ledger.sell_grouped(
+            db, sold, {item_id: row.slot_pk for item_id, row in stock.items()}
+        )
+        sales_ledger.record(db, sales)
+
+    full_view_cache.invalidate(machine_id)
+    for item_id in sold:
+        event_bus.publish(
+            "stock",
+            machine_id,
+            item_id=item_id,
+            slot_id=stock[item_id].slot_id,
+            quantity=remaining[item_id],
+        )
+    return results
 
-    return {
-        "item": item.name,
-        "price": item.price,
-        "cash_inserted": cash_inserted,
-        "change_returned": change,
-        "remaining_quantity": item.quantity,
-        "message": "Purchase successful",
-    }
 
 def change_breakdown(change: int) -> dict:
-    denominations = sorted(settings.SUPPORTED_DENOMINATIONS, reverse=True)
-    result: dict[str, int] = {}
-    remaining = change
-    for d in denominations:
-        if remaining <= 0:
-            break
-        count = remaining // d
-        if count > 0:
-            result[str(d)] = count
-            remaining -= count * d
-    return {"change": change, "denominations": result}
+    return {
+        "change": change,
+        "denominations": get_change_maker().breakdown(change),
+    }
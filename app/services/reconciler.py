@@ -0,0 +1,130 @@
+import asyncio
+import logging
+import threading
+from datetime import datetime
+
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app import profiling
+from app.cache import full_view_cache
+from app.config import settings
+from app.db import SessionLocal, WriteSessionLocal, run_db
+from app.services import inventory_ledger
+from app.services.inventory_store import run_write
+
+logger = logging.getLogger(__name__)
+
+
+class InventoryReconciler:
+    """Walks slots a page at a time checking counters against their items.
+
+    Each tick checks ``INVENTORY_RECONCILE_BATCH`` slots after the previous
+    cursor, so the cost per tick is bounded however many slots exist, and a
+    full pass completes every ``ceil(slots / batch)`` ticks. Drift is kept
+    until a later pass sees the slot consistent again (or repairs it when
+    ``INVENTORY_RECONCILE_REPAIR`` is on).
+    """
+
+    def __init__(self):
+        self.cursor: str | None = None
+        self.drifted: dict[str, dict] = {}
+        self.checked_slots = 0
+        self.full_passes = 0
+        self.repaired = 0
+        self.last_full_pass_at: datetime | None = None
+        self._task: asyncio.Task | None = None
+        self._lock = threading.RLock()
+
+    def check_page(self, db: Session, limit: int | None, repair: bool) -> None:
+        with self._lock:
+            self._check_page(db, limit, repair)
+
+    def _check_page(self, db: Session, limit: int | None, repair: bool) -> None:
+        start = self.cursor
+        checked, drifted, cursor = inventory_ledger.check_counters(db, start, limit)
+
+        for slot_id in list(self.drifted):
+            if (start is None or slot_id > start) and (cursor is None or slot_id <= cursor):
+                del self.drifted[slot_id]
+
+        if repair and drifted:
+            inventory_ledger.repair_counters(db, [drift["slot_id"] for drift in drifted])
+            db.commit()
+            self.repaired += len(drifted)
+            full_view_cache.invalidate()
+        else:
+            db.rollback()
+            for drift in drifted:
+                self.drifted[drift["slot_id"]] = drift
+
+        self.checked_slots += checked
+        self.cursor = cursor
+        if cursor is None:
+            self.full_passes += 1
+            self.last_full_pass_at = datetime.utcnow()
+
+    def check_all(self, db: Session, repair: bool = False) -> dict:
+        """Check every slot now; with ``repair``, reset drifted counters too."""
+        with self._lock:
+            self.cursor = None
+            while True:
+                # A page is one query, and one more to repair its drift.
+                profiling.extend_budget(2 if repair else 1)
+                self._check_page(db, settings.INVENTORY_RECONCILE_BATCH, repair)
+                if self.cursor is None:
+                    return self.snapshot()
+
+    async def tick(self) -> None:
+        repair = settings.INVENTORY_RECONCILE_REPAIR
+        db = WriteSessionLocal() if repair else SessionLocal()
+        try:
+            if repair:
+                # Repairs are writes: pending store sales go first, and the
+                # store is reloaded from the repaired counters.
+                await run_write(db, self.check_page, settings.INVENTORY_RECONCILE_BATCH, True)
+            else:
+                await run_db(db, self.check_page, settings.INVENTORY_RECONCILE_BATCH, False)
+        finally:
+            await run_in_threadpool(db.close)
+
+    def snapshot(self) -> dict:
+        # Unknown (None) until a full pass finds nothing, unless drift was seen.
+        consistent = None
+        if self.drifted:
+            consistent = False
+        elif self.full_passes:
+            consistent = True
+        return {
+            "consistent": consistent,
+            "drifted": list(self.drifted.values()),
+            "checked_slots": self.checked_slots,
+            "full_passes": self.full_passes,
+            "repaired": self.repaired,
+            "last_full_pass_at": self.last_full_pass_at,
+        }
+
+    async def _run(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.tick()
+            except Exception:
+                logger.exception("Inventory reconcile tick failed")
+
+    def start(self) -> None:
+        interval = settings.INVENTORY_RECONCILE_INTERVAL
+        if interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run(interval))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+reconciler = InventoryReconciler()
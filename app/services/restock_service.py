@@ -0,0 +1,150 @@
+"""Restock planning from stock levels and recent sales velocity.
+
+Each item's sales rate is an exponentially weighted average of its units
+per hour over the last ``RESTOCK_WINDOW_DAYS`` of ``sales_daily``, halving
+a day's weight every ``RESTOCK_HALF_LIFE_DAYS``. The query sums each
+item's weighted units, so it returns one row per item, not one per item
+and day. Units are divided by the (equally weighted) hours the item was
+on sale in the window, so a product added yesterday is not averaged over
+two weeks of not existing. Rates, stock-out times and restocks for every
+item of every machine are a few array operations, so a fleet-wide plan
+stays cheap.
+
+An item is in the plan when it is empty or would run out within the
+horizon (the time until the next visit). Its suggested restock covers the
+sales expected over the horizon, capped by the free space in its slot,
+which goes to the items that run out soonest first.
+"""
+import math
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import Session
+
+from app.models import Item, SalesDaily, Slot
+from app.services.sales_ledger import epoch_hours
+
+HOURS_PER_DAY = 24
+
+
+def _window(now_hour: float, window_days: int, half_life_days: float):
+    """First day of the window, and the start, end and weight of each day."""
+    first_day = math.floor(now_hour / HOURS_PER_DAY) - window_days + 1
+    day_start = (first_day + np.arange(window_days)) * HOURS_PER_DAY
+    day_end = np.minimum(day_start + HOURS_PER_DAY, now_hour)
+    # Weight of each day by the age of its middle hour.
+    age_days = (now_hour - (day_start + day_end) / 2) / HOURS_PER_DAY
+    return first_day, day_start, day_end, 0.5 ** (age_days / half_life_days)
+
+
+def _velocities(
+    weighted_units: np.ndarray,
+    created_hours: np.ndarray,
+    now_hour: float,
+    day_start: np.ndarray,
+    day_end: np.ndarray,
+    weights: np.ndarray,
+) -> np.ndarray:
+    """Units per hour of each item from its weighted units in the window."""
+    # Hours each item was on sale on each day, items x days. Every item
+    # counts as on sale for at least the last day, so a few sales in its
+    # first minutes do not read as thousands an hour. Not ``np.clip``: a
+    # one-day window starts less than a day ago, after that floor, and
+    # the window's own start then applies below.
+    on_sale_from = np.minimum(
+        np.maximum(created_hours, day_start[0]), now_hour - HOURS_PER_DAY
+    )[:, None]
+    exposure = np.clip(day_end - np.maximum(day_start, on_sale_from), 0, None)
+    weighted_hours = exposure @ weights
+    return np.divide(
+        weighted_units, weighted_hours,
+        out=np.zeros(len(weighted_units)), where=weighted_hours > 0,
+    )
+
+
+def restock_plan(
+    db: Session,
+    machine_ids: list[str] | None,
+    horizon_hours: float,
+    window_days: int,
+    half_life_days: float,
+    now: datetime | None = None,
+) -> list[dict]:
+    """Items that are empty or run out within ``horizon_hours``, soonest first."""
+    now = now or datetime.utcnow()
+    now_hour = epoch_hours(now)
+
+    # Plain rows straight off the connection: the ORM's per-row work
+    # costs more than the rest of the plan.
+    conn = db.connection()
+    items_query = (
+        select(
+            Item.id, Item.machine_id, Item.name, Item.quantity, Item.created_at,
+            Slot.id, Slot.code, Slot.capacity, Slot.current_item_count,
+        )
+        .join(Slot, Slot.pk == Item.slot_pk)
+    )
+    if machine_ids is not None:
+        items_query = items_query.where(Item.machine_id.in_(machine_ids))
+    items = conn.execute(items_query).all()
+    if not items:
+        return []
+    first_day, day_start, day_end, weights = _window(now_hour, window_days, half_life_days)
+    weight = case(
+        {first_day + offset: float(w) for offset, w in enumerate(weights)},
+        value=SalesDaily.day,
+        else_=0.0,
+    )
+    sales_query = (
+        select(SalesDaily.item_id, func.sum(SalesDaily.units * weight))
+        .where(SalesDaily.day >= first_day)
+        .group_by(SalesDaily.item_id)
+    )
+    if machine_ids is not None:
+        sales_query = sales_query.where(SalesDaily.machine_id.in_(machine_ids))
+    sales = conn.execute(sales_query).all()
+
+    item_index = {row[0]: i for i, row in enumerate(items)}
+    weighted_units = np.zeros(len(items))
+    for item_id, units in sales:
+        i = item_index.get(item_id)
+        if i is not None:
+            weighted_units[i] = units
+    created_hours = np.array(
+        [epoch_hours(row[4]) if row[4] is not None else -np.inf for row in items]
+    )
+    rates = _velocities(weighted_units, created_hours, now_hour, day_start, day_end, weights)
+    quantities = np.array([row[3] for row in items], dtype=np.float64)
+    hours_left = np.divide(
+        quantities, rates, out=np.full(len(items), np.inf), where=rates > 0
+    )
+    hours_left[quantities <= 0] = 0.0
+
+    due = np.flatnonzero(hours_left < horizon_hours)
+    order = due[np.argsort(hours_left[due], kind="stable")]
+    needed = np.maximum(np.ceil(rates * horizon_hours) - quantities, 0)
+
+    free_space: dict[str, int] = {}
+    plan = []
+    for i in order.tolist():
+        (item_id, machine_id, name, quantity, _,
+         slot_id, slot_code, capacity, slot_count) = items[i]
+        free = free_space.setdefault(slot_id, max(capacity - slot_count, 0))
+        restock = min(int(needed[i]), free)
+        free_space[slot_id] = free - restock
+        left = float(hours_left[i])
+        plan.append({
+            "machine_id": machine_id,
+            "slot_id": slot_id,
+            "slot_code": slot_code,
+            "item_id": item_id,
+            "name": name,
+            "quantity": quantity,
+            "units_per_hour": round(float(rates[i]), 4),
+            "hours_to_stockout": round(left, 2),
+            "stockout_at": now + timedelta(hours=left),
+            "restock": restock,
+            "slot_free": free,
+        })
+    return plan
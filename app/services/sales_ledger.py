@@ -0,0 +1,204 @@
+"""Sales history and time-bucketed rollups.
+
+``record`` runs in the transaction that takes the units out of stock. It
+appends one ``sales`` row per unit and adds the same units to each item's
+``sales_hourly`` and ``sales_daily`` rows with upserts. Reports read only
+the rollups, never the raw sales. Whole days come from ``sales_daily``
+and partial days at either end of the range from ``sales_hourly``, so a
+quarter of one machine's sales is about one row per item per day.
+"""
+import math
+from datetime import date, datetime, timedelta, timezone
+
+from sqlalchemy import func, insert, null, select, union_all, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.models import Sale, SalesDaily, SalesHourly
+
+_sales = Sale.__table__
+_hourly = SalesHourly.__table__
+_daily = SalesDaily.__table__
+
+EPOCH = datetime(1970, 1, 1)
+GROUP_BY = ("item", "slot", "hour", "day")
+
+# Dialects with INSERT ... ON CONFLICT DO UPDATE.
+_UPSERT = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+
+def epoch_hours(moment: datetime) -> float:
+    """Hours since the epoch; aware datetimes are converted to UTC first."""
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return (moment - EPOCH).total_seconds() / 3600
+
+
+def hour_of(moment: datetime) -> int:
+    """The ``sales_hourly.hour`` bucket ``moment`` falls in."""
+    return math.floor(epoch_hours(moment))
+
+
+def sale(machine_id: str, item_id: str, slot_id: str | None, price: int,
+         sold_at: datetime | None = None) -> dict:
+    """One unit sold, as ``record`` takes it."""
+    return {
+        "machine_id": machine_id,
+        "item_id": item_id,
+        "slot_id": slot_id,
+        "price": price,
+        "sold_at": sold_at or datetime.utcnow(),
+    }
+
+
+def record(db: Session, sales: list[dict]) -> None:
+    """Append ``sales`` (from ``sale``) and add them to the rollups.
+
+    Three statements however many sales, in the caller's transaction.
+    """
+    if not sales:
+        return
+    db.execute(insert(_sales), sales)
+
+    hourly: dict[tuple, dict] = {}
+    daily: dict[tuple, dict] = {}
+    for entry in sales:
+        hour = hour_of(entry["sold_at"])
+        for totals, key in (
+            (hourly, (entry["machine_id"], hour, entry["item_id"])),
+            (daily, (entry["machine_id"], hour // 24, entry["item_id"])),
+        ):
+            total = totals.get(key)
+            if total is None:
+                totals[key] = {
+                    "machine_id": key[0],
+                    "bucket": key[1],
+                    "item_id": key[2],
+                    "slot_id": entry["slot_id"],
+                    "units": 1,
+                    "revenue": entry["price"],
+                }
+            else:
+                total["units"] += 1
+                total["revenue"] += entry["price"]
+    _add_to_rollup(db, _hourly, _hourly.c.hour, list(hourly.values()))
+    _add_to_rollup(db, _daily, _daily.c.day, list(daily.values()))
+
+
+def _add_to_rollup(db: Session, table, bucket, rows: list[dict]) -> None:
+    for row in rows:
+        row[bucket.name] = row.pop("bucket")
+    key = (table.c.machine_id, bucket, table.c.item_id)
+
+    upsert = _UPSERT.get(db.get_bind().dialect.name)
+    if upsert is not None:
+        stmt = upsert(table)
+        db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=key,
+                set_={
+                    "units": table.c.units + stmt.excluded.units,
+                    "revenue": table.c.revenue + stmt.excluded.revenue,
+                },
+            ),
+            rows,
+        )
+        return
+
+    # No ON CONFLICT: add to the rows that exist, insert the others.
+    for row in rows:
+        added = db.execute(
+            update(table)
+            .where(*(column == row[column.name] for column in key))
+            .values(
+                units=table.c.units + row["units"],
+                revenue=table.c.revenue + row["revenue"],
+            )
+        )
+        if not added.rowcount:
+            db.execute(insert(table).values(**row))
+
+
+def _rollup_rows(table, bucket, machine_id: str, lo: int | None, hi: int | None, by_hour: bool):
+    """``item, slot, hour, day, units, revenue`` of one rollup, ``lo <= bucket < hi``."""
+    if table is _hourly:
+        hour, day = bucket, bucket // 24
+    else:
+        hour, day = null(), bucket
+    stmt = select(
+        table.c.item_id.label("item"),
+        table.c.slot_id.label("slot"),
+        (hour if by_hour else null()).label("hour"),
+        day.label("day"),
+        table.c.units,
+        table.c.revenue,
+    ).where(table.c.machine_id == machine_id)
+    if lo is not None:
+        stmt = stmt.where(bucket >= lo)
+    if hi is not None:
+        stmt = stmt.where(bucket < hi)
+    return stmt
+
+
+def sales_report(
+    db: Session,
+    machine_id: str,
+    start: datetime | None,
+    end: datetime | None,
+    group_by: list[str],
+) -> list[dict]:
+    """Units and revenue between ``start`` and ``end``, grouped by ``group_by``.
+
+    Whole hours are counted: every hour that overlaps ``[start, end)``.
+    Without ``group_by`` there is a single row of totals.
+    """
+    first_hour = math.floor(epoch_hours(start)) if start is not None else None
+    end_hour = math.ceil(epoch_hours(end)) if end is not None else None
+
+    if "hour" in group_by:
+        parts = [_rollup_rows(_hourly, _hourly.c.hour, machine_id, first_hour, end_hour, True)]
+    else:
+        # Whole days inside the range from the daily rollup, the hours
+        # before the first and after the last of them from the hourly one.
+        first_day = -(-first_hour // 24) if first_hour is not None else None
+        end_day = end_hour // 24 if end_hour is not None else None
+        if first_day is not None and end_day is not None and first_day >= end_day:
+            parts = [_rollup_rows(
+                _hourly, _hourly.c.hour, machine_id, first_hour, end_hour, False
+            )]
+        else:
+            parts = [_rollup_rows(_daily, _daily.c.day, machine_id, first_day, end_day, False)]
+            if first_day is not None and first_hour < first_day * 24:
+                parts.append(_rollup_rows(
+                    _hourly, _hourly.c.hour, machine_id, first_hour, first_day * 24, False
+                ))
+            if end_day is not None and end_day * 24 < end_hour:
+                parts.append(_rollup_rows(
+                    _hourly, _hourly.c.hour, machine_id, end_day * 24, end_hour, False
+                ))
+    source = (union_all(*parts) if len(parts) > 1 else parts[0]).subquery()
+
+    columns = [source.c[name] for name in group_by]
+    stmt = select(
+        *columns,
+        func.coalesce(func.sum(source.c.units), 0).label("units"),
+        func.coalesce(func.sum(source.c.revenue), 0).label("revenue"),
+    )
+    if columns:
+        stmt = stmt.group_by(*columns).order_by(*columns)
+
+    report = []
+    for row in db.execute(stmt).mappings():
+        entry = {"units": row["units"], "revenue": row["revenue"]}
+        for name in group_by:
+            value = row[name]
+            if name == "item":
+                entry["item_id"] = value
+            elif name == "slot":
+                entry["slot_id"] = value
+            elif name == "hour":
+                entry["hour"] = EPOCH + timedelta(hours=value)
+            else:
+                entry["day"] = date(1970, 1, 1) + timedelta(days=value)
+        report.append(entry)
+    return report
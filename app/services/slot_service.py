@@ -1,71 +1,178 @@
-from sqlalchemy.orm import Session,selectinload
-
-from app.config import settings
-from app.models import Slot
-from app.schemas import SlotCreate, SlotFullView, SlotFullViewItem, SlotResponse
-from sqlalchemy.exc import SQLAlchemyError
+from typing import Iterator
 
+from sqlalchemy import Row, delete, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
 
+from app import encoding
+from app.cache import full_view_cache
+from app.config import settings
+from app.events import event_bus
+from app.models import Item, Machine, Slot
+from app.schemas import SlotCreate, SlotResponse
 
-def create_slot(db: Session, data: SlotCreate) -> Slot:
-    count = db.query(Slot).count()
-    if count >= settings.MAX_SLOTS:
-        raise ValueError("slot_limit_reached")
-    existing = db.query(Slot).filter(Slot.code == data.code).first()
-    if existing:
+def create_slot(db: Session, machine_id: str, data: SlotCreate) -> Slot:
+    # The limit is checked on the machine's own counter, claimed in the same
+    # guarded UPDATE; a code clash is left to the (machine_id, code) index.
+    try:
+        claimed = db.execute(
+            update(Machine)
+            .where(Machine.id == machine_id, Machine.slot_count < Machine.max_slots)
+            .values(slot_count=Machine.slot_count + 1)
+            .execution_options(synchronize_session=False)
+        )
+        if not claimed.rowcount:
+            exists = db.execute(select(Machine.id).where(Machine.id == machine_id)).first()
+            raise ValueError("slot_limit_reached" if exists else "machine_not_found")
+        slot = Slot(
+            machine_id=machine_id,
+            code=data.code,
+            capacity=data.capacity,
+            current_item_count=0,
+        )
+        db.add(slot)
+        db.commit()
+    except IntegrityError:
+        db.rollback()
         raise ValueError("slot_code_exists")
-    slot = Slot(code=data.code, capacity=data.capacity, current_item_count=0)
-    db.add(slot)
-    db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    full_view_cache.invalidate(machine_id)
     db.refresh(slot)
+    event_bus.publish("slot_added", machine_id, slot_id=slot.id)
     return slot
 
 
-def list_slots(db: Session) -> list[Slot]:
-    return db.query(Slot).all()
+def list_slots(
+    db: Session, machine_id: str, after: str | None = None, limit: int | None = None
+) -> list[Row]:
+    # Keyset pagination on the (machine_id, code) index: ?after=<last code seen>.
+    # Plain rows with the ``SlotResponse`` fields; the route encodes them as is.
+    stmt = (
+        select(Slot.id, Slot.code, Slot.capacity, Slot.current_item_count, Slot.version)
+        .where(Slot.machine_id == machine_id)
+        .order_by(Slot.code)
+    )
+    if after is not None:
+        stmt = stmt.where(Slot.code > after)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return db.execute(stmt).all()
+
+
+def get_slot_by_id(db: Session, machine_id: str, slot_id: str) -> Slot | None:
+    return (
+        db.query(Slot)
+        .filter(Slot.id == slot_id, Slot.machine_id == machine_id)
+        .first()
+    )
 
 
-def get_slot_by_id(db: Session, slot_id: str) -> Slot | None:
-    return db.query(Slot).filter(Slot.id == slot_id).first()
+def slot_exists(db: Session, machine_id: str, slot_id: str) -> bool:
+    found = db.query(Slot.id).filter(
+        Slot.id == slot_id, Slot.machine_id == machine_id
+    ).first() is not None
+    # End the read transaction so callers that go on to stream a long
+    # request body don't hold it (and SQLite's shared lock) open meanwhile.
+    db.rollback()
+    return found
 
 
-def delete_slot(db: Session, slot_id: str) -> None:
-    slot = get_slot_by_id(db, slot_id)
-    if not slot:
-        raise ValueError("slot_not_found")
-    if slot.current_item_count > 0 or len(slot.items) > 0:
-        raise ValueError("slot_not_empty")
+def delete_slot(db: Session, machine_id: str, slot_id: str) -> None:
+    # Emptiness is checked by the DELETE itself (counter plus an EXISTS on
+    # items), instead of loading the slot and then every item it holds.
+    has_items = select(Item.id).where(
+        Item.machine_id == machine_id, Item.slot_pk == Slot.pk
+    ).exists()
     try:
-        db.delete(slot)
+        deleted = db.execute(
+            delete(Slot)
+            .where(
+                Slot.id == slot_id,
+                Slot.machine_id == machine_id,
+                Slot.current_item_count == 0,
+                ~has_items,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        if not deleted.rowcount:
+            exists = db.execute(
+                select(Slot.id).where(Slot.id == slot_id, Slot.machine_id == machine_id)
+            ).first()
+            raise ValueError("slot_not_empty" if exists else "slot_not_found")
+        db.execute(
+            update(Machine)
+            .where(Machine.id == machine_id)
+            .values(slot_count=Machine.slot_count - 1)
+            .execution_options(synchronize_session=False)
+        )
         db.commit()
-    except SQLAlchemyError:
+    except Exception:
         db.rollback()
         raise
+    full_view_cache.invalidate(machine_id)
+    event_bus.publish("slot_removed", machine_id, slot_id=slot_id)
 
 
-def get_full_view(db: Session) -> list[SlotFullView]:
-    slots = (
-        db.query(Slot)
-        .options(selectinload(Slot.items))
-        .all()
-    )
+def get_full_view(db: Session, machine_id: str) -> list[dict]:
+    """Every slot with its items, as plain dicts shaped like ``SlotFullView``.
+
+    One LEFT JOIN in slot order; empty slots come back as a row of NULL
+    item columns.
+    """
+    rows = db.execute(
+        select(
+            Slot.id, Slot.code, Slot.capacity,
+            Item.id, Item.name, Item.price, Item.quantity,
+        )
+        .outerjoin(Item, (Item.machine_id == machine_id) & (Item.slot_pk == Slot.pk))
+        .where(Slot.machine_id == machine_id)
+        .order_by(Slot.pk, Item.pk)
+    ).all()
     result = []
-    for slot in slots:
-        items = [
-            SlotFullViewItem(
-                id=item.id,
-                name=item.name,
-                price=item.price,
-                quantity=item.quantity,
-            )
-            for item in slot.items
-        ]
-        result.append(
-            SlotFullView(
-                id=slot.id,
-                code=slot.code,
-                capacity=slot.capacity,
-                items=items,
+    slot = None
+    for slot_id, code, capacity, item_id, name, price, quantity in rows:
+        if slot is None or slot["id"] != slot_id:
+            slot = {"id": slot_id, "code": code, "capacity": capacity, "items": []}
+            result.append(slot)
+        if item_id is not None:
+            slot["items"].append(
+                {"id": item_id, "name": name, "price": price, "quantity": quantity}
             )
+    return result
+
+
+def get_full_view_payload(db: Session, machine_id: str) -> tuple[bytes, str]:
+    """Return the full view as encoded JSON and its ETag, served from cache."""
+    cached = full_view_cache.get(machine_id)
+    if cached is not None:
+        return cached
+    generation = full_view_cache.generation(machine_id)
+    body = encoding.encode(get_full_view(db, machine_id))
+    return full_view_cache.store(machine_id, generation, body)
+
+
+def iter_inventory_rows(db: Session, machine_id: str) -> Iterator[Row]:
+    """Yield one flat row per item (or per empty slot), ordered by slot code.
+
+    Rows come from a server-side cursor in ``EXPORT_YIELD_PER`` batches, so
+    an export never holds more than one batch in memory.
+    """
+    stmt = (
+        select(
+            Slot.id.label("slot_id"),
+            Slot.code.label("slot_code"),
+            Slot.capacity,
+            Slot.current_item_count,
+            Item.id.label("item_id"),
+            Item.name,
+            Item.price,
+            Item.quantity,
         )
-    return result
\ No newline at end of file
+        .outerjoin(Item, (Item.machine_id == machine_id) & (Item.slot_pk == Slot.pk))
+        .where(Slot.machine_id == machine_id)
+        .order_by(Slot.code, Item.id)
+        .execution_options(yield_per=settings.EXPORT_YIELD_PER)
+    )
+    yield from db.execute(stmt)
@@ -0,0 +1,136 @@
+"""Service-level micro-benchmarks.
+
+    pytest benchmarks --benchmark-json=bench-services.json
+    pytest benchmarks --benchmark-compare=<saved run>
+"""
+import random
+from datetime import datetime
+
+from pydantic import TypeAdapter
+from sqlalchemy import select
+
+from app import encoding
+from app.cache import full_view_cache
+from app.models import DEFAULT_MACHINE_ID, Item, Slot
+from app.schemas import ItemBulkEntry, ItemResponse
+from app.services import (
+    item_service,
+    purchase_service,
+    restock_service,
+    sales_ledger,
+    slot_service,
+)
+from app.services.change_engine import ChangeMaker, get_change_maker
+
+
+def bench_change_breakdown(benchmark):
+    get_change_maker()
+    amounts = list(range(0, 2000, 7))
+    benchmark(lambda: [purchase_service.change_breakdown(a) for a in amounts])
+
+
+def bench_change_table_build(benchmark):
+    benchmark(ChangeMaker, [1, 2, 5, 10, 20, 50, 100], 5000)
+
+
+def bench_bounded_change_short_box(benchmark):
+    maker = get_change_maker()
+    rng = random.Random(7)
+    boxes = [
+        {d: rng.randint(0, 4) for d in maker.denominations} for _ in range(50)
+    ]
+    benchmark(lambda: [maker.bounded_counts(385, box) for box in boxes])
+
+
+def bench_get_full_view(benchmark, stocked_db):
+    benchmark(slot_service.get_full_view, stocked_db, DEFAULT_MACHINE_ID)
+
+
+def bench_get_full_view_payload_cold(benchmark, stocked_db):
+    def cold():
+        full_view_cache.invalidate()
+        return slot_service.get_full_view_payload(stocked_db, DEFAULT_MACHINE_ID)
+
+    benchmark(cold)
+
+
+def bench_get_full_view_payload_cached(benchmark, stocked_db):
+    slot_service.get_full_view_payload(stocked_db, DEFAULT_MACHINE_ID)
+    benchmark(slot_service.get_full_view_payload, stocked_db, DEFAULT_MACHINE_ID)
+
+
+def _item_rows(db):
+    return db.execute(select(Item.id, Item.name, Item.price, Item.quantity)).all()
+
+
+def bench_encode_items_as_models(benchmark, stocked_db):
+    """How read routes used to answer: models built by hand, then FastAPI
+    validating them against ``response_model`` and dumping them."""
+    rows = _item_rows(stocked_db)
+    adapter = TypeAdapter(list[ItemResponse])
+
+    def encode():
+        models = [
+            ItemResponse(id=r.id, name=r.name, price=r.price, quantity=r.quantity)
+            for r in rows
+        ]
+        return adapter.dump_json(adapter.validate_python(models))
+
+    benchmark(encode)
+
+
+def bench_encode_items_from_rows(benchmark, stocked_db):
+    rows = _item_rows(stocked_db)
+    benchmark(encoding.encode_rows, encoding.fields_of(ItemResponse), rows)
+
+
+def bench_bulk_add_items_1000(benchmark, session_factory):
+    entries = [
+        ItemBulkEntry(name=f"bulk-{i}", price=25, quantity=1) for i in range(1000)
+    ]
+    counter = iter(range(10**9))
+
+    def setup():
+        db = session_factory()
+        slot = Slot(code=f"B{next(counter)}", capacity=10**9, current_item_count=0)
+        db.add(slot)
+        db.commit()
+        slot_id = slot.id
+        db.close()
+        return (session_factory(), DEFAULT_MACHINE_ID, slot_id, entries), {}
+
+    benchmark.pedantic(item_service.bulk_add_items, setup=setup, rounds=20)
+
+
+def bench_sales_report_quarter_by_slot_day(benchmark, sales_history_db):
+    benchmark(
+        sales_ledger.sales_report,
+        sales_history_db,
+        DEFAULT_MACHINE_ID,
+        datetime(2026, 1, 1, 9),
+        datetime(2026, 3, 31, 17),
+        ["slot", "day"],
+    )
+
+
+def bench_sales_report_week_by_hour(benchmark, sales_history_db):
+    benchmark(
+        sales_ledger.sales_report,
+        sales_history_db,
+        DEFAULT_MACHINE_ID,
+        datetime(2026, 3, 1),
+        datetime(2026, 3, 8),
+        ["hour"],
+    )
+
+
+def bench_restock_plan_fleet(benchmark, fleet_db):
+    benchmark(
+        restock_service.restock_plan,
+        fleet_db,
+        None,
+        48.0,
+        14,
+        3.0,
+        datetime(2026, 3, 1, 18),
+    )
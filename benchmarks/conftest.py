@@ -0,0 +1,108 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.cache import full_view_cache
+from app.db import Base
+from app.models import DEFAULT_MACHINE_ID, Item, Machine, SalesDaily, SalesHourly, Slot
+from app.services import sales_ledger
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(bind=engine)
+    yield sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def stocked_db(session_factory):
+    """50 slots of 20 items each, roughly a full machine bank."""
+    db = session_factory()
+    db.add(Machine(id=DEFAULT_MACHINE_ID, max_slots=50, slot_count=50))
+    for s in range(50):
+        slot = Slot(code=f"S{s:03d}", capacity=10_000, current_item_count=20 * 5)
+        db.add(slot)
+        db.flush()
+        for i in range(20):
+            db.add(Item(name=f"item-{s}-{i}", price=10 + i, slot_pk=slot.pk, quantity=5))
+    db.commit()
+    full_view_cache.invalidate()
+    yield db
+    db.close()
+
+
+@pytest.fixture
+def sales_history_db(session_factory):
+    """90 days of hourly and daily rollups for 100 items in 20 slots."""
+    db = session_factory()
+    db.add(Machine(id=DEFAULT_MACHINE_ID, max_slots=50, slot_count=0))
+    first = sales_ledger.hour_of(datetime(2026, 1, 1))
+    hourly = [
+        {
+            "machine_id": DEFAULT_MACHINE_ID,
+            "hour": first + h,
+            "item_id": f"item-{i:03d}",
+            "slot_id": f"slot-{i % 20:02d}",
+            "units": 1 + (h + i) % 3,
+            "revenue": 25 * (1 + (h + i) % 3),
+        }
+        for h in range(90 * 24)
+        for i in range(100)
+    ]
+    daily: dict[tuple, dict] = {}
+    for row in hourly:
+        key = (row["hour"] // 24, row["item_id"])
+        total = daily.setdefault(key, {
+            "machine_id": DEFAULT_MACHINE_ID,
+            "day": key[0],
+            "item_id": row["item_id"],
+            "slot_id": row["slot_id"],
+            "units": 0,
+            "revenue": 0,
+        })
+        total["units"] += row["units"]
+        total["revenue"] += row["revenue"]
+    db.execute(insert(SalesHourly), hourly)
+    db.execute(insert(SalesDaily), list(daily.values()))
+    db.commit()
+    yield db
+    db.close()
+
+
+@pytest.fixture
+def fleet_db(session_factory):
+    """20 machines of 50 slots with 5 items each, 14 days of daily rollups."""
+    db = session_factory()
+    day = sales_ledger.hour_of(datetime(2026, 3, 1)) // 24
+    daily = []
+    for m in range(20):
+        machine_id = f"machine-{m:02d}"
+        db.add(Machine(id=machine_id, max_slots=50, slot_count=50))
+        for s in range(50):
+            slot = Slot(machine_id=machine_id, code=f"S{s:03d}", capacity=60,
+                        current_item_count=5 * (s % 10))
+            db.add(slot)
+            db.flush()
+            for i in range(5):
+                item = Item(machine_id=machine_id, name=f"item-{s}-{i}", price=100,
+                            slot_pk=slot.pk, quantity=s % 10, created_at=datetime(2026, 1, 1))
+                db.add(item)
+                db.flush()
+                daily.extend(
+                    {"machine_id": machine_id, "day": day - d, "item_id": item.id,
+                     "slot_id": slot.id, "units": (s + i + d) % 7, "revenue": 0}
+                    for d in range(14)
+                )
+    db.execute(insert(SalesDaily), daily)
+    db.commit()
+    yield db
+    db.close()
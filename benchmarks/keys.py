@@ -0,0 +1,224 @@
+"""Key layout benchmark: CHAR(36) UUID keys versus integer surrogate keys.
+
+Builds the same catalog twice in SQLite files, once with the old layout
+(``CHAR(36)`` primary keys, ``items.slot_id`` referencing ``slots.id``) and
+once with the current one (integer ``pk`` columns, ``items.slot_pk``, the
+UUID kept as a unique public ``id``), then reports table and index sizes
+from ``dbstat`` and times the lookups the API runs::
+
+    python -m benchmarks.keys                       # 1,000,000 items
+    python -m benchmarks.keys --items 5000000 --lookups 20000
+
+Lookups, per layout:
+
+* ``item``       – one item with its slot's public id, by item id
+* ``slot_items`` – first page of one slot's items, by machine and slot id
+* ``full_view``  – every slot of a machine with its items
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime
+
+from sqlalchemy import (
+    CHAR, Column, DateTime, ForeignKey, Index, Integer, MetaData, String, Table,
+    create_engine, insert, text,
+)
+
+from app.models import DEFAULT_MACHINE_ID, Item, Machine, Slot, generate_uuid
+
+legacy = MetaData()
+Table(
+    "machines", legacy,
+    Column("id", String(64), primary_key=True),
+    Column("max_slots", Integer, nullable=False),
+    Column("slot_count", Integer, nullable=False),
+)
+Table(
+    "slots", legacy,
+    Column("id", CHAR(36), primary_key=True),
+    Column("machine_id", String(64), ForeignKey("machines.id"), nullable=False),
+    Column("code", String(32), nullable=False),
+    Column("capacity", Integer, nullable=False),
+    Column("current_item_count", Integer, nullable=False),
+    Column("created_at", DateTime, default=datetime.utcnow),
+    Column("updated_at", DateTime, default=datetime.utcnow),
+    Index("ix_slots_machine_code", "machine_id", "code", unique=True),
+)
+Table(
+    "items", legacy,
+    Column("id", CHAR(36), primary_key=True),
+    Column("machine_id", String(64), ForeignKey("machines.id"), nullable=False),
+    Column("name", String(255), nullable=False),
+    Column("price", Integer, nullable=False),
+    Column("slot_id", CHAR(36), ForeignKey("slots.id"), nullable=True),
+    Column("quantity", Integer, nullable=False),
+    Column("created_at", DateTime, default=datetime.utcnow),
+    Column("updated_at", DateTime, default=datetime.utcnow),
+    Index("ix_items_machine_slot", "machine_id", "slot_id", "id"),
+)
+
+current = MetaData()
+for model in (Machine, Slot, Item):
+    model.__table__.to_metadata(current)
+
+# The same statements in each layout: (item, slot_items, full_view).
+QUERIES = {
+    "uuid": (
+        "SELECT items.id, items.name, items.price, items.quantity, slots.id "
+        "FROM items LEFT JOIN slots ON slots.id = items.slot_id WHERE items.id = :id",
+        "SELECT id, name, price, quantity FROM items "
+        "WHERE machine_id = :machine AND slot_id = :slot ORDER BY id LIMIT 20",
+        "SELECT slots.id, slots.code, items.id, items.name, items.price, items.quantity "
+        "FROM slots LEFT JOIN items ON items.machine_id = slots.machine_id "
+        "AND items.slot_id = slots.id WHERE slots.machine_id = :machine",
+    ),
+    "integer": (
+        "SELECT items.id, items.name, items.price, items.quantity, slots.id "
+        "FROM items LEFT JOIN slots ON slots.pk = items.slot_pk WHERE items.id = :id",
+        "SELECT id, name, price, quantity FROM items "
+        "WHERE machine_id = :machine "
+        "AND slot_pk = (SELECT pk FROM slots WHERE machine_id = :machine AND id = :slot) "
+        "ORDER BY id LIMIT 20",
+        "SELECT slots.id, slots.code, items.id, items.name, items.price, items.quantity "
+        "FROM slots LEFT JOIN items ON items.machine_id = slots.machine_id "
+        "AND items.slot_pk = slots.pk WHERE slots.machine_id = :machine",
+    ),
+}
+LOOKUPS = ("item", "slot_items", "full_view")
+CHUNK = 20000
+
+
+def build(url: str, metadata: MetaData, layout: str, catalog: list) -> None:
+    engine = create_engine(url)
+    metadata.create_all(engine)
+    tables = metadata.tables
+    machines, slots = catalog
+    with engine.begin() as conn:
+        conn.execute(insert(tables["machines"]), [
+            {"id": machine, "max_slots": len(codes), "slot_count": len(codes)}
+            for machine, codes in machines
+        ])
+        slot_rows = []
+        for pk, (slot_id, machine, code, _) in enumerate(slots, 1):
+            row = {"id": slot_id, "machine_id": machine, "code": code,
+                   "capacity": 1000, "current_item_count": 0}
+            if layout == "integer":
+                row["pk"] = pk
+            slot_rows.append(row)
+        for start in range(0, len(slot_rows), CHUNK):
+            conn.execute(insert(tables["slots"]), slot_rows[start:start + CHUNK])
+        batch = []
+        for pk, (slot_id, machine, _, item_ids) in enumerate(slots, 1):
+            for item_id in item_ids:
+                row = {"id": item_id, "machine_id": machine, "name": "Item",
+                       "price": 100, "quantity": 5}
+                if layout == "integer":
+                    row["slot_pk"] = pk
+                else:
+                    row["slot_id"] = slot_id
+                batch.append(row)
+                if len(batch) >= CHUNK:
+                    conn.execute(insert(tables["items"]), batch)
+                    batch = []
+        if batch:
+            conn.execute(insert(tables["items"]), batch)
+    with engine.connect() as conn:
+        conn.exec_driver_sql("ANALYZE")
+    engine.dispose()
+
+
+def sizes(url: str) -> dict[str, int]:
+    engine = create_engine(url)
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql(
+            "SELECT name, SUM(pgsize) FROM dbstat GROUP BY name"
+        ).all()
+    engine.dispose()
+    return {name: size for name, size in rows if not name.startswith("sqlite_stat")}
+
+
+def time_lookups(url: str, layout: str, catalog: list, lookups: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    slots = catalog[1]
+    engine = create_engine(url)
+    results = {}
+    with engine.connect() as conn:
+        for name, sql in zip(LOOKUPS, QUERIES[layout]):
+            statement = text(sql)
+            timings = []
+            for _ in range(lookups if name != "full_view" else max(lookups // 10, 1)):
+                slot_id, machine, _, item_ids = rng.choice(slots)
+                params = {
+                    "item": {"id": rng.choice(item_ids)},
+                    "slot_items": {"machine": machine, "slot": slot_id},
+                    "full_view": {"machine": machine},
+                }[name]
+                start = time.perf_counter()
+                conn.execute(statement, params).all()
+                timings.append((time.perf_counter() - start) * 1e6)
+            timings.sort()
+            results[name] = {
+                "median_us": statistics.median(timings),
+                "p99_us": timings[int((len(timings) - 1) * 0.99)],
+            }
+    engine.dispose()
+    return results
+
+
+def make_catalog(items: int, items_per_slot: int, slots_per_machine: int) -> list:
+    slot_total = max(items // items_per_slot, 1)
+    machines, slots = [], []
+    for m in range(0, slot_total, slots_per_machine):
+        machine = DEFAULT_MACHINE_ID if m == 0 else f"machine-{m // slots_per_machine}"
+        codes = [f"A{n}" for n in range(min(slots_per_machine, slot_total - m))]
+        machines.append((machine, codes))
+        for code in codes:
+            slots.append((generate_uuid(), machine, code,
+                          [generate_uuid() for _ in range(items_per_slot)]))
+    return [machines, slots]
+
+
+def mib(size: int) -> str:
+    return f"{size / 2**20:9.1f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--items", type=int, default=1_000_000)
+    parser.add_argument("--items-per-slot", type=int, default=10)
+    parser.add_argument("--slots-per-machine", type=int, default=60)
+    parser.add_argument("--lookups", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    catalog = make_catalog(args.items, args.items_per_slot, args.slots_per_machine)
+    with tempfile.TemporaryDirectory() as tmp:
+        report = {}
+        for layout, metadata in (("uuid", legacy), ("integer", current)):
+            url = f"sqlite:///{os.path.join(tmp, layout + '.db')}"
+            start = time.perf_counter()
+            build(url, metadata, layout, catalog)
+            print(f"built {layout} layout in {time.perf_counter() - start:.1f}s")
+            report[layout] = (sizes(url), time_lookups(url, layout, catalog, args.lookups, args.seed))
+
+    print(f"\n{len(catalog[1]) * args.items_per_slot} items, {len(catalog[1])} slots\n")
+    names = sorted(set(report["uuid"][0]) | set(report["integer"][0]))
+    print(f"{'table / index (MiB)':32} {'uuid':>9} {'integer':>9}")
+    for name in names:
+        print(f"{name:32} {mib(report['uuid'][0].get(name, 0))} "
+              f"{mib(report['integer'][0].get(name, 0))}")
+    print(f"{'total':32} {mib(sum(report['uuid'][0].values()))} "
+          f"{mib(sum(report['integer'][0].values()))}")
+    print(f"\n{'lookup (us)':12} {'uuid p50':>10} {'p99':>8} {'integer p50':>12} {'p99':>8}")
+    for name in LOOKUPS:
+        u, i = report["uuid"][1][name], report["integer"][1][name]
+        print(f"{name:12} {u['median_us']:10.1f} {u['p99_us']:8.1f} "
+              f"{i['median_us']:12.1f} {i['p99_us']:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""In-process concurrent load driver for the ASGI app.
+
+Each target runs in its own interpreter, because ``app.db`` builds its
+engine from ``DATABASE_URL`` at import time::
+
+    python -m benchmarks.load                       # the three sqlite targets
+    python -m benchmarks.load --target url --database-url postgresql://...
+    python -m benchmarks.load --out after.json --compare before.json
+
+``sqlite-tuned`` is ``sqlite-file`` with ``SQLITE_TUNED=true`` (WAL,
+pragmas, read pool plus a single writer).
+
+Scenarios, per target:
+
+* ``purchase``        – POST /purchase spread over many items
+* ``purchase_hot``    – POST /purchase all on one item (worst-case contention)
+* ``full_view``       – GET /slots/full-view polling
+* ``full_view_etag``  – the same poll with If-None-Match (idle screens)
+* ``slot_items``      – GET /slots/{slot_id}/items, a full page of 500 items
+* ``item``            – GET /items/{item_id}
+
+Results hold p50/p95/p99 latency (ms), throughput (req/s), process CPU
+time per request (ms) and error counts and are written as JSON for
+``--compare``.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+TARGETS = ("sqlite-file", "sqlite-tuned", "sqlite-memory", "url")
+# Items in the slot the listing scenario pages through (one full page).
+LISTING_ITEMS = 500
+
+
+def percentile(sorted_values: list[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * p
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+async def drive(client, make_request, total: int, concurrency: int) -> dict:
+    latencies: list[float] = []
+    errors = 0
+    issued = 0
+
+    async def worker():
+        nonlocal errors, issued
+        while issued < total:
+            issued += 1
+            method, url, kwargs, ok = make_request()
+            start = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if response.status_code not in ok:
+                errors += 1
+
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    cpu = time.process_time() - cpu_start
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "cpu_ms_per_request": round(cpu * 1000 / max(len(latencies), 1), 3),
+        "p50_ms": round(percentile(latencies, 0.50), 3),
+        "p95_ms": round(percentile(latencies, 0.95), 3),
+        "p99_ms": round(percentile(latencies, 0.99), 3),
+    }
+
+
+async def run_target(requests: int, concurrency: int, slots: int, items_per_slot: int) -> dict:
+    import httpx
+
+    from app.main import app
+
+    stock = requests * 2
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            item_ids = []
+            for s in range(slots):
+                slot = (await client.post(
+                    "/slots", json={"code": f"L{s:04d}", "capacity": stock * items_per_slot}
+                )).json()
+                for i in range(items_per_slot):
+                    item = (await client.post(
+                        f"/slots/{slot['id']}/items",
+                        json={"name": f"item-{s}-{i}", "price": 20, "quantity": stock},
+                    )).json()
+                    item_ids.append(item["id"])
+            listing = (await client.post(
+                "/slots", json={"code": "LIST", "capacity": LISTING_ITEMS}
+            )).json()
+            await client.post(f"/slots/{listing['id']}/items/bulk", json={"items": [
+                {"name": f"listed-{i}", "price": 20, "quantity": 1} for i in range(LISTING_ITEMS)
+            ]})
+            hot = item_ids[0]
+            rng = random.Random(42)
+
+            def purchase():
+                body = {"item_id": rng.choice(item_ids), "cash_inserted": 50}
+                return "POST", "/purchase", {"json": body}, (200,)
+
+            def purchase_hot():
+                body = {"item_id": hot, "cash_inserted": 50}
+                return "POST", "/purchase", {"json": body}, (200,)
+
+            def full_view():
+                return "GET", "/slots/full-view", {}, (200,)
+
+            def slot_items():
+                url = f"/slots/{listing['id']}/items?limit={LISTING_ITEMS}"
+                return "GET", url, {}, (200,)
+
+            def item():
+                return "GET", f"/items/{rng.choice(item_ids)}", {}, (200,)
+
+            etag = None
+
+            def full_view_etag():
+                headers = {"If-None-Match": etag}
+                return "GET", "/slots/full-view", {"headers": headers}, (200, 304)
+
+            results = {}
+            for name, make in (
+                ("purchase", purchase),
+                ("purchase_hot", purchase_hot),
+                ("full_view", full_view),
+                ("full_view_etag", full_view_etag),
+                ("slot_items", slot_items),
+                ("item", item),
+            ):
+                if name == "full_view_etag":
+                    etag = (await client.get("/slots/full-view")).headers["etag"]
+                results[name] = await drive(client, make, requests, concurrency)
+            return results
+
+
+def spawn(target: str, database_url: str | None, args) -> dict:
+    env = dict(os.environ)
+    env.update(
+        ENVIRONMENT="development",
+        MAX_SLOTS=str(max(args.slots + 1, 10)),
+        INVENTORY_RECONCILE_INTERVAL="0",
+        # A route over its query budget fails, and shows up as errors.
+        QUERY_BUDGET_MODE="raise",
+    )
+    if target in ("sqlite-file", "sqlite-tuned"):
+        workdir = tempfile.mkdtemp(prefix="vending-bench-")
+        env["DATABASE_URL"] = f"sqlite:///{workdir}/bench.db"
+        env["SQLITE_TUNED"] = "true" if target == "sqlite-tuned" else "false"
+    elif target == "sqlite-memory":
+        env["DATABASE_URL"] = "sqlite://"
+    else:
+        if not database_url:
+            raise SystemExit("--database-url (or DATABASE_URL) is required for target 'url'")
+        env["DATABASE_URL"] = database_url
+
+    cmd = [
+        sys.executable, "-m", "benchmarks.load", "--child",
+        "--requests", str(args.requests),
+        "--concurrency", str(args.concurrency),
+        "--slots", str(args.slots),
+        "--items-per-slot", str(args.items_per_slot),
+    ]
+    out = subprocess.run(cmd, env=env, capture_output=True, text=True)
+    if out.returncode != 0:
+        sys.stderr.write(out.stderr)
+        raise SystemExit(f"target {target} failed")
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def compare(current: dict, baseline: dict) -> None:
+    print(
+        f"{'target/scenario':40} {'rps':>10} {'Δrps':>8} {'p95 ms':>10} {'Δp95':>8}"
+        f" {'cpu ms':>8} {'Δcpu':>8}"
+    )
+    for target, scenarios in current["targets"].items():
+        for name, now in scenarios.items():
+            before = baseline.get("targets", {}).get(target, {}).get(name)
+            if before is None:
+                continue
+            d_rps = (now["throughput_rps"] / before["throughput_rps"] - 1) * 100
+            d_p95 = (now["p95_ms"] / before["p95_ms"] - 1) * 100 if before["p95_ms"] else 0.0
+            cpu, cpu_before = now.get("cpu_ms_per_request"), before.get("cpu_ms_per_request")
+            d_cpu = (cpu / cpu_before - 1) * 100 if cpu and cpu_before else 0.0
+            print(
+                f"{target + '/' + name:40} {now['throughput_rps']:>10} {d_rps:>+7.1f}%"
+                f" {now['p95_ms']:>10} {d_p95:>+7.1f}%"
+                f" {cpu or 0:>8} {d_cpu:>+7.1f}%"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--target", action="append", choices=TARGETS)
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"))
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--slots", type=int, default=10)
+    parser.add_argument("--items-per-slot", type=int, default=10)
+    parser.add_argument("--out", default="bench-load.json")
+    parser.add_argument("--compare", metavar="BASELINE_JSON")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        results = asyncio.run(run_target(
+            args.requests, args.concurrency, args.slots, args.items_per_slot
+        ))
+        print(json.dumps(results))
+        return
+
+    targets = args.target or ["sqlite-file", "sqlite-tuned", "sqlite-memory"]
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "params": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "slots": args.slots,
+            "items_per_slot": args.items_per_slot,
+        },
+        "targets": {},
+    }
+    for target in targets:
+        report["targets"][target] = spawn(target, args.database_url, args)
+        for name, r in report["targets"][target].items():
+            print(
+                f"{target:14} {name:15} {r['throughput_rps']:>9} req/s"
+                f"  p50 {r['p50_ms']:>8} ms  p95 {r['p95_ms']:>8} ms"
+                f"  p99 {r['p99_ms']:>8} ms  cpu {r['cpu_ms_per_request']:>7} ms"
+                f"  errors {r['errors']}"
+            )
+
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"wrote {args.out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""Baseline: slots and items keyed by CHAR(36) UUIDs
+
+The schema as first shipped, when tables were made with ``create_all``.
+A database created that way is at this revision: ``alembic stamp 0001``,
+then ``alembic upgrade head``.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17 09:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "slots",
+        sa.Column("id", sa.CHAR(36), primary_key=True),
+        sa.Column("code", sa.String(32), nullable=False),
+        sa.Column("capacity", sa.Integer, nullable=False),
+        sa.Column("current_item_count", sa.Integer, nullable=False),
+        sa.Column("created_at", sa.DateTime),
+        sa.Column("updated_at", sa.DateTime),
+    )
+    op.create_index("ix_slots_code", "slots", ["code"], unique=True)
+    op.create_table(
+        "items",
+        sa.Column("id", sa.CHAR(36), primary_key=True),
+        sa.Column("name", sa.String(255), nullable=False),
+        sa.Column("price", sa.Integer, nullable=False),
+        sa.Column(
+            "slot_id", sa.CHAR(36), sa.ForeignKey("slots.id", ondelete="SET NULL"), nullable=True
+        ),
+        sa.Column("quantity", sa.Integer, nullable=False),
+        sa.Column("created_at", sa.DateTime),
+        sa.Column("updated_at", sa.DateTime),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("items")
+    op.drop_index("ix_slots_code", table_name="slots")
+    op.drop_table("slots")
@@ -0,0 +1,30 @@
+"""Coin inventory
+
+One row per denomination: the coins in the cash box that change is paid
+from with ``TRACK_COIN_INVENTORY``.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 09:02:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "coin_inventory",
+        sa.Column("denomination", sa.Integer, nullable=False),
+        sa.Column("count", sa.Integer, nullable=False),
+        sa.Column("updated_at", sa.DateTime),
+        sa.PrimaryKeyConstraint("denomination", name="pk_coin_inventory"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("coin_inventory")
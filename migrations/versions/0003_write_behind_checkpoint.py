@@ -0,0 +1,29 @@
+"""Write-behind checkpoint
+
+The single row holds the last inventory-store log entry applied to the
+database.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 09:04:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "write_behind_checkpoint",
+        sa.Column("id", sa.Integer, nullable=False),
+        sa.Column("seq", sa.Integer, nullable=False),
+        sa.PrimaryKeyConstraint("id", name="pk_write_behind_checkpoint"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("write_behind_checkpoint")
@@ -0,0 +1,118 @@
+"""Machines; slots, items and coins belong to one
+
+Slots, items and coin counts gain a ``machine_id``. Existing rows go to the
+``default`` machine, whose slot limit is reset to ``MAX_SLOTS`` when the
+app starts. Slot codes become unique per machine, items are indexed by
+``(machine_id, slot_id, id)`` and coin counts are keyed by machine and
+denomination.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 09:08:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "machines",
+        sa.Column("id", sa.String(64), nullable=False),
+        sa.Column("name", sa.String(255), nullable=True),
+        sa.Column("max_slots", sa.Integer, nullable=False),
+        sa.Column("slot_count", sa.Integer, nullable=False),
+        sa.Column("created_at", sa.DateTime),
+        sa.Column("updated_at", sa.DateTime),
+        sa.PrimaryKeyConstraint("id", name="pk_machines"),
+    )
+    op.execute(
+        "INSERT INTO machines (id, max_slots, slot_count) "
+        "SELECT 'default', COUNT(*), COUNT(*) FROM slots"
+    )
+
+    # The server default puts existing rows on the default machine; the
+    # application always writes the column itself.
+    op.drop_index("ix_slots_code", table_name="slots")
+    for table in ("slots", "items"):
+        with op.batch_alter_table(table) as batch:
+            batch.add_column(sa.Column(
+                "machine_id", sa.String(64), nullable=False, server_default="default"
+            ))
+            batch.create_foreign_key(
+                f"fk_{table}_machine_id_machines", "machines", ["machine_id"], ["id"]
+            )
+    op.create_index("ix_slots_machine_code", "slots", ["machine_id", "code"], unique=True)
+    op.create_index("ix_items_machine_slot", "items", ["machine_id", "slot_id", "id"])
+
+    # A new primary key: the table is built again. The counts wait in a
+    # copy without constraints, whose names the new table takes.
+    _copy_coins("SELECT 'default', denomination, count, updated_at FROM coin_inventory")
+    op.drop_table("coin_inventory")
+    op.create_table(
+        "coin_inventory",
+        sa.Column("machine_id", sa.String(64), nullable=False),
+        sa.Column("denomination", sa.Integer, nullable=False),
+        sa.Column("count", sa.Integer, nullable=False),
+        sa.Column("updated_at", sa.DateTime),
+        sa.PrimaryKeyConstraint("machine_id", "denomination", name="pk_coin_inventory"),
+        sa.ForeignKeyConstraint(
+            ["machine_id"], ["machines.id"], name="fk_coin_inventory_machine_id_machines"
+        ),
+    )
+    op.execute(
+        "INSERT INTO coin_inventory (machine_id, denomination, count, updated_at) "
+        "SELECT machine_id, denomination, count, updated_at FROM coin_inventory_copy"
+    )
+    op.drop_table("coin_inventory_copy")
+
+
+def _copy_coins(select: str) -> None:
+    op.create_table(
+        "coin_inventory_copy",
+        sa.Column("machine_id", sa.String(64)),
+        sa.Column("denomination", sa.Integer),
+        sa.Column("count", sa.Integer),
+        sa.Column("updated_at", sa.DateTime),
+    )
+    op.execute(
+        "INSERT INTO coin_inventory_copy (machine_id, denomination, count, updated_at) "
+        + select
+    )
+
+
+def downgrade() -> None:
+    # Slot codes were unique across the whole table, so only the default
+    # machine's slots, items and coins are kept.
+    _copy_coins(
+        "SELECT machine_id, denomination, count, updated_at FROM coin_inventory "
+        "WHERE machine_id = 'default'"
+    )
+    op.drop_table("coin_inventory")
+    op.create_table(
+        "coin_inventory",
+        sa.Column("denomination", sa.Integer, nullable=False),
+        sa.Column("count", sa.Integer, nullable=False),
+        sa.Column("updated_at", sa.DateTime),
+        sa.PrimaryKeyConstraint("denomination", name="pk_coin_inventory"),
+    )
+    op.execute(
+        "INSERT INTO coin_inventory (denomination, count, updated_at) "
+        "SELECT denomination, count, updated_at FROM coin_inventory_copy"
+    )
+    op.drop_table("coin_inventory_copy")
+
+    op.execute("DELETE FROM items WHERE machine_id <> 'default'")
+    op.execute("DELETE FROM slots WHERE machine_id <> 'default'")
+    op.drop_index("ix_items_machine_slot", table_name="items")
+    op.drop_index("ix_slots_machine_code", table_name="slots")
+    for table in ("items", "slots"):
+        with op.batch_alter_table(table) as batch:
+            batch.drop_constraint(f"fk_{table}_machine_id_machines", type_="foreignkey")
+            batch.drop_column("machine_id")
+    op.create_index("ix_slots_code", "slots", ["code"], unique=True)
+    op.drop_table("machines")
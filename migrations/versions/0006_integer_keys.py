@@ -0,0 +1,160 @@
+"""Integer surrogate keys for slots and items
+
+Slots and items are rebuilt with a 64-bit ``pk`` and keep their UUID as the
+public ``id``; items point at their slot through ``slot_pk``. Existing rows
+are copied over.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17 09:10:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+# INTEGER on SQLite, so the key is the rowid.
+SurrogateKey = sa.BigInteger().with_variant(sa.Integer(), "sqlite")
+
+SLOT_COLUMNS = "id, machine_id, code, capacity, current_item_count, created_at, updated_at"
+ITEM_COLUMNS = "id, machine_id, name, price, slot_id, quantity, created_at, updated_at"
+
+
+def upgrade() -> None:
+    # The rows wait in copies without constraints while the tables are
+    # built again: on PostgreSQL the old tables' constraint names (pk_slots,
+    # pk_items) are index names, which the new tables take.
+    _copy_rows(f"SELECT {SLOT_COLUMNS} FROM slots", f"SELECT {ITEM_COLUMNS} FROM items")
+    op.drop_table("items")
+    op.drop_table("slots")
+    op.create_table(
+        "slots",
+        sa.Column("pk", SurrogateKey, autoincrement=True, nullable=False),
+        sa.Column("id", sa.CHAR(36), nullable=False),
+        sa.Column("machine_id", sa.String(64), nullable=False),
+        sa.Column("code", sa.String(32), nullable=False),
+        sa.Column("capacity", sa.Integer, nullable=False),
+        sa.Column("current_item_count", sa.Integer, nullable=False),
+        sa.Column("created_at", sa.DateTime),
+        sa.Column("updated_at", sa.DateTime),
+        sa.PrimaryKeyConstraint("pk", name="pk_slots"),
+        sa.UniqueConstraint("id", name="uq_slots_id"),
+        sa.ForeignKeyConstraint(
+            ["machine_id"], ["machines.id"], name="fk_slots_machine_id_machines"
+        ),
+    )
+    op.create_index("ix_slots_machine_code", "slots", ["machine_id", "code"], unique=True)
+    op.create_table(
+        "items",
+        sa.Column("pk", SurrogateKey, autoincrement=True, nullable=False),
+        sa.Column("id", sa.CHAR(36), nullable=False),
+        sa.Column("machine_id", sa.String(64), nullable=False),
+        sa.Column("name", sa.String(255), nullable=False),
+        sa.Column("price", sa.Integer, nullable=False),
+        sa.Column("slot_pk", SurrogateKey, nullable=True),
+        sa.Column("quantity", sa.Integer, nullable=False),
+        sa.Column("created_at", sa.DateTime),
+        sa.Column("updated_at", sa.DateTime),
+        sa.PrimaryKeyConstraint("pk", name="pk_items"),
+        sa.UniqueConstraint("id", name="uq_items_id"),
+        sa.ForeignKeyConstraint(
+            ["machine_id"], ["machines.id"], name="fk_items_machine_id_machines"
+        ),
+        sa.ForeignKeyConstraint(
+            ["slot_pk"], ["slots.pk"], name="fk_items_slot_pk_slots", ondelete="SET NULL"
+        ),
+    )
+    op.create_index(
+        "ix_items_machine_slot", "items", ["machine_id", "slot_pk", "id"]
+    )
+
+    op.execute(
+        f"INSERT INTO slots ({SLOT_COLUMNS}) "
+        f"SELECT {SLOT_COLUMNS} FROM slots_copy ORDER BY created_at, id"
+    )
+    op.execute(
+        "INSERT INTO items (id, machine_id, name, price, slot_pk, quantity, "
+        "created_at, updated_at) "
+        "SELECT items_copy.id, items_copy.machine_id, items_copy.name, items_copy.price, "
+        "slots.pk, items_copy.quantity, items_copy.created_at, items_copy.updated_at "
+        "FROM items_copy LEFT JOIN slots ON slots.id = items_copy.slot_id "
+        "ORDER BY items_copy.created_at, items_copy.id"
+    )
+    op.drop_table("items_copy")
+    op.drop_table("slots_copy")
+
+
+def _copy_rows(slots: str, items: str) -> None:
+    op.create_table(
+        "slots_copy",
+        sa.Column("id", sa.CHAR(36)),
+        sa.Column("machine_id", sa.String(64)),
+        sa.Column("code", sa.String(32)),
+        sa.Column("capacity", sa.Integer),
+        sa.Column("current_item_count", sa.Integer),
+        sa.Column("created_at", sa.DateTime),
+        sa.Column("updated_at", sa.DateTime),
+    )
+    op.create_table(
+        "items_copy",
+        sa.Column("id", sa.CHAR(36)),
+        sa.Column("machine_id", sa.String(64)),
+        sa.Column("name", sa.String(255)),
+        sa.Column("price", sa.Integer),
+        sa.Column("slot_id", sa.CHAR(36)),
+        sa.Column("quantity", sa.Integer),
+        sa.Column("created_at", sa.DateTime),
+        sa.Column("updated_at", sa.DateTime),
+    )
+    op.execute(f"INSERT INTO slots_copy ({SLOT_COLUMNS}) {slots}")
+    op.execute(f"INSERT INTO items_copy ({ITEM_COLUMNS}) {items}")
+
+
+def downgrade() -> None:
+    # Back to CHAR(36) keys, through the same copies.
+    _copy_rows(
+        f"SELECT {SLOT_COLUMNS} FROM slots",
+        "SELECT items.id, items.machine_id, items.name, items.price, slots.id, "
+        "items.quantity, items.created_at, items.updated_at "
+        "FROM items LEFT JOIN slots ON slots.pk = items.slot_pk",
+    )
+    op.drop_table("items")
+    op.drop_table("slots")
+    op.create_table(
+        "slots",
+        sa.Column("id", sa.CHAR(36), primary_key=True),
+        sa.Column("code", sa.String(32), nullable=False),
+        sa.Column("capacity", sa.Integer, nullable=False),
+        sa.Column("current_item_count", sa.Integer, nullable=False),
+        sa.Column("created_at", sa.DateTime),
+        sa.Column("updated_at", sa.DateTime),
+        sa.Column("machine_id", sa.String(64), nullable=False, server_default="default"),
+        sa.ForeignKeyConstraint(
+            ["machine_id"], ["machines.id"], name="fk_slots_machine_id_machines"
+        ),
+    )
+    op.create_index("ix_slots_machine_code", "slots", ["machine_id", "code"], unique=True)
+    op.create_table(
+        "items",
+        sa.Column("id", sa.CHAR(36), primary_key=True),
+        sa.Column("name", sa.String(255), nullable=False),
+        sa.Column("price", sa.Integer, nullable=False),
+        sa.Column(
+            "slot_id", sa.CHAR(36), sa.ForeignKey("slots.id", ondelete="SET NULL"), nullable=True
+        ),
+        sa.Column("quantity", sa.Integer, nullable=False),
+        sa.Column("created_at", sa.DateTime),
+        sa.Column("updated_at", sa.DateTime),
+        sa.Column("machine_id", sa.String(64), nullable=False, server_default="default"),
+        sa.ForeignKeyConstraint(
+            ["machine_id"], ["machines.id"], name="fk_items_machine_id_machines"
+        ),
+    )
+    op.create_index("ix_items_machine_slot", "items", ["machine_id", "slot_id", "id"])
+    op.execute(f"INSERT INTO slots ({SLOT_COLUMNS}) SELECT {SLOT_COLUMNS} FROM slots_copy")
+    op.execute(f"INSERT INTO items ({ITEM_COLUMNS}) SELECT {ITEM_COLUMNS} FROM items_copy")
+    op.drop_table("items_copy")
+    op.drop_table("slots_copy")
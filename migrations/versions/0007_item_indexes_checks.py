@@ -0,0 +1,45 @@
+"""Per-slot and in-stock item indexes, non-negative quantity and price
+
+``(slot_pk, id)`` replaces ``(machine_id, slot_pk, id)``. The slot pk
+already identifies the machine, and the new index also covers the
+``slot_pk`` foreign key. The partial index holds only items with stock.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17 09:20:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Existing rows must pass the new checks.
+    op.execute("UPDATE items SET quantity = 0 WHERE quantity < 0")
+    op.execute("UPDATE items SET price = 0 WHERE price < 0")
+    # Dropped first so SQLite's table copy does not rebuild it.
+    op.drop_index("ix_items_machine_slot", table_name="items")
+    with op.batch_alter_table("items") as batch:
+        batch.create_check_constraint(op.f("ck_items_quantity_nonnegative"), "quantity >= 0")
+        batch.create_check_constraint(op.f("ck_items_price_nonnegative"), "price >= 0")
+    op.create_index("ix_items_slot", "items", ["slot_pk", "id"])
+    op.create_index(
+        "ix_items_in_stock",
+        "items",
+        ["slot_pk", "id"],
+        sqlite_where=sa.text("quantity > 0"),
+        postgresql_where=sa.text("quantity > 0"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_items_in_stock", table_name="items")
+    op.drop_index("ix_items_slot", table_name="items")
+    with op.batch_alter_table("items") as batch:
+        batch.drop_constraint(op.f("ck_items_price_nonnegative"), type_="check")
+        batch.drop_constraint(op.f("ck_items_quantity_nonnegative"), type_="check")
+    op.create_index("ix_items_machine_slot", "items", ["machine_id", "slot_pk", "id"])
@@ -0,0 +1,65 @@
+"""Sales ledger with hourly and daily rollups
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-17 10:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+SurrogateKey = sa.BigInteger().with_variant(sa.Integer(), "sqlite")
+
+
+def upgrade() -> None:
+    op.create_table(
+        "sales",
+        sa.Column("pk", SurrogateKey, autoincrement=True, nullable=False),
+        sa.Column("machine_id", sa.String(64), nullable=False),
+        sa.Column("item_id", sa.CHAR(36), nullable=False),
+        sa.Column("slot_id", sa.CHAR(36), nullable=True),
+        sa.Column("price", sa.Integer, nullable=False),
+        sa.Column("sold_at", sa.DateTime, nullable=False),
+        sa.PrimaryKeyConstraint("pk", name="pk_sales"),
+        sa.ForeignKeyConstraint(
+            ["machine_id"], ["machines.id"], name="fk_sales_machine_id_machines"
+        ),
+    )
+    op.create_table(
+        "sales_hourly",
+        sa.Column("machine_id", sa.String(64), nullable=False),
+        sa.Column("hour", sa.Integer, nullable=False),
+        sa.Column("item_id", sa.CHAR(36), nullable=False),
+        sa.Column("slot_id", sa.CHAR(36), nullable=True),
+        sa.Column("units", sa.Integer, nullable=False),
+        sa.Column("revenue", sa.Integer, nullable=False),
+        sa.PrimaryKeyConstraint("machine_id", "hour", "item_id", name="pk_sales_hourly"),
+        sa.ForeignKeyConstraint(
+            ["machine_id"], ["machines.id"], name="fk_sales_hourly_machine_id_machines"
+        ),
+        sqlite_with_rowid=False,
+    )
+    op.create_table(
+        "sales_daily",
+        sa.Column("machine_id", sa.String(64), nullable=False),
+        sa.Column("day", sa.Integer, nullable=False),
+        sa.Column("item_id", sa.CHAR(36), nullable=False),
+        sa.Column("slot_id", sa.CHAR(36), nullable=True),
+        sa.Column("units", sa.Integer, nullable=False),
+        sa.Column("revenue", sa.Integer, nullable=False),
+        sa.PrimaryKeyConstraint("machine_id", "day", "item_id", name="pk_sales_daily"),
+        sa.ForeignKeyConstraint(
+            ["machine_id"], ["machines.id"], name="fk_sales_daily_machine_id_machines"
+        ),
+        sqlite_with_rowid=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("sales_daily")
+    op.drop_table("sales_hourly")
+    op.drop_table("sales")
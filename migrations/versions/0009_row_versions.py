@@ -0,0 +1,29 @@
+"""Version columns on slots and items
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-17 12:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # The server default fills existing rows; the application always
+    # writes the column itself.
+    for table in ("slots", "items"):
+        with op.batch_alter_table(table) as batch:
+            batch.add_column(
+                sa.Column("version", sa.Integer, nullable=False, server_default="1")
+            )
+
+
+def downgrade() -> None:
+    for table in ("items", "slots"):
+        with op.batch_alter_table(table) as batch:
+            batch.drop_column("version")
@@ -0,0 +1,146 @@
+"""Tests drive the app through its routes with every query budget enforced.
+
+The settings are read when ``app`` is first imported, so they are set here,
+before any test module imports it: a SQLite file (threads in the
+concurrency tests each need a connection of their own) and
+``QUERY_BUDGET_MODE=raise``, which makes any request that runs more
+statements than its route declares fail the test that sent it.
+"""
+import os
+import tempfile
+
+TMP_DIR = tempfile.mkdtemp(prefix="vending-tests-")
+os.environ.update(
+    DATABASE_URL=f"sqlite:///{TMP_DIR}/vending.db",
+    ENVIRONMENT="development",
+    QUERY_BUDGET_MODE="raise",
+    INVENTORY_RECONCILE_INTERVAL="0",
+    INVENTORY_STORE_LOG=f"{TMP_DIR}/inventory-store.log",
+    BACKPLANE_PATH=f"{TMP_DIR}/backplane.db",
+)
+
+import anyio  # noqa: E402
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.cache import full_view_cache  # noqa: E402
+from app.db import Base, SessionLocal, WriteSessionLocal  # noqa: E402
+from app.main import app  # noqa: E402
+from app.services import machine_service  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture(autouse=True)
+def empty_database(client):
+    """Every test starts with only the default machine."""
+    db = WriteSessionLocal()
+    try:
+        for table in reversed(Base.metadata.sorted_tables):
+            db.execute(table.delete())
+        db.commit()
+        machine_service.ensure_default_machine(db)
+        machine_service._known_machines.clear()
+    finally:
+        db.close()
+    full_view_cache.invalidate()
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def make_item(client):
+    """Add an item to a new slot; returns ``(slot_id, item_id)``."""
+    codes = iter(range(1000))
+
+    def make(price: int = 25, quantity: int = 5, capacity: int = 50, prefix: str = ""):
+        response = client.post(
+            f"{prefix}/slots", json={"code": f"T{next(codes)}", "capacity": capacity}
+        )
+        assert response.status_code == 201, response.text
+        slot_id = response.json()["id"]
+        response = client.post(
+            f"{prefix}/slots/{slot_id}/items",
+            json={"name": "Cola", "price": price, "quantity": quantity},
+        )
+        assert response.status_code == 201, response.text
+        return slot_id, response.json()["id"]
+
+    return make
+
+
+@pytest.fixture
+def read_stream(client):
+    """First body chunk of an endless stream, such as ``GET /events``.
+
+    ``TestClient`` reads a body to its end, so this drives the ASGI app
+    itself, on the client's event loop, and disconnects once a chunk came.
+    """
+
+    async def read(path: str) -> tuple[int, bytes]:
+        received = anyio.Event()
+        requested = False
+        messages = []
+
+        async def receive():
+            nonlocal requested
+            if not requested:
+                requested = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            await received.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            messages.append(message)
+            if message["type"] == "http.response.body" and message.get("body"):
+                received.set()
+
+        await app(_http_scope("GET", path), receive, send)
+        status = next(m["status"] for m in messages if m["type"] == "http.response.start")
+        body = next(m["body"] for m in messages if m["type"] == "http.response.body")
+        return status, body
+
+    return lambda path: client.portal.call(read, path)
+
+
+@pytest.fixture
+def abandon_stream(client):
+    """Request a stream from a client that is gone before the response starts."""
+
+    async def abandon(path: str) -> None:
+        async def receive():
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            raise OSError("client disconnected")
+
+        with pytest.raises(OSError):
+            await app(_http_scope("GET", path), receive, send)
+
+    return lambda path: client.portal.call(abandon, path)
+
+
+def _http_scope(method: str, path: str) -> dict:
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0", "spec_version": "2.3"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"testserver")],
+        "client": ("testclient", 50000),
+        "server": ("testserver", 80),
+    }
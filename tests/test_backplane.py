@@ -0,0 +1,62 @@
+import pytest
+
+from app.backplane import SqliteBackplane
+from app.cache import FullViewCache
+
+
+@pytest.fixture
+def workers(tmp_path):
+    """Two workers' backplanes and full-view caches on one file."""
+    path = str(tmp_path / "backplane.db")
+    workers = []
+    for origin in ("a", "b"):
+        plane = SqliteBackplane(path, poll_interval=1, retention=60)
+        plane.origin = origin
+        plane._open()
+        workers.append((plane, FullViewCache(max_entries=10, backplane=plane)))
+    return workers
+
+
+def _cache(cache: FullViewCache, *machine_ids: str) -> None:
+    for machine_id in machine_ids:
+        cache.store(machine_id, cache.generation(machine_id), f'["{machine_id}"]'.encode())
+
+
+def test_announcement_drops_the_other_workers_view(workers):
+    (plane_a, cache_a), (plane_b, cache_b) = workers
+    _cache(cache_a, "m1", "m2")
+    _cache(cache_b, "m1", "m2")
+
+    cache_a.invalidate("m1")
+    assert cache_a.get("m1") is None
+    plane_b.poll()
+    assert cache_b.get("m1") is not None  # not written until a polls
+
+    plane_a.poll()
+    _cache(cache_a, "m1")
+    plane_b.poll()
+
+    assert cache_b.get("m1") is None
+    assert cache_b.get("m2") is not None
+    # A worker does not act on its own announcements.
+    plane_a.poll()
+    assert cache_a.get("m1") is not None
+    assert plane_b.gaps == 0
+
+
+def test_pruned_gap_drops_everything(workers):
+    (plane_a, cache_a), (plane_b, cache_b) = workers
+    _cache(cache_b, "m1", "m2")
+    plane_a.retention = 0
+    plane_a.PRUNE_INTERVAL = 0
+
+    cache_a.invalidate("m1")
+    plane_a.poll()
+    cache_a.invalidate("m3")
+    plane_a.poll()  # prunes the first announcement before b read it
+
+    plane_b.poll()
+
+    assert plane_b.gaps == 1
+    assert cache_b.get("m1") is None
+    assert cache_b.get("m2") is None
@@ -0,0 +1,52 @@
+from functools import lru_cache
+
+import pytest
+
+from app.services.change_engine import ChangeMaker
+
+DENOMINATION_SETS = [
+    [5, 10, 20, 50, 100],
+    [1, 3, 4],
+    [1, 10, 25],
+    [6, 9, 20],
+]
+
+
+def _fewest_coins(denominations: list[int], amount: int) -> int | None:
+    """Brute force: the fewest coins summing to ``amount``."""
+
+    @lru_cache(maxsize=None)
+    def fewest(remaining: int) -> int | None:
+        if remaining == 0:
+            return 0
+        options = [fewest(remaining - d) for d in denominations if d <= remaining]
+        options = [n for n in options if n is not None]
+        return min(options) + 1 if options else None
+
+    return fewest(amount)
+
+
+@pytest.mark.parametrize("denominations", DENOMINATION_SETS)
+def test_counts_are_optimal(denominations):
+    maker = ChangeMaker(denominations, max_amount=60)
+    for amount in range(0, 200):
+        counts = maker.counts(amount)
+        fewest = _fewest_coins(denominations, amount)
+        if fewest is None:
+            assert counts is None, amount
+            continue
+        assert sum(d * n for d, n in zip(maker.denominations, counts)) == amount
+        assert sum(counts) == fewest, amount
+
+
+def test_canonical_systems_are_recognised():
+    assert ChangeMaker([5, 10, 20, 50, 100], 0).canonical
+    assert not ChangeMaker([1, 3, 4], 0).canonical
+    assert not ChangeMaker([1, 10, 25], 0).canonical
+
+
+def test_change_breakdown_route(client):
+    response = client.get("/purchase/change-breakdown", params={"change": 85})
+
+    assert response.status_code == 200
+    assert response.json()["denominations"] == {"50": 1, "20": 1, "10": 1, "5": 1}
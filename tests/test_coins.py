@@ -0,0 +1,123 @@
+import itertools
+import random
+
+import pytest
+from sqlalchemy import insert
+
+from app.config import settings
+from app.db import WriteSessionLocal
+from app.models import DEFAULT_MACHINE_ID, CoinInventory
+from app.services import coin_service
+from app.services.change_engine import ChangeMaker
+
+
+def _fewest_bounded(amount: int, available: dict[int, int]) -> int | None:
+    """Brute force: the fewest coins summing to ``amount`` from ``available``."""
+    coins = sorted(available)
+    best = None
+    for counts in itertools.product(*(range(available[d] + 1) for d in coins)):
+        if sum(d * n for d, n in zip(coins, counts)) == amount:
+            if best is None or sum(counts) < best:
+                best = sum(counts)
+    return best
+
+
+def test_bounded_change_is_optimal_and_within_stock():
+    maker = ChangeMaker([1, 3, 4, 10], max_amount=100)
+    rng = random.Random(6)
+    for _ in range(200):
+        available = {d: rng.randint(0, 3) for d in maker.denominations}
+        amount = rng.randint(1, 40)
+        dispensed = maker.bounded_counts(amount, available)
+        fewest = _fewest_bounded(amount, available)
+        if fewest is None:
+            assert dispensed is None, (amount, available)
+            continue
+        assert sum(d * n for d, n in dispensed.items()) == amount
+        assert all(n <= available[d] for d, n in dispensed.items())
+        assert sum(dispensed.values()) == fewest, (amount, available)
+
+
+@pytest.fixture
+def coins(client, monkeypatch):
+    monkeypatch.setattr(settings, "TRACK_COIN_INVENTORY", True)
+
+    def stock(denominations: dict[str, int]) -> None:
+        response = client.put("/coins", json={"denominations": denominations})
+        assert response.status_code == 200, response.text
+
+    return stock
+
+
+def test_change_comes_out_of_the_cash_box(client, coins, make_item):
+    coins({"5": 1, "10": 1, "20": 3})
+    _, item_id = make_item(price=35, quantity=2)
+
+    response = client.post("/purchase", json={
+        "item_id": item_id, "cash_inserted": 100, "coins_inserted": {"100": 1},
+    })
+
+    assert response.status_code == 200, response.text
+    assert response.json()["change_denominations"] == {"20": 3, "5": 1}
+    assert client.get("/coins").json()["denominations"] == {
+        "5": 0, "10": 1, "20": 0, "100": 1,
+    }
+
+
+def test_unpayable_change_cancels_the_sale(client, coins, make_item):
+    coins({"5": 0, "10": 0, "20": 1})
+    _, item_id = make_item(price=35, quantity=2)
+
+    response = client.post("/purchase", json={
+        "item_id": item_id, "cash_inserted": 50, "coins_inserted": {"50": 1},
+    })
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == {"error": "Exact change unavailable", "change": 15}
+    assert client.get(f"/items/{item_id}").json()["quantity"] == 2
+    assert client.get("/coins").json()["denominations"] == {"5": 0, "10": 0, "20": 1}
+
+
+def test_inserted_coins_must_add_up(client, coins, make_item):
+    _, item_id = make_item(price=35)
+
+    response = client.post("/purchase", json={
+        "item_id": item_id, "cash_inserted": 50, "coins_inserted": {"20": 2},
+    })
+
+    assert response.status_code == 400
+
+
+def test_inserted_coins_are_required(client, coins, make_item):
+    _, item_id = make_item(price=35)
+
+    response = client.post("/purchase", json={"item_id": item_id, "cash_inserted": 50})
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == {
+        "error": "Inserted coins are required when change is tracked"
+    }
+    assert client.get(f"/items/{item_id}").json()["quantity"] == 5
+
+
+def test_first_coins_of_a_denomination_from_two_sales(client, coins, monkeypatch):
+    maker = coin_service.get_change_maker()
+    db = WriteSessionLocal()
+
+    class OtherSaleFirst:
+        """Banks another sale's 20 between this sale's read and its write."""
+
+        def bounded_counts(self, amount, available):
+            db.execute(insert(CoinInventory).values(
+                machine_id=DEFAULT_MACHINE_ID, denomination=20, count=1
+            ))
+            return maker.bounded_counts(amount, available)
+
+    monkeypatch.setattr(coin_service, "get_change_maker", OtherSaleFirst)
+    try:
+        with db.begin():
+            assert coin_service.settle_change(db, DEFAULT_MACHINE_ID, 0, {20: 1}) == {}
+    finally:
+        db.close()
+
+    assert client.get("/coins").json()["denominations"] == {"20": 2}
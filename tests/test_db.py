@@ -0,0 +1,63 @@
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from app.config import settings
+from app.db import engine_options, tune_sqlite, uses_sqlite_writer, writer_engine_options
+
+COUNTER = text("SELECT value FROM counter")
+
+
+@pytest.fixture
+def tuned(tmp_path, monkeypatch):
+    """The ``SQLITE_TUNED`` writer and query_only read pool on a file."""
+    monkeypatch.setattr(settings, "SQLITE_TUNED", True)
+    url = f"sqlite:///{tmp_path}/tuned.db"
+    assert uses_sqlite_writer(url)
+    writer = create_engine(url, **writer_engine_options(url))
+    tune_sqlite(writer, url, begin="BEGIN IMMEDIATE")
+    reader = create_engine(url, **engine_options(url))
+    tune_sqlite(reader, url, query_only=True)
+    with writer.begin() as conn:
+        conn.execute(text("CREATE TABLE counter (value INTEGER NOT NULL)"))
+        conn.execute(text("INSERT INTO counter VALUES (0)"))
+    yield writer, sessionmaker(bind=reader)
+    writer.dispose()
+    reader.dispose()
+
+
+def _increment(writer) -> None:
+    with writer.begin() as conn:
+        conn.execute(text("UPDATE counter SET value = value + 1"))
+
+
+def test_read_after_write_sees_it(tuned):
+    writer, ReadSession = tuned
+    with ReadSession() as db:
+        assert db.scalar(COUNTER) == 0
+
+    _increment(writer)
+
+    # The same pooled connection, in a new transaction.
+    with ReadSession() as db:
+        assert db.scalar(COUNTER) == 1
+        assert db.scalar(text("PRAGMA journal_mode")) == "wal"
+
+
+def test_open_read_keeps_its_snapshot(tuned):
+    writer, ReadSession = tuned
+    with ReadSession() as db:
+        assert db.scalar(COUNTER) == 0
+        _increment(writer)
+
+        db.expire_all()
+        assert db.scalar(COUNTER) == 0
+        db.rollback()
+        assert db.scalar(COUNTER) == 1
+
+
+def test_read_pool_refuses_writes(tuned):
+    _, ReadSession = tuned
+    with ReadSession() as db, pytest.raises(OperationalError, match="readonly"):
+        db.execute(text("UPDATE counter SET value = 5"))
@@ -0,0 +1,79 @@
+import json
+
+import pytest
+from pydantic import TypeAdapter
+
+from app import encoding
+from app.config import settings
+from app.models import DEFAULT_MACHINE_ID, Item, Slot
+from app.routers.slots import ITEM_FIELDS, SLOT_FIELDS
+from app.schemas import ItemResponse, SlotResponse
+from app.services import item_service, slot_service
+from app.services.inventory_store import InventoryStore
+
+
+@pytest.fixture
+def slot_id(client, make_item):
+    """A slot of items with prices at the edges of an int."""
+    slot_id, _ = make_item(price=0, quantity=1)
+    for price in (1, 2**53 + 1):
+        response = client.post(
+            f"/slots/{slot_id}/items", json={"name": "Snack ☕", "price": price, "quantity": 2}
+        )
+        assert response.status_code == 201
+    return slot_id
+
+
+@pytest.fixture
+def store(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "INVENTORY_STORE", True)
+    monkeypatch.setattr(settings, "INVENTORY_STORE_LOG", str(tmp_path / "store.log"))
+    store = InventoryStore()
+    store.reload()
+    return store
+
+
+def _assert_matches(model, fields, rows):
+    body = encoding.encode_rows(fields, rows)
+    expected = TypeAdapter(list[model]).dump_json(
+        [model.model_validate(row, from_attributes=True) for row in rows]
+    )
+    assert body == expected
+    ints = [name for name, field in model.model_fields.items() if field.annotation is int]
+    for entry in json.loads(body):
+        assert list(entry) == list(model.model_fields)
+        assert all(type(entry[name]) is int for name in ints)
+
+
+def test_slot_rows(db, slot_id, store):
+    sources = [
+        slot_service.list_slots(db, DEFAULT_MACHINE_ID),
+        db.query(Slot).order_by(Slot.code).all(),
+        store.list_slots(DEFAULT_MACHINE_ID),
+    ]
+    for rows in sources:
+        assert len(rows) == 1
+        _assert_matches(SlotResponse, SLOT_FIELDS, rows)
+
+
+def test_item_rows(db, slot_id, store):
+    sources = [
+        item_service.list_items_by_slot(db, DEFAULT_MACHINE_ID, slot_id),
+        db.query(Item).order_by(Item.id).all(),
+        store.list_items_by_slot(DEFAULT_MACHINE_ID, slot_id),
+    ]
+    for rows in sources:
+        assert [row.price for row in rows] == [0, 1, 2**53 + 1]
+        _assert_matches(ItemResponse, ITEM_FIELDS, rows)
+
+
+def test_routes_serve_the_response_models(client, slot_id):
+    slots = client.get("/slots")
+    items = client.get(f"/slots/{slot_id}/items")
+
+    assert slots.headers["content-type"] == encoding.MEDIA_TYPE
+    TypeAdapter(list[SlotResponse]).validate_json(slots.content, strict=True)
+    prices = [item.price for item in TypeAdapter(list[ItemResponse]).validate_json(
+        items.content, strict=True
+    )]
+    assert prices == [0, 1, 2**53 + 1]
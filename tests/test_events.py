@@ -0,0 +1,40 @@
+import asyncio
+
+from app.config import settings
+from app.events import event_bus
+from app.routers.events import _sse
+
+
+def test_stream_starts_with_a_retry_hint(read_stream):
+    before = event_bus.subscriber_count
+
+    status, body = read_stream("/events")
+
+    assert (status, body) == (200, b"retry: 3000\n\n")
+    assert event_bus.subscriber_count == before
+
+
+def test_client_gone_before_the_body_holds_no_subscription(abandon_stream):
+    before = event_bus.subscriber_count
+
+    for _ in range(3):
+        abandon_stream("/events")
+
+    assert event_bus.subscriber_count == before
+
+
+def test_full_bus_refuses_new_streams(client, monkeypatch):
+    monkeypatch.setattr(settings, "EVENTS_MAX_SUBSCRIBERS", event_bus.subscriber_count)
+
+    response = client.get("/events")
+
+    assert response.status_code == 503
+
+
+def test_stream_that_lost_the_race_for_the_last_place_is_dropped(monkeypatch):
+    monkeypatch.setattr(settings, "EVENTS_MAX_SUBSCRIBERS", event_bus.subscriber_count)
+
+    async def read_all():
+        return [chunk async for chunk in _sse("default")]
+
+    assert asyncio.run(read_all()) == [b"retry: 3000\n\nevent: dropped\ndata: {}\n\n"]
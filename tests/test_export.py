@@ -0,0 +1,101 @@
+import csv
+import io
+import json
+
+import pytest
+
+from app.config import settings
+from app.routers import slots as slots_router
+
+
+@pytest.fixture
+def inventory(client):
+    """Three slots, the middle one empty; returns the expected export rows."""
+    rows = []
+    for code, names in [("A1", ["Cola", "Water"]), ("B1", []), ("C1", ["Chips"])]:
+        slot = client.post("/slots", json={"code": code, "capacity": 10}).json()
+        items = [
+            client.post(
+                f"/slots/{slot['id']}/items",
+                json={"name": name, "price": 25 + i, "quantity": 1 + i},
+            ).json()
+            for i, name in enumerate(names)
+        ]
+        if not items:
+            rows.append({
+                "slot_id": slot["id"], "slot_code": code, "capacity": 10,
+                "current_item_count": 0, "item_id": None, "name": None,
+                "price": None, "quantity": None,
+            })
+        for item in sorted(items, key=lambda item: item["id"]):
+            rows.append({
+                "slot_id": slot["id"], "slot_code": code, "capacity": 10,
+                "current_item_count": sum(i["quantity"] for i in items),
+                "item_id": item["id"], "name": item["name"],
+                "price": item["price"], "quantity": item["quantity"],
+            })
+    return rows
+
+
+def _pages(client, path: str, limit: int, key: str) -> list[list[dict]]:
+    pages, after = [], None
+    while True:
+        params = {"limit": limit} if after is None else {"limit": limit, "after": after}
+        response = client.get(path, params=params)
+        assert response.status_code == 200
+        pages.append(response.json())
+        if len(pages[-1]) < limit:
+            return pages
+        after = pages[-1][-1][key]
+
+
+def test_slot_pages(client, inventory):
+    pages = _pages(client, "/slots", 2, "code")
+
+    assert [[slot["code"] for slot in page] for page in pages] == [["A1", "B1"], ["C1"]]
+    assert [slot for page in pages for slot in page] == client.get("/slots").json()
+
+
+def test_item_pages(client):
+    slot_id = client.post("/slots", json={"code": "A1", "capacity": 10}).json()["id"]
+    for i in range(5):
+        client.post(
+            f"/slots/{slot_id}/items", json={"name": f"Item {i}", "price": 5, "quantity": 1}
+        )
+
+    pages = _pages(client, f"/slots/{slot_id}/items", 2, "id")
+
+    assert [len(page) for page in pages] == [2, 2, 1]
+    ids = [item["id"] for page in pages for item in page]
+    assert ids == sorted(ids)
+    assert ids == [item["id"] for item in client.get(f"/slots/{slot_id}/items").json()]
+    # Past the last id is an empty page, not a missing slot.
+    response = client.get(f"/slots/{slot_id}/items", params={"after": ids[-1]})
+    assert response.status_code == 200
+    assert response.json() == []
+
+
+def test_ndjson_export(client, inventory):
+    response = client.get("/slots/export")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert response.headers["content-disposition"] == 'attachment; filename="inventory.ndjson"'
+    assert [json.loads(line) for line in response.text.splitlines()] == inventory
+
+
+def test_csv_export(client, inventory, monkeypatch):
+    # A chunk per row and a cursor batch per two: the same file either way.
+    monkeypatch.setattr(slots_router, "EXPORT_CHUNK_CHARS", 1)
+    monkeypatch.setattr(settings, "EXPORT_YIELD_PER", 2)
+
+    response = client.get("/slots/export", params={"format": "csv"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    header, *rows = csv.reader(io.StringIO(response.text))
+    assert header == list(slots_router.EXPORT_COLUMNS)
+    assert rows == [
+        ["" if row[column] is None else str(row[column]) for column in header]
+        for row in inventory
+    ]
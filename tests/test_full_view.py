@@ -0,0 +1,66 @@
+import pytest
+
+
+def _items(response) -> dict[str, dict]:
+    return {item["id"]: item for slot in response.json() for item in slot["items"]}
+
+
+def test_matching_etag_is_not_modified(client, make_item):
+    make_item()
+    first = client.get("/slots/full-view")
+    etag = first.headers["etag"]
+
+    for if_none_match in (etag, f"W/{etag}", f'"other", {etag}', "*"):
+        response = client.get("/slots/full-view", headers={"If-None-Match": if_none_match})
+        assert response.status_code == 304
+        assert response.headers["etag"] == etag
+        assert response.content == b""
+
+    response = client.get("/slots/full-view", headers={"If-None-Match": '"other"'})
+    assert response.status_code == 200
+    assert response.content == first.content
+
+
+def _sell(client, slot_id, item_id):
+    response = client.post("/purchase", json={"item_id": item_id, "cash_inserted": 25})
+    assert response.status_code == 200
+    return lambda items: items[item_id]["quantity"] == 2
+
+
+def _restock(client, slot_id, item_id):
+    response = client.post(
+        f"/slots/{slot_id}/items", json={"name": "Water", "price": 15, "quantity": 4}
+    )
+    assert response.status_code == 201
+    added = response.json()["id"]
+    return lambda items: items[added]["quantity"] == 4
+
+
+def _edit_price(client, slot_id, item_id):
+    assert client.patch(f"/items/{item_id}/price", json={"price": 30}).status_code == 200
+    return lambda items: items[item_id]["price"] == 30
+
+
+def _remove(client, slot_id, item_id):
+    response = client.delete(f"/slots/{slot_id}/items/{item_id}", params={"quantity": 1})
+    assert response.status_code == 200
+    return lambda items: items[item_id]["quantity"] == 2
+
+
+def _clear_slot(client, slot_id, item_id):
+    assert client.delete(f"/slots/{slot_id}/items").status_code == 200
+    return lambda items: item_id not in items
+
+
+@pytest.mark.parametrize("write", [_sell, _restock, _edit_price, _remove, _clear_slot])
+def test_writes_replace_the_cached_view(client, make_item, write):
+    slot_id, item_id = make_item(quantity=3)
+    etag = client.get("/slots/full-view").headers["etag"]
+    assert client.get("/slots/full-view", headers={"If-None-Match": etag}).status_code == 304
+
+    shows_write = write(client, slot_id, item_id)
+
+    response = client.get("/slots/full-view", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert shows_write(_items(response))
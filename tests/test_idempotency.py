@@ -0,0 +1,108 @@
+import hashlib
+import json
+
+import pytest
+
+from app.backplane import MemoryBackplane, SqliteBackplane
+from app.idempotency import (
+    BackplaneIdempotencyBackend,
+    DatabaseIdempotencyBackend,
+    IdempotencyMiddleware,
+    MemoryIdempotencyBackend,
+)
+from app.main import app
+
+
+def _buy(client, item_id: str, key: str, cash: int = 40):
+    return client.post(
+        "/purchase",
+        content=json.dumps({"item_id": item_id, "cash_inserted": cash}),
+        headers={"content-type": "application/json", "idempotency-key": key},
+    )
+
+
+def test_retry_replays_the_first_response(client, make_item):
+    _, item_id = make_item(quantity=3)
+
+    first = _buy(client, item_id, "k1")
+    retry = _buy(client, item_id, "k1")
+
+    assert first.status_code == retry.status_code == 200
+    assert retry.json() == first.json()
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert "idempotent-replayed" not in first.headers
+    assert client.get(f"/items/{item_id}").json()["quantity"] == 2
+
+
+def test_key_reused_with_another_body_is_rejected(client, make_item):
+    _, item_id = make_item(quantity=3)
+    assert _buy(client, item_id, "k2").status_code == 200
+
+    response = _buy(client, item_id, "k2", cash=50)
+
+    assert response.status_code == 422
+    assert client.get(f"/items/{item_id}").json()["quantity"] == 2
+
+
+def test_retry_during_the_first_attempt_is_a_conflict(client, make_item):
+    _, item_id = make_item(quantity=3)
+    client.get("/health")  # builds the middleware stack
+    layer = app.middleware_stack
+    while not isinstance(layer, IdempotencyMiddleware):
+        layer = layer.app
+    body = json.dumps({"item_id": item_id, "cash_inserted": 40}).encode()
+    key = "POST /purchase k3"
+    assert layer.backend.begin(key, hashlib.sha256(body).hexdigest()) is None
+    try:
+        response = _buy(client, item_id, "k3")
+    finally:
+        layer.backend.release(key)
+
+    assert response.status_code == 409
+    assert client.get(f"/items/{item_id}").json()["quantity"] == 3
+
+
+@pytest.fixture(params=["memory", "database", "backplane-memory", "backplane-sqlite"])
+def make_backend(request, tmp_path):
+    """Builds the backend under test with the given lock timeout."""
+    def make(lock_timeout: float = 60):
+        if request.param == "memory":
+            return MemoryIdempotencyBackend(max_entries=100, ttl=60, lock_timeout=lock_timeout)
+        if request.param == "database":
+            return DatabaseIdempotencyBackend(ttl=60, lock_timeout=lock_timeout)
+        if request.param == "backplane-memory":
+            plane = MemoryBackplane(max_entries=100)
+        else:
+            plane = SqliteBackplane(str(tmp_path / "backplane.db"), poll_interval=1, retention=60)
+        return BackplaneIdempotencyBackend(plane, ttl=60, lock_timeout=lock_timeout)
+
+    return make
+
+
+def test_backend_lifecycle(make_backend):
+    backend = make_backend()
+    assert backend.begin("k", "f") is None
+
+    running = backend.begin("k", "f")
+    assert running.fingerprint == "f" and running.status is None
+
+    backend.complete("k", 201, [["content-type", "application/json"]], b"{}")
+    done = backend.begin("k", "f")
+    assert (done.status, done.headers, done.body) == (
+        201, [["content-type", "application/json"]], b"{}",
+    )
+
+    backend.release("k")
+    assert backend.begin("k", "g") is None
+
+
+def test_abandoned_claim_lapses_after_the_lock_timeout(make_backend):
+    backend = make_backend(lock_timeout=0)
+    assert backend.begin("k", "f") is None
+
+    # The first attempt never completed nor released the key: a retry runs.
+    assert backend.begin("k", "f") is None
+
+    # A stored response is kept for the whole TTL.
+    backend.complete("k", 201, [], b"{}")
+    assert backend.begin("k", "f").status == 201
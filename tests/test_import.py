@@ -0,0 +1,110 @@
+import json
+
+from app.config import settings
+
+
+def _slot(client, capacity: int = 50) -> str:
+    response = client.post("/slots", json={"code": "I1", "capacity": capacity})
+    assert response.status_code == 201
+    return response.json()["id"]
+
+
+def _import(client, slot_id: str, body: str, content_type="application/x-ndjson"):
+    return client.post(
+        f"/slots/{slot_id}/items/import", content=body, headers={"content-type": content_type}
+    )
+
+
+def _ndjson(*rows) -> str:
+    return "".join((row if isinstance(row, str) else json.dumps(row)) + "\n" for row in rows)
+
+
+def _names(client, slot_id: str) -> list[str]:
+    return sorted(item["name"] for item in client.get(f"/slots/{slot_id}/items").json())
+
+
+def test_errors_name_their_lines(client):
+    slot_id = _slot(client)
+    body = _ndjson(
+        {"name": "Cola", "price": 25, "quantity": 2},
+        "{not json",
+        "",
+        {"name": "Chips", "price": -1, "quantity": 1},
+        {"name": "Water", "price": 15, "quantity": 1},
+    )
+
+    response = _import(client, slot_id, body)
+
+    assert response.status_code == 200
+    result = response.json()
+    assert result["imported_count"] == 2
+    assert result["error_count"] == 2
+    assert [error["line"] for error in result["errors"]] == [2, 4]
+    assert result["errors"][1]["error"].startswith("price:")
+    assert result["errors_truncated"] is False
+    assert _names(client, slot_id) == ["Cola", "Water"]
+
+
+def test_csv_rows(client):
+    slot_id = _slot(client)
+    body = "Quantity,name,price\r\n2,Cola,25\r\n1,Chips\r\n3,Water,15\r\n"
+
+    response = _import(client, slot_id, body, "text/csv")
+
+    result = response.json()
+    assert result["imported_count"] == 2
+    assert result["errors"] == [{"line": 3, "error": "expected 3 fields, got 2"}]
+    assert _names(client, slot_id) == ["Cola", "Water"]
+
+
+def test_bad_csv_header_is_rejected(client):
+    slot_id = _slot(client)
+
+    response = _import(client, slot_id, "name,cost\nCola,25\n", "text/csv")
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid CSV header: missing columns: price, quantity"
+    assert _names(client, slot_id) == []
+
+
+def test_errors_past_the_limit_are_counted(client, monkeypatch):
+    monkeypatch.setattr(settings, "IMPORT_MAX_ERRORS", 3)
+    slot_id = _slot(client)
+    body = _ndjson(*[{"name": "Bad", "price": 5, "quantity": 0}] * 5)
+
+    result = _import(client, slot_id, body).json()
+
+    assert result["error_count"] == 5
+    assert [error["line"] for error in result["errors"]] == [1, 2, 3]
+    assert result["errors_truncated"] is True
+
+
+def test_rows_over_capacity_are_left_out(client, monkeypatch):
+    monkeypatch.setattr(settings, "IMPORT_BATCH_SIZE", 3)
+    slot_id = _slot(client, capacity=6)
+    # The first batch fits 3 + 2, not the 4 between them; the second has
+    # room for 1 more unit.
+    body = _ndjson(
+        {"name": "A", "price": 5, "quantity": 3},
+        {"name": "B", "price": 5, "quantity": 4},
+        {"name": "C", "price": 5, "quantity": 2},
+        {"name": "D", "price": 5, "quantity": 2},
+        {"name": "E", "price": 5, "quantity": 1},
+    )
+
+    result = _import(client, slot_id, body).json()
+
+    assert result["imported_count"] == 3
+    assert result["errors"] == [
+        {"line": 2, "error": "capacity_exceeded"},
+        {"line": 4, "error": "capacity_exceeded"},
+    ]
+    assert _names(client, slot_id) == ["A", "C", "E"]
+    slot = next(s for s in client.get("/slots").json() if s["id"] == slot_id)
+    assert slot["current_item_count"] == 6
+
+
+def test_unknown_slot(client):
+    response = _import(client, "missing", _ndjson({"name": "A", "price": 5, "quantity": 1}))
+
+    assert response.status_code == 404
@@ -0,0 +1,128 @@
+import json
+import logging
+from datetime import datetime
+
+import pytest
+from sqlalchemy import delete, func, select
+
+from app.config import settings
+from app.db import SessionLocal, WriteSessionLocal
+from app.models import DEFAULT_MACHINE_ID, Item, Sale, WriteBehindCheckpoint
+from app.services.inventory_store import InventoryStore
+
+
+@pytest.fixture
+def log_path(tmp_path, monkeypatch):
+    path = tmp_path / "inventory-store.log"
+    monkeypatch.setattr(settings, "INVENTORY_STORE", True)
+    monkeypatch.setattr(settings, "INVENTORY_STORE_LOG", str(path))
+    return path
+
+
+@pytest.fixture
+def store(log_path):
+    """A store started as the app starts it, without the flush task."""
+    store = InventoryStore()
+    store.replay()
+    store._log = open(log_path, "w")
+    store.reload()
+    yield store
+    store._log.close()
+
+
+def _logged(log_path) -> list[int]:
+    return [json.loads(line)["seq"] for line in log_path.read_text().splitlines()]
+
+
+def _scalar(stmt):
+    # A session of its own: with SQLITE_TUNED a session kept open across the
+    # flush would still read from the snapshot its transaction began with.
+    with SessionLocal() as db:
+        return db.scalar(stmt)
+
+
+def _quantity(item_id: str) -> int | None:
+    return _scalar(select(Item.quantity).where(Item.id == item_id))
+
+
+def test_flush_empties_the_log(store, log_path, make_item):
+    _, item_id = make_item(quantity=5)
+    store.reload()
+    for _ in range(3):
+        store._sell(DEFAULT_MACHINE_ID, item_id, 25)
+    assert _logged(log_path) == [1, 2, 3]
+
+    assert store.flush() == 3
+
+    assert _logged(log_path) == []
+    assert _quantity(item_id) == 2
+
+
+def test_flush_keeps_the_sales_made_while_it_ran(store, log_path, make_item, monkeypatch):
+    _, item_id = make_item(quantity=5)
+    store.reload()
+    store._sell(DEFAULT_MACHINE_ID, item_id, 25)
+    store._sell(DEFAULT_MACHINE_ID, item_id, 25)
+    apply = store._apply
+
+    def apply_while_selling(*args):
+        apply(*args)
+        store._sell(DEFAULT_MACHINE_ID, item_id, 25)
+
+    monkeypatch.setattr(store, "_apply", apply_while_selling)
+    assert store.flush() == 2
+
+    assert _logged(log_path) == [3]
+    assert _quantity(item_id) == 3
+
+    monkeypatch.setattr(store, "_apply", apply)
+    store._sell(DEFAULT_MACHINE_ID, item_id, 25)
+    assert _logged(log_path) == [3, 4]
+    assert store.flush() == 2
+    assert _logged(log_path) == []
+    assert _quantity(item_id) == 1
+
+
+def test_flush_skips_sales_of_items_removed_underneath(store, log_path, make_item, caplog):
+    _, removed_id = make_item(quantity=5)
+    _, kept_id = make_item(quantity=5)
+    store.reload()
+    store._sell(DEFAULT_MACHINE_ID, removed_id, 25)
+    store._sell(DEFAULT_MACHINE_ID, kept_id, 25)
+    writer = WriteSessionLocal()
+    with writer.begin():
+        writer.execute(delete(Item).where(Item.id == removed_id))
+    writer.close()
+
+    with caplog.at_level(logging.WARNING):
+        assert store.flush() == 1
+
+    assert "Skipped 1 sales" in caplog.text
+    assert _logged(log_path) == []
+    assert _quantity(kept_id) == 4
+    assert _scalar(select(func.count()).select_from(Sale)) == 1
+    # The batch is not queued again to fail every flush after it.
+    store._sell(DEFAULT_MACHINE_ID, kept_id, 25)
+    assert store.flush() == 1
+    assert _quantity(kept_id) == 3
+
+
+def test_replay_skips_sales_of_removed_and_emptied_items(log_path, make_item):
+    _, kept_id = make_item(quantity=5)
+    _, emptied_id = make_item(quantity=1)
+    at = datetime.utcnow().isoformat()
+    sales = [kept_id, "removed-item", emptied_id, kept_id, emptied_id, emptied_id]
+    log_path.write_text("".join(
+        json.dumps({"seq": seq, "item_id": item_id, "price": 25, "at": at}) + "\n"
+        for seq, item_id in enumerate(sales, start=1)
+    ))
+
+    store = InventoryStore()
+    assert store.replay() == 3
+
+    assert _quantity(kept_id) == 3
+    assert _quantity(emptied_id) == 0
+    assert _scalar(select(func.count()).select_from(Sale)) == 3
+    assert _scalar(select(WriteBehindCheckpoint.seq)) == 6
+    # Replayed once: a second start finds nothing after the checkpoint.
+    assert InventoryStore().replay() == 0
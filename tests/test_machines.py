@@ -0,0 +1,66 @@
+import pytest
+
+OTHER = "/machines/m2"
+
+
+@pytest.fixture
+def twin_slots(client):
+    """Slot ``A1`` on the default machine and on m2; returns their item ids."""
+    assert client.post("/machines", json={"id": "m2"}).status_code == 201
+    item_ids = []
+    for prefix, name in [("", "Cola"), (OTHER, "Water")]:
+        response = client.post(f"{prefix}/slots", json={"code": "A1", "capacity": 10})
+        assert response.status_code == 201
+        slot_id = response.json()["id"]
+        response = client.post(
+            f"{prefix}/slots/{slot_id}/items", json={"name": name, "price": 25, "quantity": 3}
+        )
+        assert response.status_code == 201
+        item_ids.append(response.json()["id"])
+    return item_ids
+
+
+def test_same_code_on_two_machines(client, twin_slots):
+    default_item, other_item = twin_slots
+
+    for prefix, item_id, name in [("", default_item, "Cola"), (OTHER, other_item, "Water")]:
+        slots = client.get(f"{prefix}/slots").json()
+        assert [slot["code"] for slot in slots] == ["A1"]
+        items = client.get(f"{prefix}/slots/{slots[0]['id']}/items").json()
+        assert [(item["id"], item["name"]) for item in items] == [(item_id, name)]
+        view = client.get(f"{prefix}/slots/full-view").json()
+        assert [item["id"] for slot in view for item in slot["items"]] == [item_id]
+
+    # Codes are unique within a machine only.
+    response = client.post(f"{OTHER}/slots", json={"code": "A1", "capacity": 10})
+    assert response.status_code == 409
+
+
+def test_purchase_stays_on_its_machine(client, twin_slots):
+    default_item, other_item = twin_slots
+    etag = client.get("/slots/full-view").headers["etag"]
+
+    buy = {"item_id": other_item, "cash_inserted": 25}
+    assert client.post(f"{OTHER}/purchase", json=buy).status_code == 200
+    assert client.post("/purchase", json=buy).status_code == 404
+    buy = {"item_id": default_item, "cash_inserted": 25}
+    assert client.post(f"{OTHER}/purchase", json=buy).status_code == 404
+
+    assert client.get("/slots/full-view", headers={"If-None-Match": etag}).status_code == 304
+    view = client.get(f"{OTHER}/slots/full-view").json()
+    assert [item["quantity"] for slot in view for item in slot["items"]] == [2]
+    assert client.get("/slots").json()[0]["current_item_count"] == 3
+
+
+@pytest.mark.parametrize("method, path", [
+    ("get", "/slots"),
+    ("get", "/slots/full-view"),
+    ("get", "/slots/export"),
+    ("post", "/purchase"),
+])
+def test_unknown_machine_is_not_found(client, method, path):
+    body = {"json": {"item_id": "x", "cash_inserted": 25}} if method == "post" else {}
+
+    response = client.request(method, f"/machines/nope{path}", **body)
+
+    assert response.status_code == 404
@@ -0,0 +1,120 @@
+import io
+import re
+
+from alembic import command
+from alembic.autogenerate import compare_metadata
+from alembic.runtime.migration import MigrationContext
+from sqlalchemy import create_engine, text
+
+from app.config import settings
+from app.db import Base
+from app.migrate import alembic_config
+
+
+def _migrate(engine, revision: str, downgrade: bool = False) -> None:
+    with engine.begin() as connection:
+        run = command.downgrade if downgrade else command.upgrade
+        run(alembic_config(connection), revision)
+
+
+def _diff(engine) -> list:
+    with engine.connect() as connection:
+        return compare_metadata(MigrationContext.configure(connection), Base.metadata)
+
+
+def _render_postgresql(monkeypatch, revisions: str, downgrade: bool = False) -> list[str]:
+    """The chain's statements as ``alembic upgrade --sql`` prints them for PostgreSQL."""
+    monkeypatch.setattr(settings, "DATABASE_URL", "postgresql://")
+    config = alembic_config()
+    config.output_buffer = io.StringIO()
+    run = command.downgrade if downgrade else command.upgrade
+    run(config, revisions, sql=True)
+    return [s.strip() for s in config.output_buffer.getvalue().split(";") if s.strip()]
+
+
+def _relation_clashes(statements: list[str]) -> list[str]:
+    """Names reused while taken: tables, indexes and the indexes behind
+    primary key and unique constraints share one namespace on PostgreSQL."""
+    owners: dict[str, str] = {}
+    clashes = []
+
+    def take(name: str, table: str) -> None:
+        if name in owners:
+            clashes.append(name)
+        owners[name] = table
+
+    for statement in statements:
+        if m := re.match(r"CREATE TABLE (\w+)", statement):
+            take(m[1], m[1])
+            for name in re.findall(r"CONSTRAINT (\w+) (?:PRIMARY KEY|UNIQUE)", statement):
+                take(name, m[1])
+        elif m := re.match(r"CREATE (?:UNIQUE )?INDEX (\w+) ON (\w+)", statement):
+            take(m[1], m[2])
+        elif m := re.match(r"ALTER TABLE (\w+) ADD CONSTRAINT (\w+) (?:PRIMARY|UNIQUE)", statement):
+            take(m[2], m[1])
+        elif m := re.match(r"ALTER TABLE (\w+) RENAME TO (\w+)", statement):
+            del owners[m[1]]
+            owners = {name: m[2] if table == m[1] else table for name, table in owners.items()}
+            take(m[2], m[2])
+        elif m := re.match(r"(?:DROP INDEX|ALTER TABLE \w+ DROP CONSTRAINT) (\w+)", statement):
+            owners.pop(m[1], None)
+        elif m := re.match(r"DROP TABLE (\w+)", statement):
+            owners = {name: table for name, table in owners.items() if table != m[1]}
+    return clashes
+
+
+def test_postgresql_relation_names_are_free_when_taken(monkeypatch):
+    upgrade = _render_postgresql(monkeypatch, "head")
+    assert any(s.startswith("CREATE TABLE slots") and "pk_slots" in s for s in upgrade)
+    assert _relation_clashes(upgrade) == []
+
+    # Offline, a downgrade starts from an empty namespace: seed it with head.
+    downgrade = _render_postgresql(monkeypatch, "head:base", downgrade=True)
+    assert _relation_clashes(upgrade + downgrade) == []
+
+
+def test_migrations_build_the_models(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/schema.db")
+    _migrate(engine, "head")
+    assert _diff(engine) == []
+
+    _migrate(engine, "base", downgrade=True)
+    _migrate(engine, "head")
+    assert _diff(engine) == []
+
+
+def test_original_rows_move_to_the_default_machine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/data.db")
+    _migrate(engine, "0001")
+    with engine.begin() as connection:
+        connection.execute(text(
+            "INSERT INTO slots (id, code, capacity, current_item_count) VALUES "
+            "('00000000-0000-0000-0000-00000000000a', 'A1', 10, 3), "
+            "('00000000-0000-0000-0000-00000000000b', 'B1', 5, 0)"
+        ))
+        connection.execute(text(
+            "INSERT INTO items (id, name, price, slot_id, quantity) VALUES "
+            "('00000000-0000-0000-0000-000000000001', 'Cola', 150, "
+            "'00000000-0000-0000-0000-00000000000a', 3)"
+        ))
+
+    _migrate(engine, "head")
+
+    with engine.connect() as connection:
+        assert connection.execute(
+            text("SELECT id, max_slots, slot_count FROM machines")
+        ).all() == [("default", 2, 2)]
+        slots = connection.execute(
+            text("SELECT pk, id, machine_id, code FROM slots ORDER BY code")
+        ).all()
+        assert [(s.machine_id, s.code) for s in slots] == [("default", "A1"), ("default", "B1")]
+        item = connection.execute(
+            text("SELECT machine_id, slot_pk, quantity FROM items")
+        ).one()
+        assert item == ("default", slots[0].pk, 3)
+
+    _migrate(engine, "0001", downgrade=True)
+    with engine.connect() as connection:
+        assert connection.execute(
+            text("SELECT slots.code FROM items JOIN slots ON slots.id = items.slot_id")
+        ).scalar_one() == "A1"
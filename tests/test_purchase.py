@@ -0,0 +1,115 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import func, select
+
+from app.db import WriteSessionLocal
+from app.models import DEFAULT_MACHINE_ID, Item, Sale, Slot
+from app.services import purchase_service
+
+
+def _stock(db, item_id: str) -> tuple[int, int]:
+    """The item's quantity and its slot's counter."""
+    db.expire_all()
+    return db.execute(
+        select(Item.quantity, Slot.current_item_count)
+        .join(Slot, Slot.pk == Item.slot_pk)
+        .where(Item.id == item_id)
+    ).one()
+
+
+def test_purchase_sells_one_unit_and_returns_change(client, db, make_item):
+    _, item_id = make_item(price=25, quantity=3)
+
+    response = client.post("/purchase", json={"item_id": item_id, "cash_inserted": 40})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["change_returned"] == 15
+    assert body["remaining_quantity"] == 2
+    assert "change_denominations" not in body
+    assert _stock(db, item_id) == (2, 2)
+    assert db.scalar(select(func.count()).select_from(Sale)) == 1
+
+
+def test_unknown_item_is_not_found(client):
+    response = client.post("/purchase", json={"item_id": "nope", "cash_inserted": 40})
+    assert response.status_code == 404
+
+
+def test_item_of_another_machine_is_not_found(client, make_item):
+    assert client.post("/machines", json={"id": "m2"}).status_code == 201
+    _, item_id = make_item(prefix="/machines/m2")
+
+    response = client.post("/purchase", json={"item_id": item_id, "cash_inserted": 40})
+
+    assert response.status_code == 404
+
+
+def test_out_of_stock_is_rejected(client, db, make_item):
+    _, item_id = make_item(price=10, quantity=1)
+    buy = {"item_id": item_id, "cash_inserted": 10}
+    assert client.post("/purchase", json=buy).status_code == 200
+
+    response = client.post("/purchase", json=buy)
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == {"error": "Item out of stock"}
+    assert _stock(db, item_id) == (0, 0)
+
+
+def test_insufficient_cash_leaves_stock_alone(client, db, make_item):
+    _, item_id = make_item(price=25, quantity=3)
+
+    response = client.post("/purchase", json={"item_id": item_id, "cash_inserted": 20})
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == {
+        "error": "Insufficient cash", "required": 25, "inserted": 20,
+    }
+    assert _stock(db, item_id) == (3, 3)
+    assert db.scalar(select(func.count()).select_from(Sale)) == 0
+
+
+def test_concurrent_buyers_never_oversell(db, make_item):
+    _, item_id = make_item(price=10, quantity=50, capacity=50)
+
+    def buy(_):
+        session = WriteSessionLocal()
+        try:
+            purchase_service.purchase(session, DEFAULT_MACHINE_ID, item_id, 10)
+            return "sold"
+        except ValueError as e:
+            return e.args[0]
+        finally:
+            session.close()
+
+    with ThreadPoolExecutor(16) as pool:
+        outcomes = list(pool.map(buy, range(80)))
+
+    assert outcomes.count("sold") == 50
+    assert outcomes.count("out_of_stock") == 30
+    assert _stock(db, item_id) == (0, 0)
+    assert db.scalar(select(func.count()).select_from(Sale)) == 50
+
+
+def test_batch_results_match_single_purchases(client, make_item):
+    _, item_id = make_item(price=25, quantity=1)
+    _, other_id = make_item(price=10, quantity=3)
+    single = client.post("/purchase", json={"item_id": other_id, "cash_inserted": 40}).json()
+
+    response = client.post("/purchase/batch", json={"purchases": [
+        {"item_id": item_id, "cash_inserted": 30},
+        {"item_id": item_id, "cash_inserted": 30},
+        {"item_id": other_id, "cash_inserted": 40},
+    ]})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["succeeded"], body["failed"]) == (2, 1)
+    sold, sold_out, again = body["results"]
+    assert sold.keys() == again.keys() == {"index", "status_code", "result"}
+    assert sold["result"].keys() == again["result"].keys() == single.keys()
+    assert (sold["result"]["change_returned"], sold["result"]["remaining_quantity"]) == (5, 0)
+    assert sold_out == {
+        "index": 1, "status_code": 400, "error": {"error": "Item out of stock"},
+    }
@@ -0,0 +1,151 @@
+import importlib
+import pkgutil
+import re
+
+import pytest
+from fastapi.routing import APIRoute, APIWebSocketRoute
+
+from app import main, profiling, routers
+from app.config import settings
+from app.profiling import QueryBudgetExceeded, TimedRoute
+from app.routers.machines import MACHINE_PREFIX
+
+OTHER_MACHINE = "/machines/m2"
+
+
+def _declared_routes():
+    for module_info in pkgutil.iter_modules(routers.__path__):
+        module = importlib.import_module(f"{routers.__name__}.{module_info.name}")
+        yield from module.router.routes
+    yield from (r for r in main.app.router.routes if isinstance(r, APIRoute))
+
+
+def _exercised_routes(client) -> set[tuple[str, str]]:
+    metrics = client.get("/metrics").text
+    return set(re.findall(
+        r'http_request_db_queries_count\{method="(\w+)",route="([^"]+)"\}', metrics
+    ))
+
+
+def _unprefixed(path: str) -> str:
+    # Metrics name a route by its own path, the same under either mounting.
+    if path.startswith(f"{MACHINE_PREFIX}/"):
+        return path.removeprefix(MACHINE_PREFIX)
+    return path
+
+
+def test_every_route_declares_a_budget():
+    missing = []
+    for route in _declared_routes():
+        if isinstance(route, APIRoute):
+            if not isinstance(route, TimedRoute) or route.query_budget is None:
+                missing.append(f"{sorted(route.methods)} {route.path}")
+        elif isinstance(route, APIWebSocketRoute):
+            if getattr(route.endpoint, "query_budget", None) is None:
+                missing.append(f"WS {route.path}")
+    assert not missing, f"routes without @query_budget: {missing}"
+
+
+def _drive_machine_routes(client, read_stream, prefix: str) -> None:
+    def ok(response, status=200):
+        assert response.status_code == status, response.text
+        return response
+
+    slot = ok(client.post(f"{prefix}/slots", json={"code": "A1", "capacity": 100}), 201).json()
+    spare = ok(client.post(f"{prefix}/slots", json={"code": "A2", "capacity": 5}), 201).json()
+    ok(client.get(f"{prefix}/slots", params={"limit": 10}))
+    item = ok(client.post(
+        f"{prefix}/slots/{slot['id']}/items", json={"name": "Cola", "price": 25, "quantity": 10}
+    ), 201).json()
+    ok(client.post(
+        f"{prefix}/slots/{slot['id']}/items/bulk",
+        json={"items": [{"name": f"Bulk {i}", "price": 10, "quantity": 1} for i in range(7)]},
+    ))
+    ok(client.post(
+        f"{prefix}/slots/{slot['id']}/items/import",
+        content="".join(
+            f'{{"name": "Import {i}", "price": 5, "quantity": 1}}\n' for i in range(7)
+        ),
+        headers={"content-type": "application/x-ndjson"},
+    ))
+    ok(client.get(f"{prefix}/slots/{slot['id']}/items", params={"limit": 50}))
+    etag = ok(client.get(f"{prefix}/slots/full-view")).headers["etag"]
+    ok(client.get(f"{prefix}/slots/full-view", headers={"If-None-Match": etag}), 304)
+    ok(client.get(f"{prefix}/slots/export", params={"format": "csv"}))
+    ok(client.get(f"{prefix}/slots/export"))
+
+    version = ok(client.get(f"{prefix}/items/{item['id']}")).headers["etag"]
+    ok(client.patch(
+        f"{prefix}/items/{item['id']}/price", json={"price": 30}, headers={"If-Match": version}
+    ))
+    ok(client.post(f"{prefix}/purchase", json={"item_id": item["id"], "cash_inserted": 50}))
+    ok(client.post(f"{prefix}/purchase/batch", json={"purchases": [
+        {"item_id": item["id"], "cash_inserted": 30},
+        {"item_id": item["id"], "cash_inserted": 10},
+    ]}))
+    ok(client.get(f"{prefix}/purchase/change-breakdown", params={"change": 35}))
+    ok(client.put(f"{prefix}/coins", json={"denominations": {"5": 10, "10": 10}}))
+    ok(client.get(f"{prefix}/coins"))
+    ok(client.get(f"{prefix}/analytics/sales", params={"group_by": "item,day"}))
+    assert read_stream(f"{prefix}/events")[0] == 200
+
+    ok(client.delete(f"{prefix}/slots/{slot['id']}/items/{item['id']}", params={"quantity": 1}))
+    ok(client.request("DELETE", f"{prefix}/slots/{slot['id']}/items", json={"item_ids": None}))
+    ok(client.delete(f"{prefix}/slots/{spare['id']}"))
+
+
+def test_every_route_stays_within_its_budget(client, read_stream, monkeypatch):
+    # Small batches, so the per-batch budgets of bulk adds and imports count.
+    monkeypatch.setattr(settings, "BULK_INSERT_CHUNK_SIZE", 2)
+    monkeypatch.setattr(settings, "IMPORT_BATCH_SIZE", 3)
+    monkeypatch.setattr(settings, "INVENTORY_RECONCILE_BATCH", 1)
+
+    assert client.post("/machines", json={"id": "m2", "max_slots": 5}).status_code == 201
+    assert client.get("/machines").status_code == 200
+    assert client.get(OTHER_MACHINE).status_code == 200
+    assert client.patch(OTHER_MACHINE, json={"max_slots": 6}).status_code == 200
+    for prefix in ("", OTHER_MACHINE):
+        _drive_machine_routes(client, read_stream, prefix)
+    assert client.get("/restock/plan", params={"machine_id": "m2"}).status_code == 200
+    assert client.get("/admin/inventory/consistency").status_code == 200
+    assert client.get("/admin/inventory/consistency", params={"full": True}).status_code == 200
+    assert client.post("/admin/inventory/consistency/repair").status_code == 200
+    assert client.get("/health").status_code == 200
+
+    exercised = _exercised_routes(client)
+    operations = {
+        (method.upper(), _unprefixed(path))
+        for path, methods in main.app.openapi()["paths"].items()
+        for method in methods
+    }
+    assert not operations - exercised, f"not driven by this test: {sorted(operations - exercised)}"
+
+
+def test_going_over_a_budget_fails_the_request(client, make_item, monkeypatch):
+    monkeypatch.setattr(profiling, "extend_budget", lambda queries: None)
+    monkeypatch.setattr(settings, "BULK_INSERT_CHUNK_SIZE", 1)
+    slot_id, _ = make_item()
+    with pytest.raises(QueryBudgetExceeded, match="/slots/{slot_id}/items/bulk"):
+        client.post(
+            f"/slots/{slot_id}/items/bulk",
+            json={"items": [{"name": "x", "price": 1, "quantity": 1}] * 3},
+        )
+
+
+def _export_queries(client) -> float:
+    match = re.search(
+        r'http_request_db_queries_sum\{method="GET",route="/slots/export"\} (\S+)',
+        client.get("/metrics").text,
+    )
+    return float(match.group(1)) if match else 0.0
+
+
+def test_streamed_queries_are_counted_after_the_header(client, make_item):
+    make_item()
+    before = _export_queries(client)
+
+    response = client.get("/slots/export")
+
+    # The rows are read while the body streams, after Server-Timing was sent.
+    assert 'desc="0 queries"' in response.headers["server-timing"]
+    assert _export_queries(client) == before + 1
@@ -0,0 +1,77 @@
+import anyio
+import pytest
+from sqlalchemy import update
+
+from app.config import settings
+from app.db import WriteSessionLocal
+from app.models import Slot
+from app.services.reconciler import reconciler
+
+
+@pytest.fixture(autouse=True)
+def fresh_reconciler(monkeypatch):
+    """A reconciler that has not looked at any slot yet."""
+    monkeypatch.setattr(settings, "INVENTORY_RECONCILE_BATCH", 1)
+    reconciler.__init__()
+    yield
+    reconciler.__init__()
+
+
+def _drift(slot_id: str) -> None:
+    db = WriteSessionLocal()
+    try:
+        with db.begin():
+            db.execute(update(Slot).where(Slot.id == slot_id).values(current_item_count=99))
+    finally:
+        db.close()
+
+
+def test_unknown_until_a_full_pass(client, make_item):
+    make_item()
+    make_item()
+
+    assert client.get("/admin/inventory/consistency").json()["consistent"] is None
+    anyio.run(reconciler.tick)
+    assert client.get("/admin/inventory/consistency").json()["consistent"] is None
+
+    report = client.get("/admin/inventory/consistency", params={"full": True}).json()
+    assert report["consistent"] is True
+    assert report["full_passes"] == 1
+
+
+def test_drift_is_reported_before_the_pass_ends(client, make_item):
+    slot_id, _ = make_item()
+    make_item()
+    _drift(slot_id)
+
+    anyio.run(reconciler.tick)
+
+    report = client.get("/admin/inventory/consistency").json()
+    assert report["consistent"] is False
+    assert [drift["slot_id"] for drift in report["drifted"]] == [slot_id]
+    assert report["full_passes"] == 0
+
+
+def test_full_check_only_reports(client, make_item, monkeypatch):
+    monkeypatch.setattr(settings, "INVENTORY_RECONCILE_REPAIR", True)
+    slot_id, _ = make_item(quantity=5)
+    _drift(slot_id)
+
+    report = client.get("/admin/inventory/consistency", params={"full": True}).json()
+
+    assert report["consistent"] is False
+    assert report["repaired"] == 0
+    slot = next(s for s in client.get("/slots").json() if s["id"] == slot_id)
+    assert slot["current_item_count"] == 99
+
+
+def test_repaired_drift_is_consistent(client, make_item):
+    slot_id, _ = make_item(quantity=5)
+    _drift(slot_id)
+
+    report = client.post("/admin/inventory/consistency/repair").json()
+
+    assert report["consistent"] is True
+    assert report["repaired"] == 1
+    slot = next(s for s in client.get("/slots").json() if s["id"] == slot_id)
+    assert slot["current_item_count"] == 5
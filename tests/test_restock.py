@@ -0,0 +1,91 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.db import WriteSessionLocal
+from app.models import DEFAULT_MACHINE_ID
+from app.services import restock_service, sales_ledger
+
+# Midnight: the window's last day has no hours yet, so each rate is the
+# units sold the day before over 24 hours, whatever that day's weight.
+NOW = datetime(2026, 3, 2)
+HORIZON = 24
+
+
+@pytest.fixture
+def fleet(client, make_item):
+    """Items with known rates; returns their ids by name."""
+    _, low = make_item(quantity=3)  # 24 sold: 1 an hour, out in 3 hours
+    _, fast = make_item(quantity=12, capacity=40)  # 48 sold: 2 an hour, out in 6
+    _, slow = make_item(quantity=100, capacity=200)  # 12 sold: out in 200 hours
+    _, empty = make_item(quantity=1)
+    response = client.post("/purchase", json={"item_id": empty, "cash_inserted": 25})
+    assert response.status_code == 200
+    assert client.post("/machines", json={"id": "m2"}).status_code == 201
+    _, other = make_item(quantity=1, prefix="/machines/m2")  # 24 sold: out in 1 hour
+
+    yesterday = NOW - timedelta(hours=14)
+    sales = [
+        sales_ledger.sale(machine_id, item_id, None, 25, yesterday)
+        for machine_id, item_id, units in [
+            (DEFAULT_MACHINE_ID, low, 24),
+            (DEFAULT_MACHINE_ID, fast, 48),
+            (DEFAULT_MACHINE_ID, slow, 12),
+            ("m2", other, 24),
+        ]
+        for _ in range(units)
+    ]
+    _record(sales)
+    return {"low": low, "fast": fast, "slow": slow, "empty": empty, "other": other}
+
+
+def _record(sales: list[dict]) -> None:
+    db = WriteSessionLocal()
+    try:
+        with db.begin():
+            sales_ledger.record(db, sales)
+    finally:
+        db.close()
+
+
+def _plan(db, machine_ids, window_days=2, now=NOW):
+    return restock_service.restock_plan(db, machine_ids, HORIZON, window_days, 1.0, now)
+
+
+def test_plan_ranks_items_by_stockout(db, fleet):
+    plan = _plan(db, [DEFAULT_MACHINE_ID])
+
+    assert [entry["item_id"] for entry in plan] == [fleet["empty"], fleet["low"], fleet["fast"]]
+    assert [entry["units_per_hour"] for entry in plan] == [0.0, 1.0, 2.0]
+    assert [entry["hours_to_stockout"] for entry in plan] == [0.0, 3.0, 6.0]
+    assert [entry["stockout_at"] for entry in plan] == [
+        NOW, NOW + timedelta(hours=3), NOW + timedelta(hours=6)
+    ]
+    # A day's sales less the stock, capped by the free space in the slot.
+    assert [entry["restock"] for entry in plan] == [0, 21, 28]
+
+
+def test_plan_without_machines_covers_the_fleet(db, fleet):
+    plan = _plan(db, None)
+
+    assert [entry["item_id"] for entry in plan] == [
+        fleet["empty"], fleet["other"], fleet["low"], fleet["fast"]
+    ]
+    assert plan[1]["machine_id"] == "m2"
+
+
+def test_one_day_window(db, fleet):
+    # At noon a one-day window holds the twelve hours since midnight:
+    # yesterday's sales are outside it, and 6 units this morning are half
+    # a unit an hour.
+    this_morning = NOW + timedelta(hours=6)
+    _record([
+        sales_ledger.sale(DEFAULT_MACHINE_ID, fleet["low"], None, 25, this_morning)
+        for _ in range(6)
+    ])
+
+    plan = _plan(db, [DEFAULT_MACHINE_ID], window_days=1, now=NOW + timedelta(hours=12))
+
+    assert [entry["item_id"] for entry in plan] == [fleet["empty"], fleet["low"]]
+    assert [entry["units_per_hour"] for entry in plan] == [0.0, 0.5]
+    assert [entry["hours_to_stockout"] for entry in plan] == [0.0, 6.0]
@@ -0,0 +1,94 @@
+import math
+import random
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select
+
+from app.db import WriteSessionLocal
+from app.models import DEFAULT_MACHINE_ID, Sale
+from app.services import sales_ledger
+
+START = datetime(2026, 3, 1)
+RANGES = [
+    (None, None),
+    (START + timedelta(days=1, hours=5, minutes=30), START + timedelta(days=4, hours=2)),
+    (START + timedelta(days=2), START + timedelta(days=3)),
+    (START + timedelta(days=2, hours=3), START + timedelta(days=2, hours=7, minutes=1)),
+    (START + timedelta(hours=20), None),
+    (None, START + timedelta(days=3, minutes=15)),
+]
+GROUPINGS = [[], ["item"], ["day"], ["hour"], ["item", "day"], ["slot", "hour"]]
+
+
+@pytest.fixture
+def sales():
+    """Random sales over five days, recorded in several batches."""
+    rng = random.Random(21)
+    slot_of = {str(uuid.uuid4()): str(uuid.uuid4()) for _ in range(4)}
+    db = WriteSessionLocal()
+    try:
+        for _ in range(20):
+            batch = []
+            for _ in range(rng.randint(1, 15)):
+                item_id = rng.choice(list(slot_of))
+                sold_at = START + timedelta(minutes=rng.randrange(5 * 24 * 60))
+                batch.append(sales_ledger.sale(
+                    DEFAULT_MACHINE_ID, item_id, slot_of[item_id], rng.choice([10, 25]), sold_at,
+                ))
+            with db.begin():
+                sales_ledger.record(db, batch)
+    finally:
+        db.close()
+
+
+def _from_raw_sales(db, start, end, group_by) -> list[dict]:
+    """The report computed from every sale in an hour overlapping the range."""
+    first_hour = math.floor(sales_ledger.epoch_hours(start)) if start else None
+    end_hour = math.ceil(sales_ledger.epoch_hours(end)) if end else None
+    totals = defaultdict(lambda: [0, 0])
+    for sale in db.scalars(select(Sale)):
+        hour = sales_ledger.hour_of(sale.sold_at)
+        if first_hour is not None and hour < first_hour:
+            continue
+        if end_hour is not None and hour >= end_hour:
+            continue
+        moment = sales_ledger.EPOCH + timedelta(hours=hour)
+        values = {
+            "item": sale.item_id, "slot": sale.slot_id, "hour": moment, "day": moment.date(),
+        }
+        total = totals[tuple(values[name] for name in group_by)]
+        total[0] += 1
+        total[1] += sale.price
+    names = {"item": "item_id", "slot": "slot_id", "hour": "hour", "day": "day"}
+    return [
+        {"units": units, "revenue": revenue}
+        | {names[name]: value for name, value in zip(group_by, key)}
+        for key, (units, revenue) in sorted(totals.items())
+    ] or ([{"units": 0, "revenue": 0}] if not group_by else [])
+
+
+@pytest.mark.parametrize("start, end", RANGES)
+@pytest.mark.parametrize("group_by", GROUPINGS)
+def test_rollups_match_raw_sales(db, sales, start, end, group_by):
+    report = sales_ledger.sales_report(db, DEFAULT_MACHINE_ID, start, end, group_by)
+    assert report == _from_raw_sales(db, start, end, group_by)
+
+
+def test_sales_report_route(client, db, sales):
+    start, end = RANGES[1]
+    response = client.get("/analytics/sales", params={
+        "from": start.isoformat(), "to": end.isoformat(), "group_by": "day",
+    })
+
+    assert response.status_code == 200
+    expected = _from_raw_sales(db, start, end, ["day"])
+    body = response.json()
+    assert body["units"] == sum(row["units"] for row in expected)
+    assert body["revenue"] == sum(row["revenue"] for row in expected)
+    assert body["rows"] == [
+        {"day": row["day"].isoformat(), "units": row["units"], "revenue": row["revenue"]}
+        for row in expected
+    ]
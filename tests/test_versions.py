@@ -0,0 +1,125 @@
+import pytest
+from sqlalchemy import Delete, Update
+
+from app.db import WriteSessionLocal
+from app.models import DEFAULT_MACHINE_ID, Item
+from app.services import inventory_ledger
+
+
+def test_price_edit_with_a_stale_etag_is_refused(client, make_item):
+    _, item_id = make_item(price=25)
+    etag = client.get(f"/items/{item_id}").headers["etag"]
+    edited = client.patch(
+        f"/items/{item_id}/price", json={"price": 30}, headers={"If-Match": etag}
+    )
+    assert edited.status_code == 200
+    assert edited.headers["etag"] != etag
+
+    response = client.patch(
+        f"/items/{item_id}/price", json={"price": 35}, headers={"If-Match": etag}
+    )
+
+    assert response.status_code == 412
+    assert client.get(f"/items/{item_id}").json()["price"] == 30
+
+
+def test_sales_do_not_change_the_etag(client, make_item):
+    _, item_id = make_item(price=25)
+    etag = client.get(f"/items/{item_id}").headers["etag"]
+    buy = client.post("/purchase", json={"item_id": item_id, "cash_inserted": 25})
+    assert buy.status_code == 200
+
+    response = client.patch(
+        f"/items/{item_id}/price", json={"price": 30}, headers={"If-Match": etag}
+    )
+
+    assert response.status_code == 200
+
+
+def test_removal_with_a_stale_etag_is_refused(client, make_item):
+    slot_id, item_id = make_item(quantity=5)
+    etag = client.get(f"/items/{item_id}").headers["etag"]
+    assert client.delete(
+        f"/slots/{slot_id}/items/{item_id}", params={"quantity": 1}, headers={"If-Match": etag}
+    ).status_code == 200
+
+    response = client.delete(
+        f"/slots/{slot_id}/items/{item_id}", params={"quantity": 1}, headers={"If-Match": etag}
+    )
+
+    assert response.status_code == 412
+    assert client.get(f"/items/{item_id}").json()["quantity"] == 4
+
+
+def test_bulk_removal_with_a_stale_slot_version_is_refused(client, make_item):
+    slot_id, _ = make_item(quantity=5)
+    version = next(s["version"] for s in client.get("/slots").json() if s["id"] == slot_id)
+
+    response = client.request(
+        "DELETE", f"/slots/{slot_id}/items", json={"item_ids": None},
+        headers={"If-Match": f'"{version + 1}"'},
+    )
+
+    assert response.status_code == 412
+    assert client.request(
+        "DELETE", f"/slots/{slot_id}/items", json={"item_ids": None},
+        headers={"If-Match": f'"{version}"'},
+    ).status_code == 200
+
+
+class SaleSlipsIn:
+    """A session that sells a unit just before each of the next ``sales`` item writes.
+
+    That is a sale landing between a removal's read and its compare-and-set.
+    """
+
+    def __init__(self, session, item_id: str, sales: int):
+        self.session = session
+        self.item_id = item_id
+        self.sales = sales
+
+    def execute(self, statement, *args, **kwargs):
+        if (
+            self.sales
+            and isinstance(statement, (Update, Delete))
+            and statement.table.name == Item.__tablename__
+        ):
+            self.sales -= 1
+            inventory_ledger.sell_one(self.session, DEFAULT_MACHINE_ID, self.item_id, 100)
+        return self.session.execute(statement, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.session, name)
+
+
+def test_removal_reads_again_when_a_sale_slips_in(client, make_item):
+    slot_id, item_id = make_item(quantity=5)
+    session = WriteSessionLocal()
+    try:
+        slipping = SaleSlipsIn(session, item_id, sales=2)
+        with session.begin():
+            removed = inventory_ledger.remove_item_quantity(
+                slipping, DEFAULT_MACHINE_ID, slot_id, item_id, None
+            )
+    finally:
+        session.close()
+
+    assert removed == (3, 0, None)
+    assert client.get(f"/items/{item_id}").status_code == 404
+    slot = next(s for s in client.get("/slots").json() if s["id"] == slot_id)
+    assert slot["current_item_count"] == 0
+
+
+def test_removal_gives_up_after_its_attempts(client, make_item):
+    slot_id, item_id = make_item(quantity=10)
+    session = WriteSessionLocal()
+    try:
+        slipping = SaleSlipsIn(session, item_id, sales=inventory_ledger.CAS_ATTEMPTS)
+        with pytest.raises(ValueError, match="concurrent_update"), session.begin():
+            inventory_ledger.remove_item_quantity(
+                slipping, DEFAULT_MACHINE_ID, slot_id, item_id, 1
+            )
+    finally:
+        session.close()
+
+    assert client.get(f"/items/{item_id}").json()["quantity"] == 10